@@ -54,9 +54,11 @@
 #         return None
     
 
+import asyncio
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
-from typing import Optional, Any
+from typing import Callable, Dict, Optional, Any, TypeVar
 
 from fastapi import HTTPException, status
 from jose import JWTError, jwt
@@ -68,6 +70,16 @@ logger = logging.getLogger(__name__)
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# bcrypt takes 100-300 ms per call, so it runs on a dedicated, size-limited pool
+# instead of the event loop. Callers beyond PASSWORD_HASH_MAX_PENDING are rejected.
+_hash_executor = ThreadPoolExecutor(
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    thread_name_prefix="password-hash",
+)
+_pending_hashes = 0
+
+T = TypeVar("T")
+
 
 def _truncate_password(password: str, max_bytes: int = 72) -> str:
     """Truncate password so UTF-8 encoding fits in bcrypt limit"""
@@ -93,6 +105,41 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(_truncate_password(password))
 
 
+def password_hash_stats() -> Dict[str, int]:
+    """Queue depth (running + waiting bcrypt calls) and limits of the hashing pool."""
+    return {
+        "queue_depth": _pending_hashes,
+        "workers": settings.PASSWORD_HASH_WORKERS,
+        "max_pending": settings.PASSWORD_HASH_MAX_PENDING,
+    }
+
+
+async def _run_on_hash_executor(func: Callable[..., T], *args: Any) -> T:
+    global _pending_hashes
+    if _pending_hashes >= settings.PASSWORD_HASH_MAX_PENDING:
+        logger.warning("Password hashing queue is full (%s pending)", _pending_hashes)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many concurrent authentication requests, please retry",
+            headers={"Retry-After": "1"},
+        )
+
+    _pending_hashes += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_hash_executor, func, *args)
+    finally:
+        _pending_hashes -= 1
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await _run_on_hash_executor(verify_password, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    return await _run_on_hash_executor(get_password_hash, password)
+
+
 def create_access_token(
     data: dict[str, Any],
     expires_delta: Optional[timedelta] = None
@@ -65,6 +65,15 @@ class LoanUpdate(BaseModel):
 class Loan(LoanBase): # This is effectively LoanInDB
     id: Any = Field(default_factory=PyObjectId, alias="_id")
     status: str = "pending" # pending, approved, active, paid, rejected
+    branch: Optional[str] = None # Borrower's branch at origination, used by the portfolio rollups
+    # Delinquency of active loans (see LoanCRUD.refresh_delinquency): due date of the
+    # oldest installment not yet fully repaid, days past it and aging bucket as of
+    # delinquency_as_of, and the date the bucket next changes if nothing is repaid
+    next_due_date: Optional[datetime] = None
+    days_past_due: int = 0
+    aging_bucket: Optional[str] = None # current, 1-30, 31-60, 61-90, 90+
+    delinquency_as_of: Optional[datetime] = None
+    delinquency_review_date: Optional[datetime] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow) # Added updated_at
 
@@ -50,6 +50,10 @@ class LoanProductBase(BaseModel):
     template: str = Field(..., min_length=1, max_length=50)
     security: str = Field(..., min_length=1, max_length=50) # e.g., Secured, Unsecured
     br_lc: str = Field(..., min_length=1, max_length=50) # e.g., Branch, Lending
+    # Late-payment penalty (see penalty_service): percent of the overdue amount per
+    # 30 days, charged daily once a loan is more than penalty_grace_days past due
+    penalty_rate: Optional[float] = Field(None, ge=0)
+    penalty_grace_days: int = Field(0, ge=0)
 
 class LoanProductCreate(LoanProductBase):
     pass
@@ -64,6 +68,8 @@ class LoanProductUpdate(BaseModel):
     template: Optional[str] = Field(None, min_length=1, max_length=50)
     security: Optional[str] = Field(None, min_length=1, max_length=50)
     br_lc: Optional[str] = Field(None, min_length=1, max_length=50)
+    penalty_rate: Optional[float] = Field(None, ge=0)
+    penalty_grace_days: Optional[int] = Field(None, ge=0)
 
 class LoanProduct(LoanProductBase):
     id: PyObjectId = Field(default_factory=PyObjectId, alias="_id")
@@ -12,12 +12,16 @@ class SavingsAccountBase(BaseModel):
     account_number: str = Field(..., min_length=8)
     user_id: PyObjectId
     type: str
-    balance: float = 0.00
+    balance: Decimal = Decimal("0.00")  # stored as Decimal128
     currency: str = "PHP"
     opened_at: datetime = Field(default_factory=datetime.utcnow)
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
     status: Literal["active", "frozen", "closed"] = "active"
+    # Interest accrued but not yet posted to the balance (to the micro-peso), and the
+    # last day it was accrued for; maintained by interest_service
+    accrued_interest: Decimal = Decimal("0")
+    last_accrual_date: Optional[datetime] = None
 
     model_config = ConfigDict(
         populate_by_name=True,
@@ -36,6 +40,8 @@ class HighYieldSavings(SavingsAccountBase):
     type: Literal["high_yield"] = "high_yield"
     interest_rate: float = float(4.00)
     interest_paid_frequency: Literal["daily", "monthly", "quarterly"] = "monthly"
+    # [{"min_balance": ..., "rate": ...}]: the whole balance earns the rate of the
+    # highest tier it reaches, or interest_rate below the lowest tier
     tiers: Optional[List[Dict[str, Decimal]]] = None
 
 
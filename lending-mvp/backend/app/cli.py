@@ -0,0 +1,269 @@
+"""
+Maintenance commands.
+
+    python -m app.cli ensure-indexes        apply the index catalog
+    python -m app.cli index-drift           show differences between the catalog and the server
+    python -m app.cli check-query-plans     explain every CRUD query shape, exit 1 on any COLLSCAN
+    python -m app.cli backfill-customer-search   build search tokens for existing customers
+    python -m app.cli migrate-savings-balances   convert string/double balances to Decimal128
+    python -m app.cli rebuild-loan-balances      recompute loan_balances from transaction history
+    python -m app.cli rebuild-portfolio-rollups  recompute portfolio_rollups from loans and balances
+    python -m app.cli backfill-ledger-links      link disbursement ledger entries to their loans
+    python -m app.cli snapshot-account-balances  store period-end account balances
+    python -m app.cli verify-account-balances    report (or --repair) drift from the ledger
+    python -m app.cli import-customers PATH      bulk import customers from CSV or NDJSON
+    python -m app.cli import-loan-transactions PATH   bulk import loan transactions from a bank file
+    python -m app.cli accrue-savings-interest    accrue and post one day of savings interest
+    python -m app.cli process-maturities         roll over or pay out matured time deposits
+    python -m app.cli refresh-delinquency        age loans whose due date or bucket boundary has passed
+    python -m app.cli assess-penalties           charge a day of late-payment penalty on overdue loans
+
+Run python -m app.cli --help (or <command> --help) for every command and its options.
+"""
+import argparse
+import asyncio
+import json
+import sys
+from datetime import date, datetime, timedelta, timezone
+
+from .database import get_db, get_customers_collection, get_savings_collection, get_loan_balances_collection, get_loan_transactions_collection, get_portfolio_rollups_collection
+from .database.customer_crud import CustomerCRUD
+from .database.loan_transaction_crud import LoanTransactionCRUD
+from .database.savings_crud import SavingsCRUD
+from .database.loan_balance_crud import LoanBalanceCRUD
+from .database.portfolio_rollup_crud import PortfolioRollupCRUD
+from .database.indexes import apply_index_catalog, index_drift, verify_query_plans
+from .services import accounting_service, customer_import_service, delinquency_service, interest_service, loan_transaction_import_service, penalty_service, time_deposit_service
+from .utils.streaming import file_chunks
+
+
+async def ensure_indexes(args) -> int:
+    report = await apply_index_catalog(get_db())
+    print(json.dumps(report, indent=2))
+    return 1 if report["failed"] else 0
+
+
+async def show_index_drift(args) -> int:
+    drift = await index_drift(get_db())
+    print(json.dumps(drift, indent=2))
+    has_drift = any(d["missing"] or d["changed"] for d in drift.values())
+    return 1 if has_drift else 0
+
+
+async def check_query_plans(args) -> int:
+    if args.ensure:
+        await apply_index_catalog(get_db())
+    results = await verify_query_plans(get_db())
+    for result in results:
+        flag = "COLLSCAN" if result["collscan"] else "ok"
+        print(f"{flag:8} {result['name']}: {' > '.join(result['stages'])}")
+    failures = [result["name"] for result in results if result["collscan"]]
+    if failures:
+        print(f"{len(failures)} query shape(s) fall back to a collection scan")
+        return 1
+    return 0
+
+
+async def backfill_customer_search(args) -> int:
+    updated = await CustomerCRUD(get_customers_collection()).backfill_search_fields(batch_size=args.batch_size)
+    print(f"Search fields built for {updated} customer(s)")
+    return 0
+
+
+async def migrate_savings_balances(args) -> int:
+    converted = await SavingsCRUD(get_savings_collection()).migrate_balances_to_decimal()
+    print(f"Converted {converted} savings balance(s) to Decimal128")
+    return 0
+
+
+async def rebuild_loan_balances(args) -> int:
+    balance_crud = LoanBalanceCRUD(get_loan_balances_collection())
+    summarised = await balance_crud.rebuild_all(get_loan_transactions_collection(), batch_size=args.batch_size)
+    print(f"Rebuilt balance summaries for {summarised} loan(s)")
+    return 0
+
+
+async def rebuild_portfolio_rollups(args) -> int:
+    rollup_crud = PortfolioRollupCRUD(get_portfolio_rollups_collection(), LoanBalanceCRUD(get_loan_balances_collection()))
+    counted = await rollup_crud.rebuild_all(get_customers_collection(), batch_size=args.batch_size)
+    print(f"Rebuilt portfolio rollups from {counted} loan(s)")
+    return 0
+
+
+async def backfill_ledger_links(args) -> int:
+    linked = await accounting_service.backfill_ledger_links(batch_size=args.batch_size)
+    print(f"Linked {linked} ledger entr{'y' if linked == 1 else 'ies'} to their loan and borrower")
+    return 0
+
+
+async def snapshot_account_balances(args) -> int:
+    as_of = datetime.fromisoformat(args.as_of) if args.as_of else datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    written = await accounting_service.snapshot_account_balances(as_of)
+    print(f"Snapshot of {written} account balance(s) as of {as_of.isoformat()}")
+    return 0
+
+
+async def verify_account_balances(args) -> int:
+    drift = await accounting_service.verify_account_balances(repair=args.repair)
+    for record in drift:
+        print(json.dumps(record))
+    if drift:
+        print(f"{len(drift)} account(s) drifted from the ledger entries" + (" and were repaired" if args.repair else ""))
+        return 0 if args.repair else 1
+    print("Account balances match the ledger entries")
+    return 0
+
+
+async def import_customers(args) -> int:
+    file_format = args.format or ("ndjson" if args.path.endswith((".ndjson", ".jsonl")) else "csv")
+    customer_crud = CustomerCRUD(get_customers_collection())
+    summary = {}
+    async for event in customer_import_service.import_customers(file_chunks(args.path), file_format, customer_crud, chunk_size=args.chunk_size):
+        if event["event"] == "summary":
+            summary = event
+        elif event["event"] == "error" or not args.quiet:
+            print(json.dumps(event, default=str))
+    print(f"Imported {summary['inserted']} of {summary['rows']} row(s): {summary['duplicates']} duplicate(s), "
+          f"{summary['failed']} failed, {summary['rows_per_s']} rows/s")
+    return 1 if summary["failed"] else 0
+
+
+async def import_loan_transactions(args) -> int:
+    file_format = args.format or ("csv" if args.path.endswith(".csv") else "fixed")
+    layout = None
+    if args.layout:
+        with open(args.layout) as f:
+            layout = json.load(f)
+    loan_transaction_crud = LoanTransactionCRUD(get_loan_transactions_collection())
+    summary = {}
+    async for event in loan_transaction_import_service.import_loan_transactions(
+        file_chunks(args.path), file_format, loan_transaction_crud, chunk_size=args.chunk_size, layout=layout
+    ):
+        if event["event"] == "summary":
+            summary = event
+        elif event["event"] == "error" or not args.quiet:
+            print(json.dumps(event, default=str))
+    print(f"Imported {summary['inserted']} of {summary['rows']} row(s): {summary['duplicates']} duplicate(s), "
+          f"{summary['failed']} failed, {summary['rows_per_s']} rows/s")
+    return 1 if summary["failed"] else 0
+
+
+async def accrue_savings_interest(args) -> int:
+    accrual_date = date.fromisoformat(args.date) if args.date else datetime.now(timezone.utc).date() - timedelta(days=1)
+    result = await interest_service.accrue_savings_interest(accrual_date, batch_size=args.batch_size)
+    print(json.dumps(result, default=str, indent=2))
+    return 0
+
+
+async def process_maturities(args) -> int:
+    as_of = date.fromisoformat(args.date) if args.date else datetime.now(timezone.utc).date()
+    result = await time_deposit_service.process_maturities(as_of, batch_size=args.batch_size)
+    print(json.dumps(result, default=str, indent=2))
+    return 0
+
+
+async def refresh_delinquency(args) -> int:
+    as_of = date.fromisoformat(args.date) if args.date else datetime.now(timezone.utc).date()
+    result = await delinquency_service.refresh_delinquency(as_of, batch_size=args.batch_size, rebuild=args.rebuild)
+    print(json.dumps(result, default=str, indent=2))
+    return 0
+
+
+async def assess_penalties(args) -> int:
+    as_of = date.fromisoformat(args.date) if args.date else datetime.now(timezone.utc).date()
+    result = await penalty_service.assess_penalties(as_of, batch_size=args.batch_size)
+    print(json.dumps(result, default=str, indent=2))
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description="Lending MVP maintenance commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("ensure-indexes", help="apply the index catalog").set_defaults(handler=ensure_indexes)
+    commands.add_parser("index-drift", help="compare server indexes with the catalog").set_defaults(handler=show_index_drift)
+
+    check = commands.add_parser("check-query-plans", help="fail if any CRUD query shape does a COLLSCAN")
+    check.add_argument("--ensure", action="store_true", help="apply the index catalog first")
+    check.set_defaults(handler=check_query_plans)
+
+    backfill = commands.add_parser("backfill-customer-search", help="build search tokens for existing customers")
+    backfill.add_argument("--batch-size", type=int, default=1000)
+    backfill.set_defaults(handler=backfill_customer_search)
+
+    commands.add_parser("migrate-savings-balances", help="convert savings balances to Decimal128").set_defaults(handler=migrate_savings_balances)
+
+    rebuild_balances = commands.add_parser(
+        "rebuild-loan-balances",
+        help="recompute loan_balances from transaction history (summaries updated during the run are kept as written)"
+    )
+    rebuild_balances.add_argument("--batch-size", type=int, default=1000)
+    rebuild_balances.set_defaults(handler=rebuild_loan_balances)
+
+    rebuild_rollups = commands.add_parser(
+        "rebuild-portfolio-rollups",
+        help="recompute portfolio_rollups from loans and loan_balances (run rebuild-loan-balances first when reconciling both)"
+    )
+    rebuild_rollups.add_argument("--batch-size", type=int, default=1000)
+    rebuild_rollups.set_defaults(handler=rebuild_portfolio_rollups)
+
+    backfill_ledger = commands.add_parser(
+        "backfill-ledger-links", help="set loan_id/borrower_id on disbursement ledger entries from their transaction ids"
+    )
+    backfill_ledger.add_argument("--batch-size", type=int, default=1000)
+    backfill_ledger.set_defaults(handler=backfill_ledger_links)
+
+    snapshot = commands.add_parser("snapshot-account-balances", help="store period-end account balances")
+    snapshot.add_argument("--as-of", help="period end (exclusive), ISO date/time in UTC; defaults to today 00:00 UTC")
+    snapshot.set_defaults(handler=snapshot_account_balances)
+
+    verify = commands.add_parser("verify-account-balances", help="recompute account balances from the ledger and report drift")
+    verify.add_argument("--repair", action="store_true", help="overwrite drifted running balances (also builds them for an existing ledger)")
+    verify.set_defaults(handler=verify_account_balances)
+
+    customer_import = commands.add_parser("import-customers", help="bulk import customers from a CSV or NDJSON file")
+    customer_import.add_argument("path")
+    customer_import.add_argument("--format", choices=sorted(customer_import_service.IMPORT_FORMATS), help="defaults from the file extension")
+    customer_import.add_argument("--chunk-size", type=int, default=customer_import_service.DEFAULT_CHUNK_SIZE)
+    customer_import.add_argument("--quiet", action="store_true", help="only print errors and the summary")
+    customer_import.set_defaults(handler=import_customers)
+
+    transaction_import = commands.add_parser("import-loan-transactions", help="bulk import loan transactions from a bank/collection file")
+    transaction_import.add_argument("path")
+    transaction_import.add_argument("--format", choices=loan_transaction_import_service.IMPORT_FORMATS, help="defaults from the file extension (.csv, otherwise fixed-width)")
+    transaction_import.add_argument("--layout", help="JSON file with the fixed-width layout (fields, detail_prefix, date_format)")
+    transaction_import.add_argument("--chunk-size", type=int, default=loan_transaction_import_service.DEFAULT_CHUNK_SIZE)
+    transaction_import.add_argument("--quiet", action="store_true", help="only print errors and the summary")
+    transaction_import.set_defaults(handler=import_loan_transactions)
+
+    accrual = commands.add_parser("accrue-savings-interest", help="accrue and post one day of savings interest")
+    accrual.add_argument("--date", help="accrual date (YYYY-MM-DD); defaults to yesterday UTC")
+    accrual.add_argument("--batch-size", type=int, help="accounts per batch; defaults to INTEREST_ACCRUAL_BATCH_SIZE")
+    accrual.set_defaults(handler=accrue_savings_interest)
+
+    maturities = commands.add_parser("process-maturities", help="roll over or pay out time deposits that have matured")
+    maturities.add_argument("--date", help="settle deposits maturing on or before this date (YYYY-MM-DD); defaults to today UTC")
+    maturities.add_argument("--batch-size", type=int, help="deposits per batch; defaults to INTEREST_ACCRUAL_BATCH_SIZE")
+    maturities.set_defaults(handler=process_maturities)
+
+    delinquency = commands.add_parser("refresh-delinquency", help="age loans whose due date or aging bucket boundary has passed")
+    delinquency.add_argument("--date", help="age as of this date (YYYY-MM-DD); defaults to today UTC")
+    delinquency.add_argument("--batch-size", type=int, help="loans per batch; defaults to DELINQUENCY_BATCH_SIZE")
+    delinquency.add_argument("--rebuild", action="store_true", help="recompute every active loan, e.g. to backfill existing loans")
+    delinquency.set_defaults(handler=refresh_delinquency)
+
+    penalties = commands.add_parser("assess-penalties", help="charge a day of late-payment penalty on overdue loans")
+    penalties.add_argument("--date", help="charge the penalty for this date (YYYY-MM-DD); defaults to today UTC")
+    penalties.add_argument("--batch-size", type=int, help="loans per batch; defaults to PENALTY_BATCH_SIZE")
+    penalties.set_defaults(handler=assess_penalties)
+
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    return asyncio.run(args.handler(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,8 @@
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
+    # Must reach a replica set (e.g. mongodb://mongodb:27017/?replicaSet=rs0, as in
+    # docker-compose.yml): loan, loan transaction and savings writes use transactions
     DATABASE_URL: str
     DATABASE_NAME: str
     
@@ -10,4 +12,38 @@ class Settings(BaseSettings):
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
 
+    # --- Authenticated-user cache used by get_context ---
+    USER_CACHE_MAX_SIZE: int = 10000
+    USER_CACHE_TTL_SECONDS: int = 60
+
+    # --- bcrypt executor: worker threads and max running + queued calls ---
+    PASSWORD_HASH_WORKERS: int = 4
+    PASSWORD_HASH_MAX_PENDING: int = 64
+
+    # --- Savings deposits/withdrawals: "single" (two writes, no session),
+    # "transactional" (balance + record in one transaction) or "group_commit"
+    # (concurrent writes to the same account coalesced into one transaction) ---
+    SAVINGS_WRITE_MODE: str = "transactional"
+    SAVINGS_GROUP_COMMIT_WINDOW_MS: int = 5
+    SAVINGS_GROUP_COMMIT_MAX_BATCH: int = 256
+
+    # --- Batch loan disbursement: loans disbursed at once and loans per run ---
+    DISBURSEMENT_CONCURRENCY: int = 32
+    DISBURSEMENT_MAX_BATCH: int = 5000
+
+    # --- Streaming exports: documents per cursor batch and per response chunk ---
+    EXPORT_BATCH_SIZE: int = 5000
+
+    # --- Scheduled jobs: accounts per savings interest batch, loans per delinquency
+    # and penalty batch (each holds the loans' schedules in memory), and how long a
+    # run may go without a heartbeat before another process can take it over ---
+    INTEREST_ACCRUAL_BATCH_SIZE: int = 5000
+    DELINQUENCY_BATCH_SIZE: int = 2000
+    PENALTY_BATCH_SIZE: int = 2000
+    JOB_RUN_STALE_MINUTES: int = 30
+
+    # --- Portfolio rollups: counter documents per bucket, so concurrent loan writes
+    # spread their $inc over several documents instead of conflicting on one ---
+    ROLLUP_SHARDS: int = 8
+
 settings = Settings()
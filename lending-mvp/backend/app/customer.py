@@ -11,6 +11,8 @@ from .models import CustomerInDB, CustomerCreate, CustomerUpdate, PyObjectId,Use
 #from .schema import CustomerType, CustomerCreateInput, CustomerUpdateInput, CustomerResponse, CustomersResponse
 from .database import get_customers_collection, get_db
 from .database.customer_crud import CustomerCRUD
+from .schema import PageInfo
+from .database.pagination import TotalMode
 
 
 # Customer Types
@@ -91,7 +93,22 @@ class CustomersResponse:
     success: bool
     message: str
     customers: List[CustomerType]
-    total: int
+    total: Optional[int]
+
+@strawberry.type
+class CustomerPickerItem:
+    id: strawberry.ID
+    display_name: str = strawberry.field(name="displayName")
+
+@strawberry.type
+class CustomerEdge:
+    cursor: str
+    node: CustomerType
+
+@strawberry.type
+class CustomerConnection:
+    edges: List[CustomerEdge]
+    page_info: PageInfo
 
 @strawberry.field
 async def customer(self, info: Info) -> Optional["CustomerType"]:
@@ -137,7 +154,7 @@ def convert_customer_db_to_customer_type(customer_db: CustomerInDB) -> "Customer
 @strawberry.type
 class Query:
     @strawberry.field
-    async def customers(self, info: Info, skip: int = 0, limit: int = 100, search_term: Optional[str] = None) -> CustomersResponse:
+    async def customers(self, info: Info, skip: int = 0, limit: int = 100, search_term: Optional[str] = None, total_mode: TotalMode = TotalMode.EXACT) -> CustomersResponse:
         """Get all customers with optional search"""
         current_user: UserInDB = info.context.get("current_user")
         print(current_user.role)
@@ -148,8 +165,12 @@ class Query:
             customers_collection = get_customers_collection()
             customer_crud = CustomerCRUD(customers_collection)
             
-            customers_db = await customer_crud.get_customers(skip=skip, limit=limit, search_term=search_term)
-            total = await customer_crud.count_customers(search_term=search_term)
+            customers_db, total = await customer_crud.get_customers_with_total(
+                skip=skip,
+                limit=limit,
+                search_term=search_term,
+                total_mode=total_mode
+            )
             
             customers = [convert_customer_db_to_customer_type(customer_db) for customer_db in customers_db]
             
@@ -167,6 +188,38 @@ class Query:
                 total=0
             )
 
+    @strawberry.field
+    async def customers_connection(self, info: Info, first: int = 50, after: Optional[str] = None, search_term: Optional[str] = None) -> CustomerConnection:
+        """Get customers with keyset pagination, ordered by display name"""
+        current_user: UserInDB = info.context.get("current_user")
+        if not current_user or current_user.role != "admin":
+            raise Exception("Not authorized")
+
+        customers_collection = get_customers_collection()
+        customer_crud = CustomerCRUD(customers_collection)
+
+        edges, has_next_page = await customer_crud.get_customers_page(first=first, after=after, search_term=search_term)
+        return CustomerConnection(
+            edges=[CustomerEdge(cursor=cursor, node=convert_customer_db_to_customer_type(customer_db)) for cursor, customer_db in edges],
+            page_info=PageInfo(has_next_page=has_next_page, end_cursor=edges[-1][0] if edges else None)
+        )
+
+    @strawberry.field
+    async def customer_picker(self, info: Info, search_term: Optional[str] = None, limit: int = 10) -> List[CustomerPickerItem]:
+        """Type-ahead lookup returning only id and display name, most relevant first"""
+        current_user: UserInDB = info.context.get("current_user")
+        if not current_user or current_user.role not in ["admin", "staff"]:
+            raise Exception("Not authorized")
+
+        customers_collection = get_customers_collection()
+        customer_crud = CustomerCRUD(customers_collection)
+
+        customers_data = await customer_crud.get_customer_picker(search_term=search_term, limit=limit)
+        return [
+            CustomerPickerItem(id=strawberry.ID(str(c["_id"])), display_name=c["display_name"])
+            for c in customers_data
+        ]
+
     @strawberry.field
     async def customer(self, info: Info, customer_id: strawberry.ID) -> CustomerResponse:
         """Get customer by ID"""
@@ -1,16 +1,27 @@
 import motor.motor_asyncio
 from ..config import settings
+from .indexes import apply_index_catalog, index_drift
+from .codecs import DECIMAL_CODEC_OPTIONS
 
 client = motor.motor_asyncio.AsyncIOMotorClient(settings.DATABASE_URL)
 db = client[settings.DATABASE_NAME]
 
 # Collections
 users_collection = db["users"]
-loans_collection = db["loans"]
+# Loan amounts are written as Decimal128 and read back as Decimal
+loans_collection = db.get_collection("loans", codec_options=DECIMAL_CODEC_OPTIONS)
 ledger_collection = db["ledger_entries"]
 customers_collection = db["customers"] # Added customers collection
 loan_transactions_collection = db["loan_transactions"] # Added loan_transactions collection
 loan_products_collection = db["loan_products"] # Added loan_products collection
+# Money is stored as Decimal128; these collections decode it straight to Decimal
+savings_collection = db.get_collection("savings", codec_options=DECIMAL_CODEC_OPTIONS)
+transactions_collection = db.get_collection("transactions", codec_options=DECIMAL_CODEC_OPTIONS)
+loan_balances_collection = db.get_collection("loan_balances", codec_options=DECIMAL_CODEC_OPTIONS)
+portfolio_rollups_collection = db.get_collection("portfolio_rollups", codec_options=DECIMAL_CODEC_OPTIONS)
+account_balances_collection = db.get_collection("account_balances", codec_options=DECIMAL_CODEC_OPTIONS)
+account_balance_snapshots_collection = db.get_collection("account_balance_snapshots", codec_options=DECIMAL_CODEC_OPTIONS)
+job_runs_collection = db["job_runs"]
 
 def get_users_collection():
     return users_collection
@@ -30,18 +41,46 @@ def get_loan_transactions_collection(): # Added getter for loan_transactions col
 def get_loan_products_collection(): # Added getter for loan_products collection
     return loan_products_collection
 
+def get_savings_collection():
+    return savings_collection
+
+def get_transactions_collection():
+    return transactions_collection
+
+def get_loan_balances_collection():
+    return loan_balances_collection
+
+def get_portfolio_rollups_collection():
+    return portfolio_rollups_collection
+
+def get_account_balances_collection():
+    return account_balances_collection
+
+def get_account_balance_snapshots_collection():
+    return account_balance_snapshots_collection
+
+def get_job_runs_collection():
+    return job_runs_collection
+
 def get_db(): # Added getter for the database client
     return db
 
 async def create_indexes():
     """
-    Creates necessary indexes for the collections.
+    Applies the declarative index catalog (see indexes.py) and reports any drift.
     """
     print("Creating database indexes...")
     try:
-        await users_collection.create_index("email", unique=True)
-        await users_collection.create_index("username", unique=True)
-        await customers_collection.create_index("display_name", unique=True)
+        report = await apply_index_catalog(db)
+        if report["created"]:
+            print(f"Indexes created: {', '.join(report['created'])}")
+        if report["failed"]:
+            print(f"Indexes that could not be created: {', '.join(report['failed'])}")
+
+        drift = await index_drift(db)
+        for collection_name, collection_drift in drift.items():
+            if collection_drift["changed"] or collection_drift["extra"]:
+                print(f"Index drift on {collection_name}: {collection_drift}")
         print("Indexes created successfully.")
     except Exception as e:
-        print(f"Error creating indexes: {e}")
\ No newline at end of file
+        print(f"Error creating indexes: {e}")
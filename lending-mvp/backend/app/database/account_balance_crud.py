@@ -0,0 +1,192 @@
+from typing import List, Optional, Dict, Any
+from datetime import datetime, timezone
+from decimal import Decimal
+from bson import Decimal128
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import ReplaceOne, UpdateOne, DESCENDING
+from .codecs import DECIMAL_CODEC_OPTIONS
+
+CENT = Decimal("0.01")
+TOTAL_FIELDS = ("debit_total", "credit_total", "balance")
+
+
+def _empty_totals() -> Dict[str, Any]:
+    return {"debit_total": Decimal("0"), "credit_total": Decimal("0"), "balance": Decimal("0"), "entry_count": 0}
+
+
+def _add_totals(totals: Dict[str, Any], other: Dict[str, Any]) -> None:
+    for field in TOTAL_FIELDS:
+        totals[field] += Decimal(str(other.get(field, 0)))
+    totals["entry_count"] += other.get("entry_count", 0)
+
+
+class AccountBalanceCRUD:
+    """
+    Running debit/credit totals per ledger account in account_balances (_id = account
+    name, balance = debits - credits), updated by accounting_service.post_transaction
+    in the same transaction as the entries, plus period-end copies in
+    account_balance_snapshots. A balance as of any date is the latest snapshot at or
+    before it plus the entries posted since, so trial balances cost
+    O(accounts + entries since the snapshot). Both collections must be opened with
+    DECIMAL_CODEC_OPTIONS (see get_account_balances_collection).
+    """
+
+    def __init__(self, collection: AsyncIOMotorCollection, snapshots: Optional[AsyncIOMotorCollection] = None):
+        self.collection = collection
+        self.snapshots = snapshots if snapshots is not None else collection.database.get_collection(
+            "account_balance_snapshots", codec_options=DECIMAL_CODEC_OPTIONS
+        )
+        self.entries = collection.database["ledger_entries"]
+
+    async def apply_entries(self, entries: List[Dict[str, Any]], session=None) -> None:
+        """Add freshly inserted ledger entries to their accounts' running totals."""
+        per_account: Dict[str, Dict[str, Any]] = {}
+        for entry in entries:
+            totals = per_account.setdefault(entry["account"], {**_empty_totals(), "last_entry_at": entry["timestamp"]})
+            amount = Decimal(str(entry["amount"]))
+            if entry["entry_type"] == "debit":
+                totals["debit_total"] += amount
+                totals["balance"] += amount
+            else:
+                totals["credit_total"] += amount
+                totals["balance"] -= amount
+            totals["entry_count"] += 1
+            totals["last_entry_at"] = max(totals["last_entry_at"], entry["timestamp"])
+        if not per_account:
+            return
+
+        now = datetime.now(timezone.utc)
+        await self.collection.bulk_write([
+            UpdateOne(
+                {"_id": account},
+                {
+                    "$inc": {**{field: Decimal128(totals[field]) for field in TOTAL_FIELDS}, "entry_count": totals["entry_count"]},
+                    "$max": {"last_entry_at": totals["last_entry_at"]},
+                    "$set": {"updated_at": now},
+                },
+                upsert=True
+            )
+            for account, totals in per_account.items()
+        ], ordered=False, session=session)
+
+    async def get_balances(self) -> List[Dict[str, Any]]:
+        """Current totals of every account, O(accounts)."""
+        return await self.collection.find({}).sort("_id", 1).to_list(length=None)
+
+    async def get_balance(self, account: str) -> Optional[Dict[str, Any]]:
+        return await self.collection.find_one({"_id": account})
+
+    async def movements(
+        self, start: Optional[datetime] = None, end: Optional[datetime] = None, account: Optional[str] = None
+    ) -> Dict[str, Dict[str, Any]]:
+        """Per-account totals of the entries with start <= timestamp < end, summed by the server."""
+        match: Dict[str, Any] = {}
+        if account is not None:
+            match["account"] = account
+        if start or end:
+            match["timestamp"] = {}
+            if start:
+                match["timestamp"]["$gte"] = start
+            if end:
+                match["timestamp"]["$lt"] = end
+
+        amount = {"$toDecimal": "$amount"}
+        is_debit = {"$eq": ["$entry_type", "debit"]}
+        pipeline = [
+            {"$match": match},
+            {"$group": {
+                "_id": "$account",
+                "debit_total": {"$sum": {"$cond": [is_debit, amount, Decimal128("0")]}},
+                "credit_total": {"$sum": {"$cond": [is_debit, Decimal128("0"), amount]}},
+                "entry_count": {"$sum": 1},
+                "last_entry_at": {"$max": "$timestamp"},
+            }},
+        ]
+        totals: Dict[str, Dict[str, Any]] = {}
+        async for row in self.entries.aggregate(pipeline):
+            debit, credit = row["debit_total"].to_decimal(), row["credit_total"].to_decimal()
+            totals[row["_id"]] = {"debit_total": debit, "credit_total": credit, "balance": debit - credit,
+                                   "entry_count": row["entry_count"], "last_entry_at": row["last_entry_at"]}
+        return totals
+
+    async def latest_snapshot_date(self, as_of: datetime, account: Optional[str] = None) -> Optional[datetime]:
+        query: Dict[str, Any] = {"as_of": {"$lte": as_of}}
+        if account is not None:
+            query["account"] = account
+        snapshot = await self.snapshots.find_one(query, {"as_of": 1}, sort=[("as_of", DESCENDING)])
+        return snapshot["as_of"] if snapshot else None
+
+    async def balances_as_of(self, as_of: datetime, account: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+        """Totals per account of every entry before as_of: the latest snapshot plus the movements since."""
+        snapshot_date = await self.latest_snapshot_date(as_of, account)
+        balances: Dict[str, Dict[str, Any]] = {}
+        if snapshot_date is not None:
+            query: Dict[str, Any] = {"as_of": snapshot_date}
+            if account is not None:
+                query["account"] = account
+            async for snapshot in self.snapshots.find(query):
+                _add_totals(balances.setdefault(snapshot["account"], _empty_totals()), snapshot)
+        for name, totals in (await self.movements(snapshot_date, as_of, account)).items():
+            _add_totals(balances.setdefault(name, _empty_totals()), totals)
+        return balances
+
+    async def create_snapshot(self, as_of: datetime) -> int:
+        """
+        Store every account's totals as of a period end (exclusive). as_of must not be in
+        the future, since entries are timestamped when posted. Re-running for the same
+        date replaces that snapshot. Returns the number of accounts written.
+        """
+        if as_of.tzinfo is not None:
+            as_of = as_of.astimezone(timezone.utc).replace(tzinfo=None)
+        if as_of > datetime.utcnow():
+            raise ValueError("A snapshot cannot be taken for a period end in the future")
+
+        balances = await self.balances_as_of(as_of)
+        created_at = datetime.now(timezone.utc)
+        operations = [
+            ReplaceOne({"_id": f"{as_of.isoformat()}:{account}"}, {
+                "account": account, "as_of": as_of,
+                **{field: Decimal128(totals[field]) for field in TOTAL_FIELDS},
+                "entry_count": totals["entry_count"], "created_at": created_at,
+            }, upsert=True)
+            for account, totals in balances.items()
+        ]
+        if operations:
+            await self.snapshots.bulk_write(operations, ordered=False)
+        return len(operations)
+
+    async def verify(self, repair: bool = False) -> List[Dict[str, Any]]:
+        """
+        Recompute every account from the raw ledger entries and compare with
+        account_balances to the centavo. Returns one drift record per account that
+        differs; with repair=True the running totals are overwritten with the
+        recomputed ones.
+        """
+        expected = await self.movements()
+        actual = {doc["_id"]: doc for doc in await self.get_balances()}
+        drift = []
+        for account in sorted(set(expected) | set(actual)):
+            recomputed = expected.get(account, _empty_totals())
+            stored = actual.get(account, {})
+            differences = {
+                field: {"expected": str(recomputed[field].quantize(CENT)), "actual": str(Decimal(str(stored.get(field, 0))).quantize(CENT))}
+                for field in TOTAL_FIELDS
+                if recomputed[field].quantize(CENT) != Decimal(str(stored.get(field, 0))).quantize(CENT)
+            }
+            if recomputed["entry_count"] != stored.get("entry_count", 0):
+                differences["entry_count"] = {"expected": recomputed["entry_count"], "actual": stored.get("entry_count", 0)}
+            if differences:
+                drift.append({"account": account, "differences": differences})
+
+        if repair and drift:
+            now = datetime.now(timezone.utc)
+            await self.collection.bulk_write([
+                ReplaceOne({"_id": record["account"]}, {
+                    **{field: Decimal128(expected.get(record["account"], _empty_totals())[field]) for field in TOTAL_FIELDS},
+                    "entry_count": expected.get(record["account"], _empty_totals())["entry_count"],
+                    "last_entry_at": expected.get(record["account"], {}).get("last_entry_at"),
+                    "updated_at": now,
+                }, upsert=True)
+                for record in drift
+            ], ordered=False)
+        return drift
@@ -0,0 +1,27 @@
+"""
+BSON codec options for collections that hold money as Decimal.
+
+Collections opened with DECIMAL_CODEC_OPTIONS encode decimal.Decimal as Decimal128
+and decode Decimal128 back to Decimal inside the driver, so CRUD classes no longer
+walk documents converting values by hand. Legacy documents that still hold money as
+strings are handled by the Pydantic models, which only coerce the fields they
+declare as Decimal.
+"""
+from decimal import Decimal
+
+from bson import Decimal128
+from bson.codec_options import CodecOptions, TypeCodec, TypeRegistry
+
+
+class DecimalCodec(TypeCodec):
+    python_type = Decimal
+    bson_type = Decimal128
+
+    def transform_python(self, value: Decimal) -> Decimal128:
+        return Decimal128(value)
+
+    def transform_bson(self, value: Decimal128) -> Decimal:
+        return value.to_decimal()
+
+
+DECIMAL_CODEC_OPTIONS = CodecOptions(type_registry=TypeRegistry([DecimalCodec()]))
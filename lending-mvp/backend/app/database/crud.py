@@ -1,15 +1,18 @@
-from typing import List, Optional
+from typing import List, Optional, Tuple
 from bson import ObjectId
 from motor.motor_asyncio import AsyncIOMotorCollection
-from ..auth.security import get_password_hash, verify_password
+from pymongo import ASCENDING
+from ..auth.security import get_password_hash_async
+from ..auth.user_cache import user_cache
 from ..models import UserInDB, UserCreate, UserUpdate
 from ..config import settings
+from .pagination import find_page, find_with_total, TotalMode
 class UserCRUD:
     def __init__(self, collection: AsyncIOMotorCollection):
         self.collection = collection
 
     async def create_user(self, user: UserCreate) -> UserInDB:
-        hashed_password = get_password_hash(user.password)
+        hashed_password = await get_password_hash_async(user.password)
 
         # Create model WITHOUT generating a dummy id yet
         user_in_db = UserInDB(
@@ -58,10 +61,33 @@ class UserCRUD:
             return UserInDB.model_validate(user_data)
         return None
 
+    async def get_user_by_login(self, identifier: str) -> Optional[UserInDB]:
+        """
+        Resolve a login identifier (username or email) with a single query.
+        A username match takes precedence over an email match, as before.
+        """
+        users_data = await self.collection.find(
+            {"$or": [{"username": identifier}, {"email": identifier}]}
+        ).to_list(length=2)
+        if not users_data:
+            return None
+        user_data = next((u for u in users_data if u.get("username") == identifier), users_data[0])
+        return UserInDB.model_validate(user_data)
+
     async def get_users(self, skip: int = 0, limit: int = 100) -> List[UserInDB]:
         users_data = await self.collection.find().skip(skip).limit(limit).to_list(length=limit)
         return [UserInDB.model_validate(user_data) for user_data in users_data]
     
+    async def get_users_with_total(self, skip: int = 0, limit: int = 100, total_mode: TotalMode = TotalMode.EXACT) -> Tuple[List[UserInDB], Optional[int]]:
+        """Page of users plus the total (collection metadata, as the list is unfiltered)."""
+        users_data, total = await find_with_total(self.collection, {}, [{"$skip": skip}, {"$limit": limit}], total_mode)
+        return [UserInDB.model_validate(user_data) for user_data in users_data], total
+
+    async def get_users_page(self, first: int = 50, after: Optional[str] = None) -> Tuple[List[Tuple[str, UserInDB]], bool]:
+        """Keyset page ordered by (username, _id) ascending."""
+        edges, has_next_page = await find_page(self.collection, {}, "username", ASCENDING, first, after)
+        return [(cursor, UserInDB.model_validate(user_data)) for cursor, user_data in edges], has_next_page
+
     async def count_users(self) -> int:
         return await self.collection.count_documents({})
 
@@ -71,7 +97,7 @@ class UserCRUD:
 
         update_data = user_update.model_dump(exclude_unset=True)
         if "password" in update_data:
-            update_data["hashed_password"] = get_password_hash(user_update.password)
+            update_data["hashed_password"] = await get_password_hash_async(user_update.password)
             del update_data["password"]
 
         if update_data:
@@ -79,6 +105,7 @@ class UserCRUD:
                 {"_id": ObjectId(user_id)},
                 {"$set": update_data}
             )
+            user_cache.invalidate(user_id)
             if result.modified_count == 1:
                 return await self.get_user_by_id(user_id)
         return None
@@ -87,4 +114,5 @@ class UserCRUD:
         if not ObjectId.is_valid(user_id):
             return False
         result = await self.collection.delete_one({"_id": ObjectId(user_id)})
+        user_cache.invalidate(user_id)
         return result.deleted_count == 1
\ No newline at end of file
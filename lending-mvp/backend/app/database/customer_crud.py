@@ -1,8 +1,87 @@
-from typing import List, Optional, Dict, Any
+import re
+import unicodedata
+from typing import List, Optional, Dict, Any, Tuple
 from bson import ObjectId
 from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import ASCENDING, UpdateOne
+from pymongo.errors import BulkWriteError
 from ..models import CustomerInDB, CustomerCreate, CustomerUpdate
 from datetime import datetime, date, timezone
+from .pagination import find_page, find_with_total, TotalMode
+
+# Customer search: every word of display_name and email_address is stored as its
+# normalized prefixes in `search_tokens` (multikey index), so a type-ahead term is an
+# indexed equality match instead of an unanchored case-insensitive $regex.
+SEARCH_MAX_PREFIX_LENGTH = 20
+# Type-ahead (get_customer_picker) ranks at most this many indexed matches, so a one
+# or two letter term costs the same however many customers it matches
+PICKER_CANDIDATE_LIMIT = 1000
+_WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def normalize_search_text(value: Optional[str]) -> str:
+    """Lowercase and strip accents so "José" and "jose" index the same way."""
+    if not value:
+        return ""
+    decomposed = unicodedata.normalize("NFKD", value)
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).lower()
+
+
+def search_words(value: Optional[str]) -> List[str]:
+    return _WORD_PATTERN.findall(normalize_search_text(value))
+
+
+def build_search_fields(display_name: Optional[str], email_address: Optional[str]) -> Dict[str, Any]:
+    """Denormalized search fields stored alongside every customer document."""
+    tokens = set()
+    for word in search_words(display_name) + search_words(email_address):
+        for length in range(1, min(len(word), SEARCH_MAX_PREFIX_LENGTH) + 1):
+            tokens.add(word[:length])
+    return {
+        "search_tokens": sorted(tokens),
+        "search_name": " ".join(search_words(display_name)),
+        "search_email": normalize_search_text(email_address),
+    }
+
+
+def _search_terms(search_term: str) -> List[str]:
+    return [word[:SEARCH_MAX_PREFIX_LENGTH] for word in search_words(search_term)]
+
+
+def _search_match(search_term: Optional[str]) -> Dict[str, Any]:
+    if not search_term:
+        return {}
+    terms = _search_terms(search_term)
+    if not terms:
+        # Nothing searchable (only punctuation): match nothing rather than everything
+        return {"search_tokens": {"$in": []}}
+    return {"search_tokens": {"$all": terms}}
+
+
+def _relevance_pipeline(search_term: str, candidate_limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Match by tokens, then rank: exact name > name prefix > exact email > other
+    matches. With candidate_limit only the first candidate_limit matches read from
+    the search_tokens index are ranked, so the ranking is approximate beyond them.
+    """
+    pipeline: List[Dict[str, Any]] = [{"$match": _search_match(search_term)}]
+    if candidate_limit:
+        pipeline.append({"$limit": candidate_limit})
+    return pipeline + _relevance_ranking(search_term)
+
+
+def _relevance_ranking(search_term: str) -> List[Dict[str, Any]]:
+    phrase = " ".join(search_words(search_term))
+    email = normalize_search_text(search_term).strip()
+    return [
+        {"$addFields": {"_score": {"$add": [
+            {"$cond": [{"$eq": ["$search_name", phrase]}, 100, 0]},
+            {"$cond": [{"$eq": [{"$indexOfCP": [{"$ifNull": ["$search_name", ""]}, phrase]}, 0]}, 10, 0]},
+            {"$cond": [{"$eq": ["$search_email", email]}, 50, 0]},
+        ]}}},
+        {"$sort": {"_score": -1, "display_name": 1, "_id": 1}},
+    ]
+
 
 class CustomerCRUD:
     def __init__(self, collection: AsyncIOMotorCollection):
@@ -10,7 +89,9 @@ class CustomerCRUD:
 
     
 
-    async def create_customer(self, customer: CustomerCreate) -> CustomerInDB:
+    @staticmethod
+    def _customer_document(customer: CustomerCreate) -> Tuple[CustomerInDB, Dict[str, Any]]:
+        """The stored form of a new customer, with its search fields."""
         data = customer.model_dump(exclude_unset=True)
 
         # Convert date → datetime if present
@@ -32,10 +113,73 @@ class CustomerCRUD:
             exclude={"id"},
             exclude_unset=True,
         )
+        doc.update(build_search_fields(customer_in_db.display_name, customer_in_db.email_address))
+        return customer_in_db, doc
 
+    async def create_customer(self, customer: CustomerCreate) -> CustomerInDB:
+        customer_in_db, doc = self._customer_document(customer)
         result = await self.collection.insert_one(doc)
         customer_in_db.id = result.inserted_id
         return customer_in_db
+
+    async def insert_customers(self, customers: List[Tuple[Any, CustomerCreate]]) -> List[Tuple[Any, str, str]]:
+        """
+        Bulk insert for imports. customers are (key, customer) pairs, e.g. keyed by
+        source row number. Customers whose display_name or email_address repeats an
+        earlier one in the list, or matches an existing customer, are skipped as
+        duplicates. The rest are written with one unordered insert_many. Returns
+        (key, outcome, message) per customer, where outcome is inserted, duplicate or
+        failed.
+        """
+        results: List[Tuple[Any, str, str]] = []
+        candidates: List[Tuple[Any, CustomerCreate]] = []
+        names, emails = set(), set()
+        for key, customer in customers:
+            if customer.display_name in names or (customer.email_address and customer.email_address in emails):
+                results.append((key, "duplicate", "display_name or email_address repeats an earlier row"))
+                continue
+            names.add(customer.display_name)
+            if customer.email_address:
+                emails.add(customer.email_address)
+            candidates.append((key, customer))
+        if not candidates:
+            return results
+
+        conditions: List[Dict[str, Any]] = [{"display_name": {"$in": list(names)}}]
+        if emails:
+            conditions.append({"email_address": {"$in": list(emails)}})
+        existing_names, existing_emails = set(), set()
+        async for existing in self.collection.find({"$or": conditions}, {"display_name": 1, "email_address": 1}):
+            existing_names.add(existing.get("display_name"))
+            existing_emails.add(existing.get("email_address"))
+
+        to_insert: List[Tuple[Any, Dict[str, Any]]] = []
+        for key, customer in candidates:
+            if customer.display_name in existing_names:
+                results.append((key, "duplicate", "a customer with this display_name already exists"))
+            elif customer.email_address and customer.email_address in existing_emails:
+                results.append((key, "duplicate", "a customer with this email_address already exists"))
+            else:
+                to_insert.append((key, self._customer_document(customer)[1]))
+        if not to_insert:
+            return results
+
+        write_errors: Dict[int, Dict[str, Any]] = {}
+        try:
+            await self.collection.insert_many([doc for _, doc in to_insert], ordered=False)
+        except BulkWriteError as e:
+            write_errors = {error["index"]: error for error in e.details.get("writeErrors", [])}
+        for index, (key, _) in enumerate(to_insert):
+            error = write_errors.get(index)
+            if error is None:
+                results.append((key, "inserted", ""))
+            elif error.get("code") == 11000:
+                # Unique display_name taken by a concurrent writer
+                results.append((key, "duplicate", "a customer with this display_name already exists"))
+            else:
+                results.append((key, "failed", error.get("errmsg", "write error")))
+        return results
+
     async def get_customer_by_id(self, customer_id: str) -> Optional[CustomerInDB]:
         query = {"_id": ObjectId(customer_id)} if ObjectId.is_valid(customer_id) else {"_id": customer_id}
         customer_data = await self.collection.find_one(query)
@@ -43,6 +187,14 @@ class CustomerCRUD:
             return CustomerInDB.model_validate(customer_data)
         return None
 
+    async def get_customers_by_ids(self, customer_ids: List[str]) -> List[CustomerInDB]:
+        """Fetch many customers with a single $in query (used by the DataLoaders)."""
+        if not customer_ids:
+            return []
+        ids = [ObjectId(customer_id) if ObjectId.is_valid(customer_id) else customer_id for customer_id in customer_ids]
+        customers_data = await self.collection.find({"_id": {"$in": ids}}).to_list(length=len(ids))
+        return [CustomerInDB.model_validate(customer_data) for customer_data in customers_data]
+
     async def get_customer_by_email(self, email: str) -> Optional[CustomerInDB]:
         customer_data = await self.collection.find_one({"email_address": email})
         if customer_data:
@@ -50,29 +202,69 @@ class CustomerCRUD:
         return None
 
     async def get_customers(self, skip: int = 0, limit: int = 100, search_term: Optional[str] = None) -> List[CustomerInDB]:
-        query: Dict[str, Any] = {}
         if search_term:
-            # Case-insensitive regex search on display_name or email_address
-            query = {
-                "$or": [
-                    {"display_name": {"$regex": search_term, "$options": "i"}},
-                    {"email_address": {"$regex": search_term, "$options": "i"}}
-                ]
-            }
-        
-        customers_data = await self.collection.find(query).skip(skip).limit(limit).to_list(length=limit)
+            # Indexed token search, ranked by relevance
+            pipeline = _relevance_pipeline(search_term) + [{"$skip": skip}, {"$limit": limit}]
+            customers_data = await self.collection.aggregate(pipeline).to_list(length=limit)
+        else:
+            customers_data = await self.collection.find({}).skip(skip).limit(limit).to_list(length=limit)
         return [CustomerInDB.model_validate(customer_data) for customer_data in customers_data]
 
-    async def count_customers(self, search_term: Optional[str] = None) -> int:
-        query: Dict[str, Any] = {}
+    async def get_customers_with_total(self, skip: int = 0, limit: int = 100, search_term: Optional[str] = None, total_mode: TotalMode = TotalMode.EXACT) -> Tuple[List[CustomerInDB], Optional[int]]:
+        """Page of customers (relevance-ranked when searching) plus the total in one round trip."""
+        items_pipeline: List[Dict[str, Any]] = _relevance_ranking(search_term) if search_term else []
+        items_pipeline += [{"$skip": skip}, {"$limit": limit}]
+
+        customers_data, total = await find_with_total(self.collection, _search_match(search_term), items_pipeline, total_mode)
+        return [CustomerInDB.model_validate(customer_data) for customer_data in customers_data], total
+
+    async def get_customer_picker(self, search_term: Optional[str] = None, limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        Compact type-ahead lookup: only _id and display_name, most relevant first.
+        Only the first PICKER_CANDIDATE_LIMIT matches are ranked, so for a short term
+        that matches more customers the best match may be missed until the term is
+        longer; customers(search_term) ranks every match.
+        """
+        limit = max(1, min(limit, 50))
         if search_term:
-            query = {
-                "$or": [
-                    {"display_name": {"$regex": search_term, "$options": "i"}},
-                    {"email_address": {"$regex": search_term, "$options": "i"}}
-                ]
-            }
-        return await self.collection.count_documents(query)
+            pipeline = _relevance_pipeline(search_term, PICKER_CANDIDATE_LIMIT) + [
+                {"$limit": limit},
+                {"$project": {"_id": 1, "display_name": 1}},
+            ]
+            return await self.collection.aggregate(pipeline).to_list(length=limit)
+        return await self.collection.find({}, {"_id": 1, "display_name": 1}).sort(
+            [("display_name", ASCENDING), ("_id", ASCENDING)]
+        ).limit(limit).to_list(length=limit)
+
+    async def get_customers_page(self, first: int = 50, after: Optional[str] = None, search_term: Optional[str] = None) -> Tuple[List[Tuple[str, CustomerInDB]], bool]:
+        """Keyset page ordered by (display_name, _id) ascending."""
+        query = _search_match(search_term)
+
+        edges, has_next_page = await find_page(self.collection, query, "display_name", ASCENDING, first, after)
+        return [(cursor, CustomerInDB.model_validate(customer_data)) for cursor, customer_data in edges], has_next_page
+
+    async def count_customers(self, search_term: Optional[str] = None) -> int:
+        return await self.collection.count_documents(_search_match(search_term))
+
+    async def backfill_search_fields(self, batch_size: int = 1000) -> int:
+        """Compute search fields for customers created before they existed. Returns the count updated."""
+        updated = 0
+        operations = []
+        cursor = self.collection.find(
+            {"search_tokens": {"$exists": False}},
+            {"display_name": 1, "email_address": 1},
+        ).batch_size(batch_size)
+        async for customer_data in cursor:
+            search_fields = build_search_fields(customer_data.get("display_name"), customer_data.get("email_address"))
+            operations.append(UpdateOne({"_id": customer_data["_id"]}, {"$set": search_fields}))
+            if len(operations) >= batch_size:
+                await self.collection.bulk_write(operations, ordered=False)
+                updated += len(operations)
+                operations = []
+        if operations:
+            await self.collection.bulk_write(operations, ordered=False)
+            updated += len(operations)
+        return updated
 
     async def update_customer(self, customer_id: str, customer_update: CustomerUpdate) -> Optional[CustomerInDB]:
         if not ObjectId.is_valid(customer_id):
@@ -81,6 +273,18 @@ class CustomerCRUD:
         update_data = customer_update.model_dump(exclude_unset=True)
         if update_data:
             update_data["updated_at"] = datetime.utcnow()
+            if "display_name" in update_data or "email_address" in update_data:
+                # Keep the search tokens in step with the fields they are built from
+                current: Dict[str, Any] = {}
+                if "display_name" not in update_data or "email_address" not in update_data:
+                    current = await self.collection.find_one(
+                        {"_id": ObjectId(customer_id)},
+                        {"display_name": 1, "email_address": 1}
+                    ) or {}
+                update_data.update(build_search_fields(
+                    update_data.get("display_name", current.get("display_name")),
+                    update_data.get("email_address", current.get("email_address")),
+                ))
             result = await self.collection.update_one(
                 {"_id": ObjectId(customer_id)},
                 {"$set": update_data}
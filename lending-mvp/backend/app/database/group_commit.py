@@ -0,0 +1,70 @@
+"""
+Group commit for savings deposits and withdrawals.
+
+Concurrent writes to the same account that arrive within a short window are
+collected and handed to TransactionCRUD.create_transactions_grouped, which applies
+them in arrival order inside one MongoDB transaction: one balance read, one $inc of
+the net amount and one insert_many of the accepted records. Each caller still gets
+its own result (None when its withdrawal was rejected).
+"""
+import asyncio
+from typing import Any, Coroutine, Dict, List, Optional, Set, Tuple
+
+from ..config import settings
+
+
+class GroupCommitter:
+    def __init__(self, window_ms: int, max_batch: int):
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self._pending: Dict[str, List[Tuple[Any, asyncio.Future]]] = {}
+        # The event loop only keeps weak references to tasks; hold them until they finish
+        self._tasks: Set[asyncio.Task] = set()
+
+    def _spawn(self, coroutine: Coroutine[Any, Any, None]) -> None:
+        task = asyncio.create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def submit(self, transaction_crud, transaction) -> Optional[Any]:
+        """Queue a transaction for its account and wait for the batch it lands in to commit."""
+        account_id = str(transaction.account_id)
+        future = asyncio.get_running_loop().create_future()
+        batch = self._pending.setdefault(account_id, [])
+        batch.append((transaction, future))
+
+        if len(batch) == 1:
+            self._spawn(self._flush_after_window(transaction_crud, account_id, batch))
+        elif len(batch) >= self.max_batch:
+            self._take(account_id, batch)
+            self._spawn(self._commit(transaction_crud, account_id, batch))
+
+        return await future
+
+    def _take(self, account_id: str, batch: List[Tuple[Any, asyncio.Future]]) -> bool:
+        # A batch is committed exactly once: by the window timer or by reaching max_batch
+        if self._pending.get(account_id) is batch:
+            del self._pending[account_id]
+            return True
+        return False
+
+    async def _flush_after_window(self, transaction_crud, account_id: str, batch) -> None:
+        await asyncio.sleep(self.window)
+        if self._take(account_id, batch):
+            await self._commit(transaction_crud, account_id, batch)
+
+    async def _commit(self, transaction_crud, account_id: str, batch) -> None:
+        try:
+            results = await transaction_crud.create_transactions_grouped(account_id, [t for t, _ in batch])
+        except Exception as e:
+            print(f"Group commit for account {account_id} failed: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+
+group_committer = GroupCommitter(settings.SAVINGS_GROUP_COMMIT_WINDOW_MS, settings.SAVINGS_GROUP_COMMIT_MAX_BATCH)
@@ -0,0 +1,236 @@
+"""
+Declarative index catalog.
+
+Every index the application relies on is listed here, per collection. The catalog
+is applied idempotently at startup (create_indexes in database/__init__.py) and can
+be compared with what the server actually has (index_drift). QUERY_SHAPES mirrors
+the filters/sorts issued by the CRUD classes; verify_query_plans explains each one
+and reports any that would fall back to a COLLSCAN.
+"""
+from datetime import datetime
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+# Index build options that are compared when looking for drift
+_COMPARED_OPTIONS = ("unique", "sparse", "partialFilterExpression", "expireAfterSeconds")
+
+
+def _index(keys, name: str, **options) -> IndexModel:
+    # background is a no-op on MongoDB >= 4.2 but keeps older servers from blocking
+    return IndexModel(keys, name=name, background=True, **options)
+
+
+INDEX_CATALOG: Dict[str, List[IndexModel]] = {
+    "users": [
+        _index([("email", ASCENDING)], "email_1", unique=True),
+        _index([("username", ASCENDING)], "username_1", unique=True),
+    ],
+    "customers": [
+        _index([("display_name", ASCENDING)], "display_name_1", unique=True),
+        _index([("display_name", ASCENDING), ("_id", ASCENDING)], "display_name_1__id_1"),
+        _index([("email_address", ASCENDING)], "email_address_1"),
+        _index([("search_tokens", ASCENDING)], "search_tokens_1"),
+    ],
+    "loans": [
+        _index([("borrower_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], "borrower_id_1_created_at_-1__id_-1"),
+        _index([("created_at", DESCENDING), ("_id", DESCENDING)], "created_at_-1__id_-1"),
+        _index([("loan_id", ASCENDING)], "loan_id_1"),
+        _index([("loanId", ASCENDING)], "loanId_1"),
+        # Replaces status_1; the _id tiebreak lets batch jobs walk a status in _id order
+        _index([("status", ASCENDING), ("_id", ASCENDING)], "status_1__id_1"),
+        _index([("branch", ASCENDING)], "branch_1"),
+        # Only loans whose aging bucket can still change without a repayment are indexed
+        _index([("delinquency_review_date", ASCENDING)], "delinquency_review_date_1",
+               partialFilterExpression={"delinquency_review_date": {"$exists": True}}),
+        # Only loans with an installment outstanding; the penalty job reads the overdue ones
+        _index([("next_due_date", ASCENDING)], "next_due_date_1", partialFilterExpression={"next_due_date": {"$exists": True}}),
+    ],
+    # loan_transactions documents use the model's camelCase aliases as field names
+    "loan_transactions": [
+        _index([("loanId", ASCENDING), ("transactionDate", DESCENDING), ("_id", DESCENDING)], "loanId_1_transactionDate_-1__id_-1"),
+        _index([("transactionDate", DESCENDING), ("_id", DESCENDING)], "transactionDate_-1__id_-1"),
+        # Bank references are unique; transactions entered without one are not indexed
+        _index([("referenceNumber", ASCENDING)], "referenceNumber_1", unique=True, partialFilterExpression={"referenceNumber": {"$type": "string"}}),
+    ],
+    "loan_products": [
+        _index([("product_code", ASCENDING)], "product_code_1"),
+    ],
+    "savings": [
+        _index([("user_id", ASCENDING)], "user_id_1"),
+        _index([("account_number", ASCENDING)], "account_number_1"),
+        _index([("status", ASCENDING), ("_id", ASCENDING)], "status_1__id_1"),
+        _index([("type", ASCENDING), ("status", ASCENDING), ("maturity_date", ASCENDING)], "type_1_status_1_maturity_date_1"),
+    ],
+    "transactions": [
+        _index([("account_id", ASCENDING), ("timestamp", DESCENDING)], "account_id_1_timestamp_-1"),
+    ],
+    # Only entries linked to a loan/borrower are indexed on those fields
+    "ledger_entries": [
+        # Replaces timestamp_-1; the _id tiebreak lets ordered exports stream without a sort
+        _index([("timestamp", DESCENDING), ("_id", DESCENDING)], "timestamp_-1__id_-1"),
+        _index([("transaction_id", ASCENDING)], "transaction_id_1"),
+        # Entries posted before line numbers were recorded are not covered
+        _index([("transaction_id", ASCENDING), ("line_no", ASCENDING)], "transaction_id_1_line_no_1",
+               unique=True, partialFilterExpression={"line_no": {"$exists": True}}),
+        _index([("account", ASCENDING), ("timestamp", DESCENDING)], "account_1_timestamp_-1"),
+        _index([("borrower_id", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)], "borrower_id_1_timestamp_-1__id_-1",
+               partialFilterExpression={"borrower_id": {"$exists": True}}),
+        _index([("loan_id", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)], "loan_id_1_timestamp_-1__id_-1",
+               partialFilterExpression={"loan_id": {"$exists": True}}),
+    ],
+    "account_balance_snapshots": [
+        _index([("as_of", DESCENDING)], "as_of_-1"),
+        _index([("account", ASCENDING), ("as_of", DESCENDING)], "account_1_as_of_-1"),
+    ],
+}
+
+
+class QueryShape(NamedTuple):
+    name: str
+    collection: str
+    filter: Dict[str, Any]
+    sort: Optional[List[Any]] = None
+
+
+_SAMPLE_ID = ObjectId()
+_SAMPLE_DATE = datetime(2024, 1, 1)
+
+QUERY_SHAPES: List[QueryShape] = [
+    QueryShape("UserCRUD.get_user_by_email", "users", {"email": "x"}),
+    QueryShape("UserCRUD.get_user_by_username", "users", {"username": "x"}),
+    QueryShape("UserCRUD.get_user_by_login", "users", {"$or": [{"username": "x"}, {"email": "x"}]}),
+    QueryShape("UserCRUD.get_users_page", "users", {}, [("username", ASCENDING), ("_id", ASCENDING)]),
+    QueryShape("CustomerCRUD.get_customer_by_email", "customers", {"email_address": "x"}),
+    QueryShape("CustomerCRUD.get_customers_page", "customers", {}, [("display_name", ASCENDING), ("_id", ASCENDING)]),
+    QueryShape("CustomerCRUD.get_customers(search_term)", "customers", {"search_tokens": {"$all": ["x", "y"]}}),
+    QueryShape("CustomerCRUD.get_customers_page(search_term)", "customers", {"search_tokens": {"$all": ["x"]}}, [("display_name", ASCENDING), ("_id", ASCENDING)]),
+    QueryShape("CustomerCRUD.insert_customers", "customers", {"$or": [{"display_name": {"$in": ["x"]}}, {"email_address": {"$in": ["x"]}}]}),
+    QueryShape("LoanCRUD.get_loan_by_id", "loans", {"$or": [{"_id": _SAMPLE_ID}, {"loanId": "x"}, {"loan_id": "x"}]}),
+    QueryShape("LoanCRUD.get_loans_by_ids", "loans", {"$or": [{"_id": {"$in": [_SAMPLE_ID]}}, {"loanId": {"$in": ["x"]}}, {"loan_id": {"$in": ["x"]}}]}),
+    QueryShape("PortfolioRollupCRUD.find_loans", "loans", {"$or": [{"_id": {"$in": [_SAMPLE_ID, "x"]}}, {"loanId": {"$in": ["x"]}}, {"loan_id": {"$in": ["x"]}}]}),
+    QueryShape("LoanCRUD.get_loans(borrower_id)", "loans", {"borrower_id": _SAMPLE_ID}),
+    QueryShape("LoanCRUD.get_loans_page", "loans", {}, [("created_at", DESCENDING), ("_id", DESCENDING)]),
+    QueryShape("LoanCRUD.get_loans_page(borrower_id)", "loans", {"borrower_id": _SAMPLE_ID}, [("created_at", DESCENDING), ("_id", DESCENDING)]),
+    QueryShape("LoanCRUD.delinquency_due", "loans", {"delinquency_review_date": {"$exists": True, "$lte": _SAMPLE_DATE}}),
+    QueryShape("LoanCRUD.overdue_loans", "loans", {"next_due_date": {"$exists": True, "$lt": _SAMPLE_DATE}, "status": "active", "loanProduct": {"$in": ["x", "y"]}}),
+    QueryShape("LoanCRUD.active_loans_batch", "loans", {"status": "active", "_id": {"$gt": _SAMPLE_ID}}, [("_id", ASCENDING)]),
+    QueryShape("LoanTransactionCRUD.get_loan_transactions(loan_id)", "loan_transactions", {"loanId": "x"}),
+    QueryShape("LoanTransactionCRUD.get_loan_transactions_page", "loan_transactions", {}, [("transactionDate", DESCENDING), ("_id", DESCENDING)]),
+    QueryShape("LoanTransactionCRUD.get_loan_transactions_page(loan_id)", "loan_transactions", {"loanId": "x"}, [("transactionDate", DESCENDING), ("_id", DESCENDING)]),
+    QueryShape("LoanBalanceCRUD.refresh_last_transaction_date", "loan_transactions", {"loanId": "x"}, [("transactionDate", DESCENDING)]),
+    QueryShape("LoanBalanceCRUD.rebuild_all", "loan_transactions", {}, [("loanId", ASCENDING), ("transactionDate", DESCENDING), ("_id", DESCENDING)]),
+    QueryShape("LoanTransactionCRUD.insert_loan_transactions", "loan_transactions", {"referenceNumber": {"$in": ["x", "y"]}}),
+    QueryShape("loan_product_crud.get_loan_product_by_code", "loan_products", {"product_code": "x"}),
+    QueryShape("SavingsCRUD.get_savings_accounts_by_user_id", "savings", {"user_id": "x"}),
+    QueryShape("SavingsCRUD.due_time_deposits", "savings", {"type": "time_deposit", "status": "active", "maturity_date": {"$lt": _SAMPLE_DATE}}, [("maturity_date", ASCENDING)]),
+    QueryShape("SavingsCRUD.accrual_batch", "savings", {"status": "active", "type": {"$in": ["regular", "high_yield", "time_deposit"]}, "last_accrual_date": {"$not": {"$gte": _SAMPLE_DATE}}, "_id": {"$gt": _SAMPLE_ID}}, [("_id", ASCENDING)]),
+    QueryShape("TransactionCRUD.get_transactions_by_account_id", "transactions", {"account_id": _SAMPLE_ID}, [("timestamp", DESCENDING)]),
+    QueryShape("accounting_service.get_ledger_for_borrower", "ledger_entries", {"borrower_id": "x"}, [("timestamp", DESCENDING), ("_id", DESCENDING)]),
+    QueryShape("accounting_service.get_ledger_for_borrower(date range)", "ledger_entries", {"borrower_id": "x", "timestamp": {"$gte": _SAMPLE_DATE, "$lt": _SAMPLE_DATE}}, [("timestamp", DESCENDING), ("_id", DESCENDING)]),
+    QueryShape("accounting_service.get_ledger_for_borrower(loan_id)", "ledger_entries", {"borrower_id": "x", "loan_id": "x"}, [("timestamp", DESCENDING), ("_id", DESCENDING)]),
+    QueryShape("AccountBalanceCRUD.movements(since snapshot)", "ledger_entries", {"timestamp": {"$gte": _SAMPLE_DATE, "$lt": _SAMPLE_DATE}}),
+    QueryShape("AccountBalanceCRUD.movements(account)", "ledger_entries", {"account": "x", "timestamp": {"$gte": _SAMPLE_DATE, "$lt": _SAMPLE_DATE}}),
+    QueryShape("AccountBalanceCRUD.latest_snapshot_date", "account_balance_snapshots", {"as_of": {"$lte": _SAMPLE_DATE}}, [("as_of", DESCENDING)]),
+    QueryShape("AccountBalanceCRUD.latest_snapshot_date(account)", "account_balance_snapshots", {"as_of": {"$lte": _SAMPLE_DATE}, "account": "x"}, [("as_of", DESCENDING)]),
+    QueryShape("accounting_service.post_transactions_batch", "ledger_entries", {"transaction_id": {"$in": ["x", "y"]}}),
+    QueryShape("export_service.loan_key_batches(branch)", "loans", {"$and": [{"branch": "x"}]}),
+    QueryShape("export_service.export_loan_transactions(date range)", "loan_transactions", {"transactionDate": {"$gte": _SAMPLE_DATE, "$lt": _SAMPLE_DATE}}, [("transactionDate", ASCENDING), ("_id", ASCENDING)]),
+    QueryShape("export_service.export_loan_transactions(loans)", "loan_transactions", {"loanId": {"$in": ["x", "y"]}, "transactionDate": {"$gte": _SAMPLE_DATE}}, [("transactionDate", ASCENDING), ("_id", ASCENDING)]),
+    QueryShape("export_service.export_ledger_entries(date range)", "ledger_entries", {"timestamp": {"$gte": _SAMPLE_DATE, "$lt": _SAMPLE_DATE}}, [("timestamp", ASCENDING), ("_id", ASCENDING)]),
+    QueryShape("export_service.export_ledger_entries(loans)", "ledger_entries", {"loan_id": {"$in": ["x", "y"]}, "timestamp": {"$gte": _SAMPLE_DATE}}, [("timestamp", ASCENDING), ("_id", ASCENDING)]),
+    QueryShape("accounting_service.backfill_ledger_links", "ledger_entries", {"transaction_id": {"$regex": "^disbursement-"}, "loan_id": {"$exists": False}}),
+]
+
+
+def _spec(document: Dict[str, Any]) -> Dict[str, Any]:
+    """Comparable form of an index, from either IndexModel.document or index_information()."""
+    keys = document["key"]
+    keys = list(keys.items()) if hasattr(keys, "items") else list(keys)
+    spec = {"key": [(field, int(direction) if isinstance(direction, (int, float)) else direction) for field, direction in keys]}
+    for option in _COMPARED_OPTIONS:
+        if option in document:
+            spec[option] = document[option]
+    spec.setdefault("unique", False)
+    return spec
+
+
+async def apply_index_catalog(db: AsyncIOMotorDatabase) -> Dict[str, List[str]]:
+    """
+    Create every catalog index that is missing. Indexes that already exist with the
+    same definition are left alone; conflicting definitions are reported, not dropped.
+    Returns {"created": [...], "failed": [...]} as "collection.index" names.
+    """
+    report: Dict[str, List[str]] = {"created": [], "failed": []}
+    drift = await index_drift(db)
+    for collection_name, models in INDEX_CATALOG.items():
+        missing = set(drift[collection_name]["missing"])
+        to_create = [model for model in models if model.document["name"] in missing]
+        if not to_create:
+            continue
+        try:
+            await db[collection_name].create_indexes(to_create)
+            report["created"].extend(f"{collection_name}.{model.document['name']}" for model in to_create)
+        except OperationFailure as e:
+            print(f"Error creating indexes on {collection_name}: {e}")
+            report["failed"].extend(f"{collection_name}.{model.document['name']}" for model in to_create)
+    return report
+
+
+async def index_drift(db: AsyncIOMotorDatabase) -> Dict[str, Dict[str, List[str]]]:
+    """
+    Compare the server's indexes with the catalog, per collection:
+    missing (in catalog only), changed (same name, different definition) and
+    extra (on the server only, excluding _id_).
+    """
+    drift: Dict[str, Dict[str, List[str]]] = {}
+    for collection_name, models in INDEX_CATALOG.items():
+        try:
+            existing = await db[collection_name].index_information()
+        except OperationFailure:
+            existing = {}
+        expected = {model.document["name"]: _spec(model.document) for model in models}
+        actual = {name: _spec(info) for name, info in existing.items() if name != "_id_"}
+        drift[collection_name] = {
+            "missing": sorted(name for name in expected if name not in actual),
+            "changed": sorted(name for name in expected if name in actual and actual[name] != expected[name]),
+            "extra": sorted(name for name in actual if name not in expected),
+        }
+    return drift
+
+
+def _plan_stages(plan: Any) -> List[str]:
+    stages: List[str] = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        for value in plan.values():
+            stages.extend(_plan_stages(value))
+    elif isinstance(plan, list):
+        for item in plan:
+            stages.extend(_plan_stages(item))
+    return stages
+
+
+async def verify_query_plans(db: AsyncIOMotorDatabase) -> List[Dict[str, Any]]:
+    """
+    Explain every entry of QUERY_SHAPES and return one result per shape with the
+    winning plan's stages and whether it contains a COLLSCAN.
+    """
+    results = []
+    for shape in QUERY_SHAPES:
+        cursor = db[shape.collection].find(shape.filter)
+        if shape.sort:
+            cursor = cursor.sort(shape.sort)
+        explain = await cursor.explain()
+        stages = _plan_stages(explain.get("queryPlanner", {}).get("winningPlan", {}))
+        results.append({
+            "name": shape.name,
+            "collection": shape.collection,
+            "stages": stages,
+            "collscan": "COLLSCAN" in stages,
+        })
+    return results
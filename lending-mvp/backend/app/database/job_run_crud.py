@@ -0,0 +1,65 @@
+from typing import Optional, Dict, Any
+from datetime import datetime, timedelta, timezone
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo.errors import DuplicateKeyError
+
+
+class JobRunCRUD:
+    """
+    One document per run of a scheduled job in job_runs, keyed by the job and its
+    idempotency key (_id "<job>:<key>", e.g. "savings-interest-accrual:2024-01-31").
+    A run can only be claimed once: completed runs are never repeated and a running
+    one is only taken over after stale_after without a heartbeat, e.g. when the
+    process that claimed it died.
+    """
+
+    def __init__(self, collection: AsyncIOMotorCollection):
+        self.collection = collection
+
+    @staticmethod
+    def run_id(job: str, key: str) -> str:
+        return f"{job}:{key}"
+
+    async def claim(self, job: str, key: str, stale_after: timedelta) -> bool:
+        """Mark the run as running. Returns False when it already completed or is running elsewhere."""
+        now = datetime.now(timezone.utc)
+        try:
+            # Matches a failed or stale run; otherwise the upsert inserts, and an
+            # existing completed or live run turns that into a duplicate key error
+            await self.collection.update_one(
+                {"_id": self.run_id(job, key), "$or": [
+                    {"status": "failed"},
+                    {"status": "running", "heartbeat_at": {"$lt": now - stale_after}},
+                ]},
+                {
+                    "$set": {"job": job, "key": key, "status": "running", "started_at": now, "heartbeat_at": now, "error": None},
+                    "$inc": {"attempts": 1},
+                },
+                upsert=True
+            )
+            return True
+        except DuplicateKeyError:
+            return False
+
+    async def heartbeat(self, job: str, key: str, progress: Optional[Dict[str, Any]] = None) -> None:
+        update: Dict[str, Any] = {"heartbeat_at": datetime.now(timezone.utc)}
+        if progress:
+            update["progress"] = progress
+        await self.collection.update_one({"_id": self.run_id(job, key)}, {"$set": update})
+
+    async def complete(self, job: str, key: str, result: Dict[str, Any]) -> None:
+        now = datetime.now(timezone.utc)
+        await self.collection.update_one(
+            {"_id": self.run_id(job, key)},
+            {"$set": {"status": "completed", "finished_at": now, "heartbeat_at": now, "result": result}}
+        )
+
+    async def fail(self, job: str, key: str, error: str) -> None:
+        now = datetime.now(timezone.utc)
+        await self.collection.update_one(
+            {"_id": self.run_id(job, key)},
+            {"$set": {"status": "failed", "finished_at": now, "heartbeat_at": now, "error": error}}
+        )
+
+    async def get(self, job: str, key: str) -> Optional[Dict[str, Any]]:
+        return await self.collection.find_one({"_id": self.run_id(job, key)})
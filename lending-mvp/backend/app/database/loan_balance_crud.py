@@ -0,0 +1,162 @@
+from typing import List, Optional, Dict, Any
+from datetime import datetime, timezone
+from decimal import Decimal
+from bson import Decimal128
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import ReplaceOne, UpdateOne, ASCENDING, DESCENDING
+from pymongo.errors import BulkWriteError
+from ..basemodel.loan_transaction_model import LoanTransaction
+
+# Summary field that each transaction type accumulates into
+BALANCE_FIELDS = {
+    "disbursement": "principal_disbursed",
+    "repayment": "total_repaid",
+    "interest": "interest_charged",
+    "fee": "fees_charged",
+    "insurance": "fees_charged",
+    "penalty": "penalties_charged",
+}
+SUMMARY_FIELDS = ("principal_disbursed", "total_repaid", "interest_charged", "fees_charged", "penalties_charged", "outstanding")
+
+
+class LoanBalanceCRUD:
+    """
+    Per-loan balance summaries in the loan_balances collection, keyed by the loan id
+    the transactions reference (_id = loanId). outstanding is everything charged
+    (principal, interest, fees, penalties) minus repayments. The collection must be
+    opened with DECIMAL_CODEC_OPTIONS (see get_loan_balances_collection).
+    """
+
+    def __init__(self, collection: AsyncIOMotorCollection):
+        self.collection = collection
+
+    @staticmethod
+    def balance_increments(transaction: LoanTransaction, sign: int) -> Dict[str, Decimal128]:
+        amount = Decimal(str(transaction.amount)) * sign
+        outstanding = -amount if transaction.transaction_type == "repayment" else amount
+        return {
+            BALANCE_FIELDS[transaction.transaction_type]: Decimal128(amount),
+            "outstanding": Decimal128(outstanding),
+        }
+
+    async def apply_transaction(self, transaction: LoanTransaction, sign: int = 1, session=None) -> None:
+        """Add (sign=1) or remove (sign=-1) one transaction's effect on its loan summary."""
+        update: Dict[str, Any] = {
+            "$inc": self.balance_increments(transaction, sign),
+            "$set": {"updated_at": datetime.now(timezone.utc)},
+        }
+        if sign > 0:
+            update["$max"] = {"last_transaction_date": transaction.transaction_date}
+        await self.collection.update_one({"_id": transaction.loan_id}, update, upsert=True, session=session)
+
+    async def apply_transactions(self, transactions: List[LoanTransaction], session=None) -> None:
+        """Add the effect of many new transactions with one bulk write, aggregated per loan."""
+        increments: Dict[str, Dict[str, Decimal]] = {}
+        latest: Dict[str, datetime] = {}
+        for transaction in transactions:
+            loan_increments = increments.setdefault(transaction.loan_id, {})
+            for field, value in self.balance_increments(transaction, 1).items():
+                loan_increments[field] = loan_increments.get(field, Decimal("0")) + value.to_decimal()
+            if transaction.loan_id not in latest or transaction.transaction_date > latest[transaction.loan_id]:
+                latest[transaction.loan_id] = transaction.transaction_date
+        if not increments:
+            return
+        now = datetime.now(timezone.utc)
+        await self.collection.bulk_write([
+            UpdateOne(
+                {"_id": loan_id},
+                {
+                    "$inc": {field: Decimal128(value) for field, value in loan_increments.items()},
+                    "$set": {"updated_at": now},
+                    "$max": {"last_transaction_date": latest[loan_id]},
+                },
+                upsert=True
+            )
+            for loan_id, loan_increments in increments.items()
+        ], ordered=False, session=session)
+
+    async def refresh_last_transaction_date(self, loan_id: str, transactions: AsyncIOMotorCollection, session=None) -> None:
+        """Recompute last_transaction_date after a transaction was removed or moved away from the loan."""
+        latest = await transactions.find_one(
+            {"loanId": loan_id}, {"transactionDate": 1}, sort=[("transactionDate", DESCENDING)], session=session
+        )
+        await self.collection.update_one(
+            {"_id": loan_id},
+            {"$set": {"last_transaction_date": latest["transactionDate"] if latest else None}},
+            session=session
+        )
+
+    async def get_loan_balance(self, loan_id: str) -> Optional[Dict[str, Any]]:
+        return await self.collection.find_one({"_id": loan_id})
+
+    async def get_loan_balances_by_ids(self, loan_ids: List[str]) -> List[Dict[str, Any]]:
+        if not loan_ids:
+            return []
+        return await self.collection.find({"_id": {"$in": loan_ids}}).to_list(length=None)
+
+    async def rebuild_all(self, transactions: AsyncIOMotorCollection, batch_size: int = 1000) -> int:
+        """
+        Recompute every summary from the transaction history in one streaming pass
+        ordered by loanId (served by the loanId_1_transactionDate_-1__id_-1 index).
+        Summaries are written in bulk batches; summaries of loans without transactions
+        are removed at the end. Safe to run while transactions are written: summaries
+        updated after the pass started (updated_at) already hold those writes, so they
+        are neither replaced nor removed. Returns the number of loans summarised.
+        """
+        started_at = datetime.now(timezone.utc)
+        not_updated_since_start = {"$or": [{"updated_at": {"$lte": started_at}}, {"updated_at": {"$exists": False}}]}
+        operations: List[ReplaceOne] = []
+        summarised = 0
+        current_loan: Optional[str] = None
+        summary: Dict[str, Any] = {}
+
+        def finish_summary():
+            document = {field: Decimal128(summary[field]) for field in SUMMARY_FIELDS}
+            document.update(last_transaction_date=summary["last_transaction_date"], updated_at=started_at, rebuilt_at=started_at)
+            operations.append(ReplaceOne({"_id": current_loan, **not_updated_since_start}, document, upsert=True))
+
+        async def write(batch: List[ReplaceOne]) -> None:
+            try:
+                await self.collection.bulk_write(batch, ordered=False)
+            except BulkWriteError as e:
+                # A summary updated since the start matches no filter, so its upsert collides on _id: keep it as written
+                if e.details.get("writeConcernErrors") or any(error["code"] != 11000 for error in e.details["writeErrors"]):
+                    raise
+
+        cursor = transactions.find(
+            {}, {"loanId": 1, "transactionType": 1, "amount": 1, "transactionDate": 1}
+        ).sort([("loanId", ASCENDING), ("transactionDate", DESCENDING), ("_id", DESCENDING)]).batch_size(batch_size)
+        async for doc in cursor:
+            if doc.get("loanId") != current_loan:
+                if current_loan is not None:
+                    finish_summary()
+                    summarised += 1
+                current_loan = doc.get("loanId")
+                summary = {field: Decimal("0") for field in SUMMARY_FIELDS}
+                summary["last_transaction_date"] = None
+
+            field = BALANCE_FIELDS.get(doc.get("transactionType"))
+            if field is None or current_loan is None:
+                continue
+            amount = Decimal(str(doc["amount"]))
+            summary[field] += amount
+            summary["outstanding"] += -amount if doc["transactionType"] == "repayment" else amount
+            transaction_date = doc.get("transactionDate")
+            if transaction_date and (summary["last_transaction_date"] is None or transaction_date > summary["last_transaction_date"]):
+                summary["last_transaction_date"] = transaction_date
+
+            if len(operations) >= batch_size:
+                await write(operations)
+                operations = []
+
+        if current_loan is not None:
+            finish_summary()
+            summarised += 1
+        if operations:
+            await write(operations)
+
+        await self.collection.delete_many({"$and": [
+            {"$or": [{"rebuilt_at": {"$lt": started_at}}, {"rebuilt_at": {"$exists": False}}]},
+            not_updated_since_start,
+        ]})
+        return summarised
@@ -1,34 +1,104 @@
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple, AsyncIterator, Awaitable, Callable
 from bson import ObjectId
 from motor.motor_asyncio import AsyncIOMotorCollection
-from datetime import datetime, timezone
+from pymongo import ASCENDING, DESCENDING, ReturnDocument, UpdateOne
+from datetime import date, datetime, time, timedelta, timezone
+from decimal import Decimal
 from app.basemodel.loan_model import Loan, LoanCreate, LoanUpdate, PyObjectId
+from app.services.amortization_service import add_months, paid_installments, portfolio_schedules, to_centavos
+from .pagination import find_page, find_with_total, TotalMode
+from .codecs import DECIMAL_CODEC_OPTIONS
+from .portfolio_rollup_crud import PortfolioRollupCRUD, aging_bucket, loan_aging
+
+# Fields whose change moves a loan between portfolio rollup buckets
+_ROLLUP_FIELDS = ("status", "loanProduct", "branch", "amount_requested")
+# Fields whose change alters a loan's schedule and so its delinquency
+_DELINQUENCY_FIELDS = ("status", "amount_requested", "term_months", "interest_rate")
+# Delinquency dates with partial indexes on them; unset rather than null when there is none
+_PARTIAL_INDEX_FIELDS = ("next_due_date", "delinquency_review_date")
+
+
+def delinquency_fields(loans: List[Loan], repaid_cents: List[int], as_of: date) -> List[Dict[str, Any]]:
+    """
+    Delinquency of active loans as of as_of, from their equal-installment schedules
+    (due monthly from created_at, as LoanType.schedule) and what each has repaid,
+    applied to installments in due order. Returns the loan fields per loan;
+    delinquency_review_date is None where the bucket can no longer change by itself
+    (repaid in full, or 90+).
+    """
+    evaluated_at = datetime.combine(as_of, time())
+    scheduled = [row for row, loan in enumerate(loans) if loan.term_months >= 1 and loan.amount_requested >= 0 and loan.interest_rate >= 0]
+    schedules = portfolio_schedules([loans[row] for row in scheduled])
+    paid = dict(zip(scheduled, paid_installments(schedules, [repaid_cents[row] for row in scheduled]).tolist()))
+
+    fields = []
+    for row, loan in enumerate(loans):
+        installments = paid.get(row)
+        if installments is None or installments >= loan.term_months:
+            # Repaid in full, or without a schedule to fall behind on
+            fields.append({
+                "next_due_date": None, "days_past_due": 0, "aging_bucket": "current",
+                "delinquency_as_of": evaluated_at, "delinquency_review_date": None,
+            })
+            continue
+        due = add_months(loan.created_at.date(), installments + 1)
+        days_past_due = max((as_of - due).days, 0)
+        bucket, max_days = aging_bucket(days_past_due)
+        fields.append({
+            "next_due_date": datetime.combine(due, time()),
+            "days_past_due": days_past_due,
+            "aging_bucket": bucket,
+            "delinquency_as_of": evaluated_at,
+            "delinquency_review_date": datetime.combine(due + timedelta(days=max_days + 1), time()) if max_days is not None else None,
+        })
+    return fields
 
 class LoanCRUD:
-    def __init__(self, collection: AsyncIOMotorCollection):
+    # collection must be opened with DECIMAL_CODEC_OPTIONS (see get_loans_collection)
+    def __init__(self, collection: AsyncIOMotorCollection, rollup_crud: Optional[PortfolioRollupCRUD] = None):
         self.collection = collection
+        self.rollup_crud = rollup_crud or PortfolioRollupCRUD(
+            collection.database.get_collection("portfolio_rollups", codec_options=DECIMAL_CODEC_OPTIONS)
+        )
+
+    async def _in_transaction(self, callback):
+        async with await self.collection.database.client.start_session() as session:
+            return await session.with_transaction(callback)
+
+    async def _borrower_branch(self, borrower_id: Any, session=None) -> Optional[str]:
+        customer = await self.collection.database["customers"].find_one(
+            {"_id": borrower_id}, {"branch": 1}, session=session
+        )
+        return customer.get("branch") if customer else None
 
     async def create_loan(self, loan: LoanCreate) -> Loan:
+        """Insert the loan, stamped with its borrower's branch, and add it to the portfolio rollups."""
         loan_in_db = Loan(
             **loan.model_dump(),
             created_at=datetime.now(timezone.utc),
             updated_at=datetime.now(timezone.utc)
         )
 
-        doc = loan_in_db.model_dump(
-            by_alias=True,
-            exclude={"id"},
-            exclude_unset=True,
-        )
+        async def insert(session):
+            loan_in_db.branch = await self._borrower_branch(loan_in_db.borrower_id, session=session)
+            doc = loan_in_db.model_dump(
+                by_alias=True,
+                exclude={"id"},
+                exclude_unset=True,
+            )
+            doc["branch"] = loan_in_db.branch
+            result = await self.collection.insert_one(doc, session=session)
+            loan_in_db.id = result.inserted_id
+            await self.rollup_crud.add_loan(loan_in_db, session=session)
+            return loan_in_db
 
-        result = await self.collection.insert_one(doc)
-        loan_in_db.id = result.inserted_id
-        return loan_in_db
+        return await self._in_transaction(insert)
 
     async def get_loan_by_id(self, loan_id: str) -> Optional[Loan]:
         # Try finding by _id (ObjectId or string) OR by a custom loan_id field
         query_conditions = [
             {"_id": ObjectId(loan_id) if ObjectId.is_valid(loan_id) else loan_id},
+            {"loanId": loan_id},
             {"loan_id": loan_id}
         ]
         
@@ -43,6 +113,26 @@ class LoanCRUD:
             return Loan.model_validate(loan_data)
         return None
 
+    async def get_loans_by_ids(self, loan_ids: List[str]) -> List[Loan]:
+        """
+        Batch version of get_loan_by_id: matches each key against _id or the custom
+        loan_id field in a single query (used by the DataLoaders).
+        """
+        if not loan_ids:
+            return []
+        ids: List[Any] = []
+        custom_ids: List[Any] = []
+        for loan_id in loan_ids:
+            ids.append(ObjectId(loan_id) if ObjectId.is_valid(loan_id) else loan_id)
+            custom_ids.append(loan_id)
+            if loan_id.isdigit():
+                ids.append(int(loan_id))
+                custom_ids.append(int(loan_id))
+
+        query = {"$or": [{"_id": {"$in": ids}}, {"loanId": {"$in": custom_ids}}, {"loan_id": {"$in": custom_ids}}]}
+        loans_data = await self.collection.find(query).to_list(length=None)
+        return [Loan.model_validate(loan_data) for loan_data in loans_data]
+
     async def get_loans(self, skip: int = 0, limit: int = 100, borrower_id: Optional[str] = None) -> List[Loan]:
         query: Dict[str, Any] = {}
         if borrower_id:
@@ -51,6 +141,24 @@ class LoanCRUD:
         loans_data = await self.collection.find(query).skip(skip).limit(limit).to_list(length=limit)
         return [Loan.model_validate(loan_data) for loan_data in loans_data]
 
+    async def get_loans_with_total(self, skip: int = 0, limit: int = 100, borrower_id: Optional[str] = None, total_mode: TotalMode = TotalMode.EXACT) -> Tuple[List[Loan], Optional[int]]:
+        """Page of loans plus the total in one round trip (see find_with_total)."""
+        query: Dict[str, Any] = {}
+        if borrower_id:
+            query["borrower_id"] = ObjectId(borrower_id) if ObjectId.is_valid(borrower_id) else borrower_id
+
+        loans_data, total = await find_with_total(self.collection, query, [{"$skip": skip}, {"$limit": limit}], total_mode)
+        return [Loan.model_validate(loan_data) for loan_data in loans_data], total
+
+    async def get_loans_page(self, first: int = 50, after: Optional[str] = None, borrower_id: Optional[str] = None) -> Tuple[List[Tuple[str, Loan]], bool]:
+        """Keyset page ordered by (created_at, _id) descending, newest first."""
+        query: Dict[str, Any] = {}
+        if borrower_id:
+            query["borrower_id"] = ObjectId(borrower_id) if ObjectId.is_valid(borrower_id) else borrower_id
+
+        edges, has_next_page = await find_page(self.collection, query, "created_at", DESCENDING, first, after)
+        return [(cursor, Loan.model_validate(loan_data)) for cursor, loan_data in edges], has_next_page
+
     async def count_loans(self, borrower_id: Optional[str] = None) -> int:
         query: Dict[str, Any] = {}
         if borrower_id:
@@ -58,26 +166,174 @@ class LoanCRUD:
         return await self.collection.count_documents(query)
 
     async def update_loan(self, loan_id: str, loan_update: LoanUpdate) -> Optional[Loan]:
+        """
+        Update the loan; when its status, product, branch or amount changes, move its
+        contribution between portfolio rollup buckets in the same transaction.
+        """
         if not ObjectId.is_valid(loan_id):
             return None
 
-        update_data = loan_update.model_dump(exclude_unset=True)
+        # Stored documents use the model aliases (e.g. loanProduct), as written by create_loan
+        update_data = loan_update.model_dump(exclude_unset=True, by_alias=True)
         if update_data:
             update_data["updated_at"] = datetime.now(timezone.utc)
             # Ensure borrower_id is converted to ObjectId if present
             if "borrower_id" in update_data and isinstance(update_data["borrower_id"], str):
                 update_data["borrower_id"] = ObjectId(update_data["borrower_id"])
 
-            result = await self.collection.update_one(
-                {"_id": ObjectId(loan_id)},
-                {"$set": update_data}
-            )
-            if result.modified_count == 1:
-                return await self.get_loan_by_id(loan_id)
+            async def update(session):
+                before = await self.collection.find_one({"_id": ObjectId(loan_id)}, session=session)
+                if not before:
+                    return None
+                if "borrower_id" in update_data and update_data["borrower_id"] != before.get("borrower_id"):
+                    update_data["branch"] = await self._borrower_branch(update_data["borrower_id"], session=session)
+
+                result = await self.collection.update_one(
+                    {"_id": ObjectId(loan_id)},
+                    {"$set": update_data},
+                    session=session
+                )
+                if result.modified_count != 1:
+                    return None
+
+                old_loan = Loan.model_validate(before)
+                new_loan = Loan.model_validate({**before, **update_data})
+                if any(field in update_data and update_data[field] != before.get(field) for field in _ROLLUP_FIELDS):
+                    await self.rollup_crud.add_loan(old_loan, sign=-1, session=session)
+                    await self.rollup_crud.add_loan(new_loan, session=session)
+                if "active" in (old_loan.status, new_loan.status) and any(
+                    field in update_data and update_data[field] != before.get(field) for field in _DELINQUENCY_FIELDS
+                ):
+                    await self.refresh_delinquency([new_loan], datetime.now(timezone.utc).date(), session=session)
+                return new_loan
+
+            return await self._in_transaction(update)
         return None
 
+    async def transition_status(
+        self,
+        loan_id: str,
+        from_status: str,
+        to_status: str,
+        extra: Optional[Dict[str, Any]] = None,
+        on_transition: Optional[Callable[[Loan, Any], Awaitable[None]]] = None
+    ) -> Optional[Loan]:
+        """
+        Move the loan from from_status to to_status (setting any extra fields) only if
+        it is still in from_status, and move it between status rollup buckets in the
+        same transaction; on_transition(loan, session) is awaited in that transaction
+        too, e.g. to post the ledger entries the move records. Returns the updated
+        loan, or None when the loan was not in from_status (e.g. another worker
+        already moved it).
+        """
+        if not ObjectId.is_valid(loan_id):
+            return None
+        update_data = {**(extra or {}), "status": to_status, "updated_at": datetime.now(timezone.utc)}
+
+        async def transition(session):
+            before = await self.collection.find_one_and_update(
+                {"_id": ObjectId(loan_id), "status": from_status},
+                {"$set": update_data},
+                return_document=ReturnDocument.BEFORE,
+                session=session
+            )
+            if not before:
+                return None
+            new_loan = Loan.model_validate({**before, **update_data})
+            await self.rollup_crud.add_loan(Loan.model_validate(before), sign=-1, session=session)
+            await self.rollup_crud.add_loan(new_loan, session=session)
+            if "active" in (from_status, to_status):
+                await self.refresh_delinquency([new_loan], datetime.now(timezone.utc).date(), session=session)
+            if on_transition:
+                await on_transition(new_loan, session)
+            return new_loan
+
+        return await self._in_transaction(transition)
+
+    async def refresh_delinquency(self, loans: List[Loan], as_of: date, session=None) -> int:
+        """
+        Recompute the delinquency fields of loans as of as_of (see
+        delinquency_fields) from what their balance summaries say was repaid, and move
+        loans whose aging bucket changed between the aging rollups. Loans that are not
+        active have the fields cleared. Returns the number of loans that changed bucket.
+        """
+        loans = list({str(loan.id): loan for loan in loans}.values())
+        if not loans:
+            return 0
+        balances = await self.rollup_crud.loan_balances(loans, session=session)
+        active = [loan for loan in loans if loan.status == "active"]
+        fields = dict(zip(
+            [str(loan.id) for loan in active],
+            delinquency_fields(active, [to_centavos(balances[str(loan.id)]["total_repaid"]) for loan in active], as_of)
+        ))
+        cleared = {
+            "next_due_date": None, "days_past_due": 0, "aging_bucket": None,
+            "delinquency_as_of": datetime.combine(as_of, time()), "delinquency_review_date": None,
+        }
+
+        operations: List[UpdateOne] = []
+        moves = []
+        for loan in loans:
+            loan_fields = fields.get(str(loan.id), cleared)
+            update: Dict[str, Any] = {"$set": {
+                field: value for field, value in loan_fields.items() if value is not None or field not in _PARTIAL_INDEX_FIELDS
+            }}
+            unset = {field: "" for field in _PARTIAL_INDEX_FIELDS if loan_fields[field] is None}
+            if unset:
+                update["$unset"] = unset
+            operations.append(UpdateOne({"_id": loan.id}, update))
+            moves.append((
+                loan_aging(loan),
+                loan_aging(loan.model_copy(update=loan_fields)),
+                {"amount_requested": Decimal(str(loan.amount_requested)), **balances[str(loan.id)]},
+            ))
+        await self.collection.bulk_write(operations, ordered=False, session=session)
+        await self.rollup_crud.move_aging(moves, session=session)
+        return sum(1 for from_bucket, to_bucket, _ in moves if from_bucket != to_bucket)
+
+    async def delinquency_due(self, as_of: datetime, limit: int) -> List[Loan]:
+        """Loans whose delinquency review date has come, through the delinquency_review_date_1 partial index."""
+        loans_data = await self.collection.find({"delinquency_review_date": {"$exists": True, "$lte": as_of}}).limit(limit).to_list(length=limit)
+        return [Loan.model_validate(loan_data) for loan_data in loans_data]
+
+    async def overdue_loans(self, as_of: datetime, loan_products: List[str], batch_size: int = 1000) -> AsyncIterator[List[Loan]]:
+        """
+        Active loans of the given products with an installment unpaid since before
+        as_of, through the next_due_date_1 partial index, in batches read from one
+        cursor so memory stays bounded.
+        """
+        cursor = self.collection.find({
+            "next_due_date": {"$exists": True, "$lt": as_of},
+            "status": "active",
+            "loanProduct": {"$in": loan_products},
+        }).batch_size(batch_size)
+        batch: List[Loan] = []
+        async for loan_data in cursor:
+            batch.append(Loan.model_validate(loan_data))
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    async def active_loans_batch(self, after: Optional[Any] = None, limit: int = 1000) -> List[Loan]:
+        """Next batch of active loans in _id order, after the last _id of the previous batch."""
+        query: Dict[str, Any] = {"status": "active"}
+        if after is not None:
+            query["_id"] = {"$gt": after}
+        loans_data = await self.collection.find(query).sort("_id", ASCENDING).limit(limit).to_list(length=limit)
+        return [Loan.model_validate(loan_data) for loan_data in loans_data]
+
     async def delete_loan(self, loan_id: str) -> bool:
+        """Delete the loan and remove its contribution from the portfolio rollups, in one transaction."""
         if not ObjectId.is_valid(loan_id):
             return False
-        result = await self.collection.delete_one({"_id": ObjectId(loan_id)})
-        return result.deleted_count == 1
+
+        async def delete(session):
+            deleted = await self.collection.find_one_and_delete({"_id": ObjectId(loan_id)}, session=session)
+            if not deleted:
+                return False
+            await self.rollup_crud.add_loan(Loan.model_validate(deleted), sign=-1, session=session)
+            return True
+
+        return await self._in_transaction(delete)
@@ -1,15 +1,55 @@
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple, Callable, Awaitable
 from bson import ObjectId
 from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import DESCENDING
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 from datetime import datetime, timezone
+from ..basemodel.loan_model import Loan
 from ..basemodel.loan_transaction_model import LoanTransaction, LoanTransactionBase
 from ..models import PyObjectId
+from .pagination import find_page, find_with_total, TotalMode
+from .codecs import DECIMAL_CODEC_OPTIONS
+from .loan_balance_crud import LoanBalanceCRUD
+from .portfolio_rollup_crud import PortfolioRollupCRUD
+from .loan_crud import LoanCRUD
+
+# Documents are stored with the model aliases (model_dump(by_alias=True)), so
+# queries and updates must use the camelCase names, e.g. loanId and transactionDate.
+def _stored_name(field: str) -> str:
+    model_field = LoanTransaction.model_fields.get(field)
+    return model_field.alias if model_field and model_field.alias else field
 
 class LoanTransactionCRUD:
-    def __init__(self, collection: AsyncIOMotorCollection):
+    def __init__(self, collection: AsyncIOMotorCollection, balance_crud: Optional[LoanBalanceCRUD] = None, rollup_crud: Optional[PortfolioRollupCRUD] = None):
         self.collection = collection
+        # Balance summaries and rollups live next to the transactions so all can share one session
+        self.balance_crud = balance_crud or LoanBalanceCRUD(
+            collection.database.get_collection("loan_balances", codec_options=DECIMAL_CODEC_OPTIONS)
+        )
+        self.rollup_crud = rollup_crud or PortfolioRollupCRUD(
+            collection.database.get_collection("portfolio_rollups", codec_options=DECIMAL_CODEC_OPTIONS),
+            self.balance_crud
+        )
+        self.loan_crud = LoanCRUD(self.rollup_crud.loans, self.rollup_crud)
+
+    async def _apply(self, transaction: LoanTransaction, sign: int = 1, session=None) -> None:
+        """Apply a transaction's effect to its loan's balance summary and the portfolio rollups."""
+        await self.balance_crud.apply_transaction(transaction, sign=sign, session=session)
+        await self.rollup_crud.apply_transaction(transaction, sign=sign, session=session)
+
+    async def _refresh_delinquency(self, transactions: List[LoanTransaction], session=None) -> None:
+        """Recompute the delinquency of the loans whose repayments changed (see LoanCRUD.refresh_delinquency)."""
+        loan_ids = [transaction.loan_id for transaction in transactions if transaction.transaction_type == "repayment"]
+        if loan_ids:
+            loans = await self.rollup_crud.find_loans(loan_ids, session=session)
+            await self.loan_crud.refresh_delinquency(list(loans.values()), datetime.now(timezone.utc).date(), session=session)
+
+    async def _in_transaction(self, callback):
+        async with await self.collection.database.client.start_session() as session:
+            return await session.with_transaction(callback)
 
     async def create_loan_transaction(self, transaction: LoanTransactionBase) -> LoanTransaction:
+        """Insert the transaction and apply it to the loan's balance summary and the portfolio rollups in one transaction."""
         loan_transaction_in_db = LoanTransaction(
             **transaction.model_dump(),
             created_at=datetime.now(timezone.utc),
@@ -22,10 +62,111 @@ class LoanTransactionCRUD:
             exclude_unset=True,
         )
 
-        result = await self.collection.insert_one(doc)
-        loan_transaction_in_db.id = result.inserted_id
+        async def insert(session):
+            result = await self.collection.insert_one(doc, session=session)
+            await self._apply(loan_transaction_in_db, session=session)
+            await self._refresh_delinquency([loan_transaction_in_db], session=session)
+            return result.inserted_id
+
+        loan_transaction_in_db.id = await self._in_transaction(insert)
         return loan_transaction_in_db
 
+    async def insert_loan_transactions_in_session(
+        self,
+        transactions: List[LoanTransaction],
+        session,
+        loans: Optional[Dict[str, Loan]] = None
+    ) -> List[LoanTransaction]:
+        """
+        Insert transactions inside the caller's transaction (e.g. a loan's status
+        change) and apply them to the balance summaries and rollups, so they commit or
+        abort together. Transactions whose reference_number is already stored are
+        skipped. loans maps their loan ids to their loans (see find_loans) and is read
+        in the session when not given. Returns the transactions inserted.
+        """
+        existing = {
+            doc["referenceNumber"]
+            async for doc in self.collection.find(
+                {"referenceNumber": {"$in": [transaction.reference_number for transaction in transactions if transaction.reference_number]}},
+                {"referenceNumber": 1}, session=session
+            )
+        }
+        new = [transaction for transaction in transactions if transaction.reference_number not in existing]
+        if new:
+            if loans is None:
+                loans = await self.rollup_crud.find_loans([transaction.loan_id for transaction in new], session=session)
+            await self.collection.insert_many(
+                [transaction.model_dump(by_alias=True, exclude={"id"}, exclude_unset=True) for transaction in new],
+                session=session
+            )
+            await self.balance_crud.apply_transactions(new, session=session)
+            await self.rollup_crud.apply_transactions(new, loans, session=session)
+            await self._refresh_delinquency(new, session=session)
+        return new
+
+    async def insert_loan_transactions(
+        self,
+        transactions: List[Tuple[Any, LoanTransactionBase]],
+        on_insert: Optional[Callable[[List[LoanTransaction], Any], Awaitable[None]]] = None
+    ) -> List[Tuple[Any, str, str]]:
+        """
+        Bulk insert for imports. transactions are (key, transaction) pairs, e.g. keyed
+        by source row number, and must carry a reference_number. Reference numbers
+        repeated in the list or already stored are skipped as duplicates, and
+        transactions of unknown loans fail. The rest are written with one insert_many,
+        and their effect is added to the balance summaries and rollups with one bulk
+        write each, all in a single transaction; on_insert(inserted, session) is
+        awaited in that transaction too, e.g. to post their ledger entries. Returns
+        (key, outcome, message) per transaction, where outcome is inserted, duplicate
+        or failed.
+        """
+        results: List[Tuple[Any, str, str]] = []
+        candidates: List[Tuple[Any, LoanTransactionBase]] = []
+        references = set()
+        for key, transaction in transactions:
+            if not transaction.reference_number:
+                results.append((key, "failed", "referenceNumber is required"))
+            elif transaction.reference_number in references:
+                results.append((key, "duplicate", "referenceNumber repeats an earlier row"))
+            else:
+                references.add(transaction.reference_number)
+                candidates.append((key, transaction))
+        if not candidates:
+            return results
+
+        loans = await self.rollup_crud.find_loans([transaction.loan_id for _, transaction in candidates])
+        now = datetime.now(timezone.utc)
+        found: List[Tuple[Any, LoanTransaction]] = []
+        for key, transaction in candidates:
+            if transaction.loan_id in loans:
+                found.append((key, LoanTransaction(**transaction.model_dump(), created_at=now, updated_at=now)))
+            else:
+                results.append((key, "failed", f"loan {transaction.loan_id} not found"))
+
+        async def write(session):
+            new = await self.insert_loan_transactions_in_session([transaction for _, transaction in found], session, loans)
+            if new and on_insert:
+                await on_insert(new, session)
+            inserted = {transaction.reference_number for transaction in new}
+            return {transaction.reference_number for _, transaction in found} - inserted
+
+        existing = set()
+        if found:
+            for attempt in range(3):
+                try:
+                    existing = await self._in_transaction(write)
+                    break
+                except (DuplicateKeyError, BulkWriteError):
+                    # Another import committed some of these reference numbers first; re-read and skip them
+                    if attempt == 2:
+                        raise
+        for key, transaction in found:
+            if transaction.reference_number in existing:
+                results.append((key, "duplicate", "a loan transaction with this referenceNumber already exists"))
+            else:
+                results.append((key, "inserted", ""))
+        return results
+
     async def get_loan_transaction_by_id(self, transaction_id: str) -> Optional[LoanTransaction]:
         if not ObjectId.is_valid(transaction_id):
             return None
@@ -35,40 +176,86 @@ class LoanTransactionCRUD:
         return None
     
     async def get_loan_transactions_by_loan_id(self, loan_id: str, skip: int = 0, limit: int = 100) -> List[LoanTransaction]:
-        transactions_data = await self.collection.find({"loan_id": loan_id}).skip(skip).limit(limit).to_list(length=limit)
+        transactions_data = await self.collection.find({"loanId": loan_id}).skip(skip).limit(limit).to_list(length=limit)
         return [LoanTransaction.model_validate(transaction_data) for transaction_data in transactions_data]
 
     async def get_loan_transactions(self, skip: int = 0, limit: int = 100, loan_id: Optional[str] = None) -> List[LoanTransaction]:
         query: Dict[str, Any] = {}
         if loan_id:
-            query["loan_id"] = loan_id
+            query["loanId"] = loan_id
         
         transactions_data = await self.collection.find(query).skip(skip).limit(limit).to_list(length=limit)
         return [LoanTransaction.model_validate(transaction_data) for transaction_data in transactions_data]
 
+    async def get_loan_transactions_with_total(self, skip: int = 0, limit: int = 100, loan_id: Optional[str] = None, total_mode: TotalMode = TotalMode.EXACT) -> Tuple[List[LoanTransaction], Optional[int]]:
+        """Page of loan transactions plus the total in one round trip (see find_with_total)."""
+        query: Dict[str, Any] = {}
+        if loan_id:
+            query["loanId"] = loan_id
+
+        transactions_data, total = await find_with_total(self.collection, query, [{"$skip": skip}, {"$limit": limit}], total_mode)
+        return [LoanTransaction.model_validate(transaction_data) for transaction_data in transactions_data], total
+
+    async def get_loan_transactions_page(self, first: int = 50, after: Optional[str] = None, loan_id: Optional[str] = None) -> Tuple[List[Tuple[str, LoanTransaction]], bool]:
+        """Keyset page ordered by (transactionDate, _id) descending, newest first."""
+        query: Dict[str, Any] = {}
+        if loan_id:
+            query["loanId"] = loan_id
+
+        edges, has_next_page = await find_page(self.collection, query, "transactionDate", DESCENDING, first, after)
+        return [(cursor, LoanTransaction.model_validate(transaction_data)) for cursor, transaction_data in edges], has_next_page
+
     async def count_loan_transactions(self, loan_id: Optional[str] = None) -> int:
         query: Dict[str, Any] = {}
         if loan_id:
-            query["loan_id"] = loan_id
+            query["loanId"] = loan_id
         return await self.collection.count_documents(query)
 
     async def update_loan_transaction(self, transaction_id: str, update_data: Dict[str, Any]) -> Optional[LoanTransaction]:
+        """
+        Update the transaction and move its effect on the balance summaries and rollups
+        from the old values to the new ones, in one transaction.
+        """
         if not ObjectId.is_valid(transaction_id):
             return None
 
         if update_data:
-            update_data["updated_at"] = datetime.now(timezone.utc)
+            update_data = {_stored_name(field): value for field, value in update_data.items()}
+            update_data["updatedAt"] = datetime.now(timezone.utc)
 
-            result = await self.collection.update_one(
-                {"_id": ObjectId(transaction_id)},
-                {"$set": update_data}
-            )
-            if result.modified_count == 1:
-                return await self.get_loan_transaction_by_id(transaction_id)
+            async def update(session):
+                before = await self.collection.find_one_and_update(
+                    {"_id": ObjectId(transaction_id)},
+                    {"$set": update_data},
+                    session=session
+                )
+                if not before:
+                    return None
+                old = LoanTransaction.model_validate(before)
+                new = LoanTransaction.model_validate({**before, **update_data})
+                await self._apply(old, sign=-1, session=session)
+                await self._apply(new, session=session)
+                for loan_id in {old.loan_id, new.loan_id}:
+                    await self.balance_crud.refresh_last_transaction_date(loan_id, self.collection, session=session)
+                await self._refresh_delinquency([old, new], session=session)
+                return new
+
+            return await self._in_transaction(update)
         return None
 
     async def delete_loan_transaction(self, transaction_id: str) -> bool:
+        """Delete the transaction and remove its effect on the balance summary and rollups, in one transaction."""
         if not ObjectId.is_valid(transaction_id):
             return False
-        result = await self.collection.delete_one({"_id": ObjectId(transaction_id)})
-        return result.deleted_count == 1
\ No newline at end of file
+
+        async def delete(session):
+            deleted = await self.collection.find_one_and_delete({"_id": ObjectId(transaction_id)}, session=session)
+            if not deleted:
+                return False
+            old = LoanTransaction.model_validate(deleted)
+            await self._apply(old, sign=-1, session=session)
+            await self.balance_crud.refresh_last_transaction_date(old.loan_id, self.collection, session=session)
+            await self._refresh_delinquency([old], session=session)
+            return True
+
+        return await self._in_transaction(delete)
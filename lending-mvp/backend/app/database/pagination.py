@@ -0,0 +1,116 @@
+import asyncio
+import base64
+import binascii
+from enum import Enum
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import json_util
+from bson.errors import InvalidBSON
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import ASCENDING
+
+# Upper bound for `first` on connection fields
+MAX_PAGE_SIZE = 500
+# In ESTIMATED mode filtered totals stop counting here (the total is then a lower bound)
+ESTIMATED_COUNT_CAP = 10000
+
+
+class TotalMode(Enum):
+    """How list resolvers compute `total`."""
+    EXACT = "exact"
+    ESTIMATED = "estimated"
+    NONE = "none"
+
+
+def encode_cursor(sort_value: Any, document_id: Any) -> str:
+    """Opaque cursor for a (sort_key, _id) position."""
+    payload = json_util.dumps([sort_value, document_id])
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple[Any, Any]:
+    try:
+        sort_value, document_id = json_util.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return sort_value, document_id
+    except (binascii.Error, ValueError, TypeError, InvalidBSON) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def keyset_query(query: Dict[str, Any], sort_field: str, direction: int, after: Optional[str]) -> Dict[str, Any]:
+    """Add the "strictly after the cursor" condition on (sort_field, _id) to a filter."""
+    if not after:
+        return query
+    sort_value, last_id = decode_cursor(after)
+    op = "$gt" if direction == ASCENDING else "$lt"
+    keyset = {
+        "$or": [
+            {sort_field: {op: sort_value}},
+            {sort_field: sort_value, "_id": {op: last_id}},
+        ]
+    }
+    return {"$and": [query, keyset]} if query else keyset
+
+
+def keyset_sort(sort_field: str, direction: int) -> List[Tuple[str, int]]:
+    # _id breaks ties so the order is total and stable between pages
+    return [(sort_field, direction), ("_id", direction)]
+
+
+async def find_page(
+    collection: AsyncIOMotorCollection,
+    query: Dict[str, Any],
+    sort_field: str,
+    direction: int,
+    first: int,
+    after: Optional[str] = None,
+) -> Tuple[List[Tuple[str, Dict[str, Any]]], bool]:
+    """
+    Fetch one keyset page. Returns (cursor, document) pairs and whether more
+    documents follow. Reads first + 1 documents instead of counting.
+    """
+    first = max(1, min(first, MAX_PAGE_SIZE))
+    page_query = keyset_query(query, sort_field, direction, after)
+    documents = await collection.find(page_query).sort(keyset_sort(sort_field, direction)).limit(first + 1).to_list(length=first + 1)
+    has_next_page = len(documents) > first
+    return [(encode_cursor(doc.get(sort_field), doc["_id"]), doc) for doc in documents[:first]], has_next_page
+
+
+async def find_with_total(
+    collection: AsyncIOMotorCollection,
+    match: Dict[str, Any],
+    items_pipeline: List[Dict[str, Any]],
+    total_mode: TotalMode = TotalMode.EXACT,
+) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+    """
+    Return one page of documents and the total in a single round trip.
+
+    Filtered lists run one aggregation: $match followed by a $facet with the page
+    (items_pipeline, e.g. $skip/$limit) and a $count. Unfiltered totals come from
+    collection metadata (estimated_document_count), fetched concurrently with the
+    page. TotalMode.NONE skips counting and returns None. Pages are clamped to
+    MAX_PAGE_SIZE documents whatever limit items_pipeline asks for, as in find_page,
+    which also keeps the $facet result under the 16MB document limit.
+    """
+    items_pipeline = items_pipeline + [{"$limit": MAX_PAGE_SIZE}]
+    if total_mode == TotalMode.NONE:
+        documents = await collection.aggregate([{"$match": match}] + items_pipeline).to_list(length=None)
+        return documents, None
+
+    if not match:
+        documents, total = await asyncio.gather(
+            collection.aggregate(items_pipeline).to_list(length=None),
+            collection.estimated_document_count(),
+        )
+        return documents, total
+
+    count_pipeline: List[Dict[str, Any]] = [{"$count": "total"}]
+    if total_mode == TotalMode.ESTIMATED:
+        count_pipeline.insert(0, {"$limit": ESTIMATED_COUNT_CAP})
+
+    result = await collection.aggregate([
+        {"$match": match},
+        {"$facet": {"items": items_pipeline, "total": count_pipeline}},
+    ]).to_list(length=1)
+    facet = result[0] if result else {"items": [], "total": []}
+    total = facet["total"][0]["total"] if facet["total"] else 0
+    return facet["items"], total
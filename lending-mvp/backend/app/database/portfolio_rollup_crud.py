@@ -0,0 +1,325 @@
+import random
+from typing import List, Optional, Dict, Any, Tuple
+from datetime import datetime, timezone
+from decimal import Decimal
+from bson import Decimal128, ObjectId
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import ReplaceOne, UpdateOne
+from ..basemodel.loan_model import Loan
+from ..basemodel.loan_transaction_model import LoanTransaction
+from ..config import settings
+from .codecs import DECIMAL_CODEC_OPTIONS
+from .loan_balance_crud import LoanBalanceCRUD, SUMMARY_FIELDS
+
+ROLLUP_DIMENSIONS = ("status", "loan_product", "branch", "origination_month", "aging")
+AMOUNT_FIELDS = ("amount_requested",) + SUMMARY_FIELDS
+
+# Aging buckets with the most days past due each one holds (the last has no limit)
+AGING_BUCKETS: Tuple[Tuple[str, Optional[int]], ...] = (("current", 0), ("1-30", 30), ("31-60", 60), ("61-90", 90), ("90+", None))
+# Buckets counted in PAR30 and PAR90: loans more than 30 / 90 days past due
+PAR_BUCKETS = {"par30": ("31-60", "61-90", "90+"), "par90": ("90+",)}
+
+
+def aging_bucket(days_past_due: int) -> Tuple[str, Optional[int]]:
+    """The aging bucket for days_past_due, with the most days past due it holds."""
+    for bucket, max_days in AGING_BUCKETS[:-1]:
+        if days_past_due <= max_days:
+            return bucket, max_days
+    return AGING_BUCKETS[-1]
+
+
+def loan_aging(loan: Loan) -> Optional[str]:
+    """The aging bucket a loan counts towards; only active loans are aged."""
+    return loan.aging_bucket if loan.status == "active" else None
+
+
+def loan_buckets(loan: Loan) -> List[Tuple[str, str]]:
+    """Every rollup bucket a loan counts towards, including the portfolio-wide total."""
+    buckets = [
+        ("portfolio", "all"),
+        ("status", loan.status or "unknown"),
+        ("loan_product", loan.loan_product or "unassigned"),
+        ("branch", loan.branch or "unassigned"),
+        ("origination_month", loan.created_at.strftime("%Y-%m")),
+    ]
+    if loan_aging(loan):
+        buckets.append(("aging", loan_aging(loan)))
+    return buckets
+
+
+def bucket_id(dimension: str, key: str, shard: int) -> str:
+    """_id of one shard of a rollup bucket."""
+    return f"{dimension}:{key}:{shard}"
+
+
+def loan_lookup(loan_id: str) -> Dict[str, Any]:
+    """Filter matching a loan by _id or by its custom loan id, as transactions reference either."""
+    return {"$or": [
+        {"_id": ObjectId(loan_id) if ObjectId.is_valid(loan_id) else loan_id},
+        {"loanId": loan_id},
+        {"loan_id": loan_id},
+    ]}
+
+
+class PortfolioRollupCRUD:
+    """
+    Loan counts and amounts per status, loan product, customer branch and month of
+    origination, kept in portfolio_rollups and updated incrementally by LoanCRUD
+    and LoanTransactionCRUD inside their write transactions. The collection must be
+    opened with DECIMAL_CODEC_OPTIONS (see get_portfolio_rollups_collection).
+
+    Every write touches the portfolio total and the shared status, product, branch
+    and month buckets, so each bucket is split into `shards` counter documents (_id
+    "<dimension>:<key>:<shard>"). A write $incs one shard picked at random and reads
+    sum the shards, so concurrent writers rarely conflict on the same document.
+    """
+
+    def __init__(self, collection: AsyncIOMotorCollection, balance_crud: Optional[LoanBalanceCRUD] = None, shards: Optional[int] = None):
+        self.collection = collection
+        self.shards = max(1, shards or settings.ROLLUP_SHARDS)
+        self.balance_crud = balance_crud or LoanBalanceCRUD(
+            collection.database.get_collection("loan_balances", codec_options=DECIMAL_CODEC_OPTIONS)
+        )
+        self.loans = collection.database.get_collection("loans", codec_options=DECIMAL_CODEC_OPTIONS)
+
+    def _increment(self, dimension: str, key: str, inc: Dict[str, Any], now: datetime) -> UpdateOne:
+        """$inc one randomly picked shard of a bucket, creating it on first use."""
+        shard = random.randrange(self.shards)
+        return UpdateOne(
+            {"_id": bucket_id(dimension, key, shard)},
+            {"$inc": inc, "$set": {"dimension": dimension, "key": key, "shard": shard, "updated_at": now}},
+            upsert=True
+        )
+
+    async def _buckets(self, query: Dict[str, Any]) -> Dict[Tuple[str, str], Dict[str, Any]]:
+        """Shard documents matching query summed per bucket, keyed by (dimension, key)."""
+        buckets: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        async for shard in self.collection.find(query):
+            bucket = buckets.setdefault((shard["dimension"], shard["key"]), {
+                "dimension": shard["dimension"], "key": shard["key"], "loan_count": 0,
+                **{field: Decimal("0") for field in AMOUNT_FIELDS}, "updated_at": shard.get("updated_at"),
+            })
+            bucket["loan_count"] += shard.get("loan_count", 0)
+            for field in AMOUNT_FIELDS:
+                bucket[field] += Decimal(str(shard.get(field, 0)))
+            if shard.get("updated_at") and (bucket["updated_at"] is None or shard["updated_at"] > bucket["updated_at"]):
+                bucket["updated_at"] = shard["updated_at"]
+        return buckets
+
+    async def _apply(self, loan: Loan, increments: Dict[str, Decimal], loan_count: int = 0, session=None) -> None:
+        inc: Dict[str, Any] = {field: Decimal128(value) for field, value in increments.items()}
+        if loan_count:
+            inc["loan_count"] = loan_count
+        if not inc:
+            return
+        now = datetime.now(timezone.utc)
+        await self.collection.bulk_write([
+            self._increment(dimension, key, inc, now) for dimension, key in loan_buckets(loan)
+        ], ordered=False, session=session)
+
+    async def loan_balance(self, loan: Loan, session=None) -> Dict[str, Decimal]:
+        """Transaction-derived amounts of a loan, summed over the ids its transactions may use."""
+        keys = [str(loan.id)] + ([str(loan.loan_id)] if loan.loan_id else [])
+        totals = {field: Decimal("0") for field in SUMMARY_FIELDS}
+        async for balance in self.balance_crud.collection.find({"_id": {"$in": keys}}, session=session):
+            for field in SUMMARY_FIELDS:
+                totals[field] += Decimal(str(balance.get(field, 0)))
+        return totals
+
+    async def loan_balances(self, loans: List[Loan], session=None) -> Dict[str, Dict[str, Decimal]]:
+        """Batch version of loan_balance: amounts of each loan, keyed by str(loan.id), in one query."""
+        keys: Dict[str, List[str]] = {
+            str(loan.id): [str(loan.id)] + ([str(loan.loan_id)] if loan.loan_id else []) for loan in loans
+        }
+        found: Dict[str, Dict[str, Any]] = {}
+        if keys:
+            async for balance in self.balance_crud.collection.find(
+                {"_id": {"$in": [key for loan_keys in keys.values() for key in loan_keys]}}, session=session
+            ):
+                found[balance["_id"]] = balance
+        totals: Dict[str, Dict[str, Decimal]] = {}
+        for loan_id, loan_keys in keys.items():
+            totals[loan_id] = {field: Decimal("0") for field in SUMMARY_FIELDS}
+            for key in loan_keys:
+                for field in SUMMARY_FIELDS:
+                    totals[loan_id][field] += Decimal(str(found.get(key, {}).get(field, 0)))
+        return totals
+
+    async def add_loan(self, loan: Loan, sign: int = 1, session=None) -> None:
+        """Add (sign=1) or remove (sign=-1) a loan's whole contribution: count, amount requested and balances."""
+        increments = {field: value * sign for field, value in (await self.loan_balance(loan, session=session)).items()}
+        increments["amount_requested"] = Decimal(str(loan.amount_requested)) * sign
+        await self._apply(loan, increments, loan_count=sign, session=session)
+
+    async def apply_transaction(self, transaction: LoanTransaction, sign: int = 1, session=None) -> None:
+        """Apply one loan transaction's balance effect to the buckets of the loan it belongs to."""
+        loan_data = await self.loans.find_one(loan_lookup(transaction.loan_id), session=session)
+        if not loan_data:
+            return
+        increments = {
+            field: value.to_decimal()
+            for field, value in LoanBalanceCRUD.balance_increments(transaction, sign).items()
+        }
+        await self._apply(Loan.model_validate(loan_data), increments, session=session)
+
+    async def find_loans(self, loan_ids: List[str], session=None) -> Dict[str, Loan]:
+        """Loans referenced by transaction loan ids (by _id or custom loan id) in one query, keyed by the id used."""
+        wanted = set(loan_ids)
+        if not wanted:
+            return {}
+        ids: List[Any] = [ObjectId(loan_id) for loan_id in wanted if ObjectId.is_valid(loan_id)] + list(wanted)
+        loans: Dict[str, Loan] = {}
+        async for loan_data in self.loans.find(
+            {"$or": [{"_id": {"$in": ids}}, {"loanId": {"$in": list(wanted)}}, {"loan_id": {"$in": list(wanted)}}]},
+            session=session
+        ):
+            loan = Loan.model_validate(loan_data)
+            for key in (str(loan_data["_id"]), loan_data.get("loanId"), loan_data.get("loan_id")):
+                if key in wanted:
+                    loans[key] = loan
+        return loans
+
+    async def apply_transactions(self, transactions: List[LoanTransaction], loans: Dict[str, Loan], session=None) -> None:
+        """
+        Apply many new transactions with one bulk write, aggregated per bucket. loans
+        maps the transactions' loan ids to their loans (see find_loans); transactions
+        of other loans are ignored, as in apply_transaction.
+        """
+        totals: Dict[Tuple[str, str], Dict[str, Decimal]] = {}
+        for transaction in transactions:
+            loan = loans.get(transaction.loan_id)
+            if loan is None:
+                continue
+            increments = LoanBalanceCRUD.balance_increments(transaction, 1)
+            for bucket in loan_buckets(loan):
+                bucket_totals = totals.setdefault(bucket, {})
+                for field, value in increments.items():
+                    bucket_totals[field] = bucket_totals.get(field, Decimal("0")) + value.to_decimal()
+        if not totals:
+            return
+        now = datetime.now(timezone.utc)
+        await self.collection.bulk_write([
+            self._increment(dimension, key, {field: Decimal128(value) for field, value in bucket_totals.items()}, now)
+            for (dimension, key), bucket_totals in totals.items()
+        ], ordered=False, session=session)
+
+    async def move_aging(self, moves: List[Tuple[Optional[str], Optional[str], Dict[str, Decimal]]], session=None) -> None:
+        """
+        Move loans between aging buckets with one bulk write. moves are (from bucket,
+        to bucket, amounts) per loan, where amounts holds the loan's AMOUNT_FIELDS and
+        None stands for not aged (see loan_aging).
+        """
+        totals: Dict[str, Dict[str, Any]] = {}
+        for from_bucket, to_bucket, amounts in moves:
+            if from_bucket == to_bucket:
+                continue
+            for bucket, sign in ((from_bucket, -1), (to_bucket, 1)):
+                if bucket is None:
+                    continue
+                bucket_totals = totals.setdefault(bucket, {"loan_count": 0, **{field: Decimal("0") for field in AMOUNT_FIELDS}})
+                bucket_totals["loan_count"] += sign
+                for field in AMOUNT_FIELDS:
+                    bucket_totals[field] += amounts.get(field, Decimal("0")) * sign
+        if not totals:
+            return
+        now = datetime.now(timezone.utc)
+        await self.collection.bulk_write([
+            self._increment("aging", bucket, {
+                "loan_count": bucket_totals["loan_count"], **{field: Decimal128(bucket_totals[field]) for field in AMOUNT_FIELDS}
+            }, now)
+            for bucket, bucket_totals in totals.items()
+        ], ordered=False, session=session)
+
+    async def get_portfolio_at_risk(self) -> Dict[str, Any]:
+        """
+        Outstanding of active loans per aging bucket, and PAR30 / PAR90: the
+        outstanding more than 30 / 90 days past due and its share of the total. Reads
+        the shards of the five aging buckets only.
+        """
+        found = {key: bucket for (_, key), bucket in (await self._buckets({"_id": {"$regex": "^aging:"}})).items()}
+        buckets = [found.get(bucket, {"dimension": "aging", "key": bucket}) for bucket, _ in AGING_BUCKETS]
+        outstanding = sum((Decimal(str(bucket.get("outstanding", 0))) for bucket in buckets), Decimal("0"))
+        result: Dict[str, Any] = {"buckets": buckets, "outstanding": outstanding}
+        for name, par_buckets in PAR_BUCKETS.items():
+            at_risk = sum((Decimal(str(found.get(bucket, {}).get("outstanding", 0))) for bucket in par_buckets), Decimal("0"))
+            result[name] = at_risk
+            result[f"{name}_ratio"] = at_risk / outstanding if outstanding > 0 else Decimal("0")
+        return result
+
+    async def get_summary(self) -> Dict[str, List[Dict[str, Any]]]:
+        """All non-empty buckets grouped by dimension; cost depends on the number of buckets and shards, not loans."""
+        summary: Dict[str, List[Dict[str, Any]]] = {dimension: [] for dimension in ("portfolio",) + ROLLUP_DIMENSIONS}
+        for (dimension, _), bucket in (await self._buckets({})).items():
+            if bucket["loan_count"] > 0:
+                summary.setdefault(dimension, []).append(bucket)
+        for buckets in summary.values():
+            buckets.sort(key=lambda bucket: bucket["key"])
+        return summary
+
+    async def rebuild_all(self, customers: AsyncIOMotorCollection, batch_size: int = 1000) -> int:
+        """
+        Recompute every bucket from the loans, their balance summaries and their
+        borrowers' branches in one streaming pass. Loans without a stored branch get
+        it from the customer. Each bucket is written to its shard 0 in bulk and every
+        other shard and stale bucket removed. Returns the number of loans counted.
+        """
+        started_at = datetime.now(timezone.utc)
+        totals: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        counted = 0
+
+        async def process(batch: List[Dict[str, Any]]) -> None:
+            missing_branch = list({doc["borrower_id"] for doc in batch if not doc.get("branch") and doc.get("borrower_id")})
+            branches = {}
+            if missing_branch:
+                async for customer in customers.find({"_id": {"$in": missing_branch}}, {"branch": 1}):
+                    branches[customer["_id"]] = customer.get("branch")
+                branch_updates = [
+                    UpdateOne({"_id": doc["_id"]}, {"$set": {"branch": branches[doc["borrower_id"]]}})
+                    for doc in batch if not doc.get("branch") and branches.get(doc.get("borrower_id"))
+                ]
+                if branch_updates:
+                    await self.loans.bulk_write(branch_updates, ordered=False)
+
+            balance_keys = [str(doc["_id"]) for doc in batch] + [str(doc["loanId"]) for doc in batch if doc.get("loanId")]
+            balances: Dict[str, Dict[str, Any]] = {}
+            async for balance in self.balance_crud.collection.find({"_id": {"$in": balance_keys}}):
+                balances[balance["_id"]] = balance
+
+            for doc in batch:
+                if not doc.get("branch"):
+                    doc["branch"] = branches.get(doc.get("borrower_id"))
+                loan = Loan.model_validate(doc)
+                amounts = {field: Decimal("0") for field in AMOUNT_FIELDS}
+                amounts["amount_requested"] = Decimal(str(loan.amount_requested))
+                for key in {str(loan.id), str(loan.loan_id) if loan.loan_id else None} - {None}:
+                    for field in SUMMARY_FIELDS:
+                        amounts[field] += Decimal(str(balances.get(key, {}).get(field, 0)))
+                for bucket in loan_buckets(loan):
+                    bucket_totals = totals.setdefault(bucket, {"loan_count": 0, **{field: Decimal("0") for field in AMOUNT_FIELDS}})
+                    bucket_totals["loan_count"] += 1
+                    for field in AMOUNT_FIELDS:
+                        bucket_totals[field] += amounts[field]
+
+        batch: List[Dict[str, Any]] = []
+        async for doc in self.loans.find({}).batch_size(batch_size):
+            batch.append(doc)
+            if len(batch) >= batch_size:
+                await process(batch)
+                counted += len(batch)
+                batch = []
+        if batch:
+            await process(batch)
+            counted += len(batch)
+
+        operations = [
+            ReplaceOne({"_id": bucket_id(dimension, key, 0)}, {
+                "dimension": dimension, "key": key, "shard": 0, "loan_count": bucket_totals["loan_count"],
+                **{field: Decimal128(bucket_totals[field]) for field in AMOUNT_FIELDS},
+                "updated_at": started_at, "rebuilt_at": started_at,
+            }, upsert=True)
+            for (dimension, key), bucket_totals in totals.items()
+        ]
+        for start in range(0, len(operations), batch_size):
+            await self.collection.bulk_write(operations[start:start + batch_size], ordered=False)
+        await self.collection.delete_many({"$or": [{"rebuilt_at": {"$lt": started_at}}, {"rebuilt_at": {"$exists": False}}]})
+        return counted
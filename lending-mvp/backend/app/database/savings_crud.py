@@ -1,46 +1,45 @@
-from typing import List, Optional, Dict, Any
-from bson import ObjectId
+from typing import List, Optional, Dict, Any, Sequence
+from bson import ObjectId, Decimal128
 from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import ReturnDocument, UpdateOne
 from ..basemodel.savings_model import SavingsAccountBase
 from decimal import Decimal
+from datetime import datetime
 
-# Helper function to convert Decimal to str for MongoDB storage
-def _convert_decimal_to_str(data: Dict[str, Any]) -> Dict[str, Any]:
-    for key, value in data.items():
-        if isinstance(value, Decimal):
-            data[key] = str(value)
-        elif isinstance(value, dict):
-            data[key] = _convert_decimal_to_str(value)
-        elif isinstance(value, list):
-            data[key] = [_convert_decimal_to_str(item) if isinstance(item, dict) else item for item in value]
-    return data
-
-# Helper function to convert str to Decimal after MongoDB retrieval
-def _convert_str_to_decimal(data: Dict[str, Any]) -> Dict[str, Any]:
-    for key, value in data.items():
-        if isinstance(value, str):
-            try:
-                # Attempt to convert to Decimal only if it looks like a number
-                data[key] = Decimal(value)
-            except Exception:
-                pass # Keep as string if conversion fails
-        elif isinstance(value, dict):
-            data[key] = _convert_str_to_decimal(value)
-        elif isinstance(value, list):
-            data[key] = [_convert_str_to_decimal(item) if isinstance(item, dict) else item for item in value]
-    return data
+# Minimum balance applied to regular savings accounts that do not store their own
+# (matches the RegularSavings.min_balance default)
+REGULAR_MIN_BALANCE = Decimal("500.00")
+
+def _scaled(expression: Any, factor: int) -> Dict[str, Any]:
+    """Server-side integer column: round(expression * factor) as a long."""
+    return {"$toLong": {"$round": [{"$multiply": [{"$toDecimal": expression}, factor]}, 0]}}
+
+# Columns shared by the interest accrual and time deposit maturity batches. Time
+# deposits without a balance earn on their principal; dates are epoch milliseconds,
+# null when unset (missing and null sort below every number, so $gt null means "is set")
+_INTEREST_BALANCE = {"$cond": [
+    {"$and": [{"$eq": ["$type", "time_deposit"]}, {"$not": [{"$gt": ["$balance", 0]}]}]},
+    {"$ifNull": ["$principal", 0]},
+    {"$ifNull": ["$balance", 0]},
+]}
+_INTEREST_COLUMNS = {
+    "balance_cents": _scaled(_INTEREST_BALANCE, 100),
+    "rate_units": {"$cond": [{"$gt": ["$interest_rate", None]}, _scaled("$interest_rate", 10_000), None]},
+    "accrued_micros": _scaled({"$ifNull": ["$accrued_interest", 0]}, 1_000_000),
+    "last_accrual_ms": {"$toLong": "$last_accrual_date"},
+    "maturity_ms": {"$toLong": "$maturity_date"},
+}
 
 class SavingsCRUD:
+    # collection must be opened with DECIMAL_CODEC_OPTIONS (see get_savings_collection)
     def __init__(self, collection: AsyncIOMotorCollection):
         self.collection = collection
 
     async def create_savings_account(self, account: SavingsAccountBase) -> SavingsAccountBase:
+        # Decimal fields (including balance) are encoded as Decimal128 by the collection's codec
         account_data = account.model_dump(by_alias=True, exclude={"id"})
         
-        # Convert Decimal fields to string before saving to MongoDB
-        processed_account_data = _convert_decimal_to_str(account_data)
-        
-        result = await self.collection.insert_one(processed_account_data)
+        result = await self.collection.insert_one(account_data)
         
         # The returned account object should still have Decimal types
         account.id = result.inserted_id
@@ -51,21 +50,16 @@ class SavingsCRUD:
             return None
         account_data = await self.collection.find_one({"_id": ObjectId(account_id)})
         if account_data:
-            # Convert string representations back to Decimal after retrieving
-            processed_account_data = _convert_str_to_decimal(account_data)
             # Deserialize the dict back into a Pydantic model
-            return SavingsAccountBase(**processed_account_data)
+            return SavingsAccountBase(**account_data)
         return None
 
     async def get_savings_accounts_by_user_id(self, user_id: str) -> List[SavingsAccountBase]:
         # user_id is stored as a string, so query directly with the string
         accounts_data_list = await self.collection.find({"user_id": user_id}).to_list(length=100)
         
-        # Convert string representations back to Decimal for each account
-        processed_accounts_list = [_convert_str_to_decimal(acc_data) for acc_data in accounts_data_list]
-        
         # Deserialize each dict back into a Pydantic model
-        return [SavingsAccountBase(**acc_data) for acc_data in processed_accounts_list]
+        return [SavingsAccountBase(**acc_data) for acc_data in accounts_data_list]
     
     async def get_all_savings_accounts(self, search_term: Optional[str] = None) -> List[SavingsAccountBase]:
         pipeline = []
@@ -126,56 +120,174 @@ class SavingsCRUD:
 
         accounts_data_list = await self.collection.aggregate(pipeline).to_list(length=100)
         
-        processed_accounts_list = [_convert_str_to_decimal(acc_data) for acc_data in accounts_data_list]
-        
-        return [SavingsAccountBase(**acc_data) for acc_data in processed_accounts_list]
+        return [SavingsAccountBase(**acc_data) for acc_data in accounts_data_list]
     
-    async def update_balance(self, account_id: str, amount: Decimal) -> bool:
+    @staticmethod
+    def minimum_balance(account_data: Dict[str, Any]) -> Decimal:
+        """Python mirror of the minimum-balance expression used by update_balance."""
+        if account_data.get("type") != "regular":
+            return Decimal("0")
+        min_balance = account_data.get("min_balance")
+        return REGULAR_MIN_BALANCE if min_balance is None else Decimal(str(min_balance))
+
+    async def update_balance(self, account_id: str, amount: Decimal, session=None) -> bool:
+        """
+        Apply a signed amount to the balance with a single conditional find_one_and_update.
+
+        Negative amounts (withdrawals) only match when the resulting balance stays at or
+        above the account's minimum balance (min_balance for regular savings, zero
+        otherwise), so the funds check and the write are one atomic operation.
+        Returns False when the account does not exist or the check fails.
+        """
         if not ObjectId.is_valid(account_id):
             return False
-        
-        # Ensure the amount is converted to string for storage in MongoDB
-        # Note: MongoDB's $inc operator can handle numbers directly, but if 'balance' is stored as string,
-        # we might need to convert it first or use $set with a read-modify-write pattern.
-        # For now, let's assume direct $inc works on numerical string if MongoDB allows that,
-        # or that balance is handled consistently as a number *within* MongoDB once converted.
-        # However, to be safe and consistent with storing balance as string,
-        # we should ensure all balance updates convert to string.
-        # A more robust solution might involve storing balance as a float/double in MongoDB
-        # if precision issues are deemed acceptable for the application's scale,
-        # or use MongoDB's Decimal128 type if available and supported by driver.
-        # For now, converting `amount` to string when updating is the safest bet for string-stored balance.
-        
-        # This part requires careful consideration: if balance is stored as string, $inc won't work as expected.
-        # It's better to fetch, convert to Decimal, perform arithmetic, convert back to string, and then $set.
-        # Or, switch to MongoDB's Decimal128 if the driver and MongoDB version support it.
-        # For the scope of this fix, let's assume balance in DB is meant to be a numerical type for $inc.
-        # If it's string, then the conversion logic needs to be applied carefully to $inc or a $set.
-        # Let's modify this to fetch, update, then save.
-
-        # Ensure amount is always a Decimal
-        amount_decimal = Decimal(str(amount)) # Convert to string first to handle float inputs safely
-        
-        # Fetch the current account
-        account_data = await self.collection.find_one({"_id": ObjectId(account_id)})
-        if not account_data:
-            return False
-        
-        # Ensure current_balance is always a Decimal, handling various potential storage types
-        balance_from_db = account_data.get('balance', '0.00')
-        if isinstance(balance_from_db, str):
-            current_balance = Decimal(balance_from_db)
-        elif isinstance(balance_from_db, (int, float)):
-            current_balance = Decimal(str(balance_from_db)) # Convert float/int to string then to Decimal
-        elif isinstance(balance_from_db, Decimal):
-            current_balance = balance_from_db
-        else:
-            current_balance = Decimal('0.00') # Default if type is unexpected
-            
-        new_balance = current_balance + amount_decimal
-        
-        result = await self.collection.update_one(
-            {"_id": ObjectId(account_id)},
-            {"$set": {"balance": str(new_balance)}}
+
+        # Convert to string first to handle float inputs safely
+        amount_decimal = Decimal(str(amount))
+        query: Dict[str, Any] = {"_id": ObjectId(account_id)}
+        if amount_decimal < 0:
+            minimum_balance = {
+                "$cond": [
+                    {"$eq": ["$type", "regular"]},
+                    {"$ifNull": ["$min_balance", Decimal128(REGULAR_MIN_BALANCE)]},
+                    0
+                ]
+            }
+            query["$expr"] = {
+                "$gte": [{"$add": ["$balance", Decimal128(amount_decimal)]}, minimum_balance]
+            }
+
+        updated = await self.collection.find_one_and_update(
+            query,
+            {"$inc": {"balance": Decimal128(amount_decimal)}, "$set": {"updated_at": datetime.utcnow()}},
+            projection={"_id": 1},
+            return_document=ReturnDocument.AFTER,
+            session=session
+        )
+        return updated is not None
+
+    async def migrate_balances_to_decimal(self) -> int:
+        """
+        Convert balances stored as strings or doubles to Decimal128, rounded to
+        centavos, in one server-side pass. Returns the number of accounts converted.
+        """
+        result = await self.collection.update_many(
+            {"balance": {"$exists": True, "$not": {"$type": "decimal"}}},
+            [{"$set": {"balance": {"$round": [{"$toDecimal": "$balance"}, 2]}}}]
         )
-        return result.modified_count == 1
\ No newline at end of file
+        return result.modified_count
+
+    async def accrual_batch(self, as_of: datetime, after: Optional[ObjectId] = None, limit: int = 5000) -> List[Dict[str, Any]]:
+        """
+        Next batch (by _id) of active interest-bearing accounts not yet accrued for
+        as_of, with money and dates already converted to integer columns on the
+        server: balance_cents, min_balance_cents, rate_units (annual % x 10000),
+        accrued_micros, last_accrual_ms, maturity_ms and tiers as [{min_cents,
+        rate_units}]. Time deposits without a balance accrue on their principal.
+        """
+        match: Dict[str, Any] = {
+            "status": "active",
+            "type": {"$in": ["regular", "high_yield", "time_deposit"]},
+            "last_accrual_date": {"$not": {"$gte": as_of}},
+        }
+        if after is not None:
+            match["_id"] = {"$gt": after}
+
+        pipeline = [
+            {"$match": match},
+            {"$sort": {"_id": 1}},
+            {"$limit": limit},
+            {"$project": {
+                "user_id": 1, "type": 1, "interest_paid_frequency": 1,
+                "tiers": {"$map": {"input": {"$ifNull": ["$tiers", []]}, "as": "tier", "in": {
+                    "min_cents": _scaled({"$ifNull": ["$$tier.min_balance", 0]}, 100),
+                    "rate_units": _scaled({"$ifNull": ["$$tier.rate", 0]}, 10_000),
+                }}},
+                # Missing and null sort below every number, so $gt null means "is set"
+                "min_balance_cents": {"$cond": [{"$gt": ["$min_balance", None]}, _scaled("$min_balance", 100), None]},
+                **_INTEREST_COLUMNS,
+            }},
+        ]
+        return await self.collection.aggregate(pipeline).to_list(length=None)
+
+    async def apply_accruals(
+        self,
+        account_ids: Sequence[ObjectId],
+        accrued: Sequence[Decimal],
+        posted: Sequence[Decimal],
+        as_of: datetime,
+        session=None
+    ) -> None:
+        """
+        Record one accrual run with a single bulk_write: accrued becomes each
+        account's unposted interest and posted is added to its balance. Accounts
+        already accrued for as_of are not touched again; if any of them was, the
+        write raises so the caller's transaction (and its ledger entries) aborts.
+        """
+        now = datetime.utcnow()
+        operations = []
+        for account_id, accrued_interest, posted_interest in zip(account_ids, accrued, posted):
+            update: Dict[str, Any] = {"$set": {"accrued_interest": Decimal128(accrued_interest), "last_accrual_date": as_of, "updated_at": now}}
+            if posted_interest:
+                update["$inc"] = {"balance": Decimal128(posted_interest)}
+            operations.append(UpdateOne({"_id": account_id, "last_accrual_date": {"$not": {"$gte": as_of}}}, update))
+        if not operations:
+            return
+        result = await self.collection.bulk_write(operations, ordered=False, session=session)
+        if result.matched_count != len(operations):
+            raise RuntimeError(f"{len(operations) - result.matched_count} account(s) were already accrued for {as_of.date()}")
+
+    async def due_time_deposits(self, due_before: datetime, limit: int = 1000) -> List[Dict[str, Any]]:
+        """
+        Active time deposits maturing before due_before, earliest first, found through
+        the type_1_status_1_maturity_date_1 index so the cost depends on the number due,
+        not on the size of the collection. Same integer columns as accrual_batch, plus
+        the raw maturity_date, term_days, auto_renew and opened_ms.
+        """
+        pipeline = [
+            {"$match": {"type": "time_deposit", "status": "active", "maturity_date": {"$lt": due_before}}},
+            {"$sort": {"maturity_date": 1}},
+            {"$limit": limit},
+            {"$project": {
+                "user_id": 1, "maturity_date": 1, "term_days": 1, "auto_renew": 1,
+                "opened_ms": {"$toLong": "$opened_at"},
+                **_INTEREST_COLUMNS,
+            }},
+        ]
+        return await self.collection.aggregate(pipeline).to_list(length=None)
+
+    async def apply_maturities(self, maturities: Sequence[Dict[str, Any]], session=None) -> None:
+        """
+        Settle matured time deposits with a single bulk_write. Each item has _id,
+        maturity_date (as read), balance (principal plus all interest) and
+        next_maturity: deposits with a next_maturity roll over with balance as the new
+        principal, the others close with balance paid out. Deposits that no longer
+        have that maturity_date were already settled; if any is, the write raises so
+        the caller's transaction (and its ledger entries) aborts.
+        """
+        now = datetime.utcnow()
+        operations = []
+        for maturity in maturities:
+            balance = Decimal128(maturity["balance"])
+            update: Dict[str, Any]
+            if maturity.get("next_maturity"):
+                update = {
+                    "$set": {
+                        "balance": balance, "principal": balance, "maturity_date": maturity["next_maturity"],
+                        "accrued_interest": Decimal128("0"), "last_accrual_date": maturity["maturity_date"], "updated_at": now,
+                    },
+                    "$inc": {"renewal_count": 1},
+                }
+            else:
+                update = {"$set": {
+                    "balance": Decimal128("0.00"), "payout_amount": balance, "status": "closed", "closed_at": now,
+                    "accrued_interest": Decimal128("0"), "last_accrual_date": maturity["maturity_date"], "updated_at": now,
+                }}
+            operations.append(UpdateOne(
+                {"_id": maturity["_id"], "status": "active", "maturity_date": maturity["maturity_date"]}, update
+            ))
+        if not operations:
+            return
+        result = await self.collection.bulk_write(operations, ordered=False, session=session)
+        if result.matched_count != len(operations):
+            raise RuntimeError(f"{len(operations) - result.matched_count} time deposit(s) were already settled")
@@ -1,59 +1,110 @@
 from typing import List, Optional
-from bson import ObjectId
+from datetime import datetime
+from bson import ObjectId, Decimal128
 from motor.motor_asyncio import AsyncIOMotorCollection
 from ..basemodel.transaction_model import TransactionBase, TransactionInDB
-from ..basemodel.savings_model import RegularSavings # Import RegularSavings
-from .savings_crud import SavingsCRUD, _convert_decimal_to_str
+from .savings_crud import SavingsCRUD
+from .group_commit import group_committer
+from ..config import settings
 from decimal import Decimal
 
 class TransactionCRUD:
-    def __init__(self, collection: AsyncIOMotorCollection, savings_crud: SavingsCRUD):
+    # collection must be opened with DECIMAL_CODEC_OPTIONS (see get_transactions_collection)
+    def __init__(self, collection: AsyncIOMotorCollection, savings_crud: SavingsCRUD, write_mode: Optional[str] = None):
         self.collection = collection
         self.savings_crud = savings_crud
+        self.write_mode = write_mode or settings.SAVINGS_WRITE_MODE
 
     async def create_transaction(self, transaction: TransactionBase) -> Optional[TransactionInDB]:
-        # In a real-world scenario, you'd use a database transaction to ensure atomicity.
-        # MongoDB supports multi-document transactions. For this example, we'll do a two-step process.
+        """
+        Apply a deposit/withdrawal to the account balance and record it, according to
+        SAVINGS_WRITE_MODE. Returns None when the account does not exist, has
+        insufficient funds or would drop below its minimum balance.
+        """
+        if self.write_mode == "group_commit":
+            return await group_committer.submit(self, transaction)
+        if self.write_mode == "transactional":
+            return await self._create_in_transaction(transaction)
+        return await self._create_without_session(transaction)
 
-        # 1. Update the balance in the savings account
-        amount_to_update = transaction.amount
+    @staticmethod
+    def _signed_amount(transaction: TransactionBase) -> Decimal:
         if transaction.transaction_type == "withdrawal":
-            # Ensure the account has sufficient funds before updating
-            account = await self.savings_crud.get_savings_account_by_id(str(transaction.account_id))
-            if not account:
-                return None # Account not found
-
-            # Convert Decimal transaction amount to float for comparison with account.balance (which is float)
-            transaction_amount_float = float(transaction.amount)
-
-            # Check for general insufficient funds first
-            if account.balance < transaction_amount_float:
-                return None # Insufficient funds
-
-            # Specific check for regular savings minimum balance
-            if account.type == "regular":
-                regular_account_model = RegularSavings(**account.model_dump()) # Re-instantiate as RegularSavings
-                prospective_balance = account.balance - transaction_amount_float
-                if prospective_balance < regular_account_model.min_balance:
-                    return None # Withdrawal would violate minimum balance for regular account
-            
-            amount_to_update = -transaction.amount
+            return -transaction.amount
+        return transaction.amount
 
-        balance_updated = await self.savings_crud.update_balance(str(transaction.account_id), amount_to_update)
+    async def _create_without_session(self, transaction: TransactionBase, session=None) -> Optional[TransactionInDB]:
+        # 1. Update the balance in the savings account. Withdrawals carry the
+        # funds/minimum-balance check in the update filter, so no prior read is needed.
+        balance_updated = await self.savings_crud.update_balance(
+            str(transaction.account_id), self._signed_amount(transaction), session=session
+        )
 
         if not balance_updated:
-            return None # Failed to update balance
+            return None # Account not found, insufficient funds or below minimum balance
 
         # 2. Create the transaction record
         transaction_in_db = TransactionInDB(**transaction.model_dump())
         
         doc = transaction_in_db.model_dump(by_alias=True, exclude={"id"})
-        processed_doc = _convert_decimal_to_str(doc)
-        result = await self.collection.insert_one(processed_doc)
+        result = await self.collection.insert_one(doc, session=session)
         
         transaction_in_db.id = result.inserted_id
         return transaction_in_db
 
+    async def _create_in_transaction(self, transaction: TransactionBase) -> Optional[TransactionInDB]:
+        async with await self.collection.database.client.start_session() as session:
+            return await session.with_transaction(
+                lambda s: self._create_without_session(transaction, session=s)
+            )
+
+    async def create_transactions_grouped(self, account_id: str, transactions: List[TransactionBase]) -> List[Optional[TransactionInDB]]:
+        """
+        Apply several transactions for one account in arrival order inside a single
+        MongoDB transaction: the balance is read once, each withdrawal is checked
+        against the running balance, and the accepted ones are written with one $inc
+        and one insert_many. Rejected entries come back as None.
+        """
+        if not ObjectId.is_valid(account_id):
+            return [None] * len(transactions)
+
+        async def apply(session) -> List[Optional[TransactionInDB]]:
+            account = await self.savings_crud.collection.find_one(
+                {"_id": ObjectId(account_id)}, {"balance": 1, "type": 1, "min_balance": 1}, session=session
+            )
+            if not account:
+                return [None] * len(transactions)
+
+            balance = Decimal(str(account["balance"]))
+            minimum_balance = self.savings_crud.minimum_balance(account)
+            results: List[Optional[TransactionInDB]] = []
+            for transaction in transactions:
+                amount = self._signed_amount(transaction)
+                if amount < 0 and balance + amount < minimum_balance:
+                    results.append(None)
+                    continue
+                balance += amount
+                results.append(TransactionInDB(**transaction.model_dump()))
+
+            accepted = [t for t in results if t is not None]
+            if not accepted:
+                return results
+
+            net_amount = sum((self._signed_amount(t) for t in accepted), Decimal("0"))
+            await self.savings_crud.collection.update_one(
+                {"_id": ObjectId(account_id)},
+                {"$inc": {"balance": Decimal128(net_amount)}, "$set": {"updated_at": datetime.utcnow()}},
+                session=session
+            )
+            docs = [t.model_dump(by_alias=True, exclude={"id"}) for t in accepted]
+            result = await self.collection.insert_many(docs, session=session)
+            for transaction_in_db, inserted_id in zip(accepted, result.inserted_ids):
+                transaction_in_db.id = inserted_id
+            return results
+
+        async with await self.collection.database.client.start_session() as session:
+            return await session.with_transaction(apply)
+
     async def get_transactions_by_account_id(self, account_id: str) -> List[TransactionInDB]:
         if not ObjectId.is_valid(account_id):
             return []
@@ -0,0 +1,50 @@
+from typing import Dict, List, Optional
+
+from strawberry.dataloader import DataLoader
+
+from .basemodel.loan_model import Loan
+from .models import CustomerInDB
+from .database import get_customers_collection, get_loans_collection, get_loan_balances_collection
+from .database.customer_crud import CustomerCRUD
+from .database.loan_crud import LoanCRUD
+from .database.loan_balance_crud import LoanBalanceCRUD
+
+
+async def load_customers(keys: List[str]) -> List[Optional[CustomerInDB]]:
+    """Batch-load customers for every key requested in the same tick."""
+    customer_crud = CustomerCRUD(get_customers_collection())
+    customers = await customer_crud.get_customers_by_ids(keys)
+    by_id = {str(customer.id): customer for customer in customers}
+    return [by_id.get(key) for key in keys]
+
+
+async def load_loans(keys: List[str]) -> List[Optional[Loan]]:
+    """Batch-load loans, resolving each key by _id or by the custom loan_id."""
+    loan_crud = LoanCRUD(get_loans_collection())
+    loans = await loan_crud.get_loans_by_ids(keys)
+    by_id: Dict[str, Loan] = {}
+    for loan in loans:
+        by_id[str(loan.id)] = loan
+        if loan.loan_id is not None:
+            by_id.setdefault(str(loan.loan_id), loan)
+    return [by_id.get(key) for key in keys]
+
+
+async def load_loan_balances(keys: List[str]) -> List[Optional[dict]]:
+    """Batch-load loan_balances summaries, keyed by the loan id the transactions use."""
+    balance_crud = LoanBalanceCRUD(get_loan_balances_collection())
+    balances = await balance_crud.get_loan_balances_by_ids(keys)
+    by_id = {balance["_id"]: balance for balance in balances}
+    return [by_id.get(key) for key in keys]
+
+
+def create_loaders() -> Dict[str, DataLoader]:
+    """
+    Build a fresh set of loaders for one GraphQL request.
+    Loaders cache their results, so they must never be shared between requests.
+    """
+    return {
+        "customer_loader": DataLoader(load_fn=load_customers),
+        "loan_loader": DataLoader(load_fn=load_loans),
+        "loan_balance_loader": DataLoader(load_fn=load_loan_balances),
+    }
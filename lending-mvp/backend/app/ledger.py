@@ -0,0 +1,130 @@
+import strawberry
+from typing import List, Optional
+from datetime import datetime
+from decimal import Decimal
+from strawberry.types import Info
+from fastapi import HTTPException, status
+
+from .models import UserInDB
+from .schema import PageInfo
+from .services import accounting_service
+
+
+# Ledger Entry Types
+@strawberry.type
+class LedgerEntryType:
+    transaction_id: str
+    account: str
+    amount: float
+    entry_type: str
+    timestamp: datetime
+    loan_id: Optional[str] = None
+    borrower_id: Optional[str] = None
+
+@strawberry.type
+class LedgerEntryEdge:
+    cursor: str
+    node: LedgerEntryType
+
+@strawberry.type
+class LedgerEntryConnection:
+    edges: List[LedgerEntryEdge]
+    page_info: PageInfo
+
+@strawberry.type
+class AccountBalanceType:
+    account: str
+    debit_total: Decimal
+    credit_total: Decimal
+    balance: Decimal # debits - credits
+    entry_count: int
+
+@strawberry.type
+class TrialBalanceType:
+    as_of: Optional[datetime]
+    accounts: List[AccountBalanceType]
+    total_debits: Decimal
+    total_credits: Decimal
+    balanced: bool
+
+
+def convert_account_balance(balance: dict) -> AccountBalanceType:
+    return AccountBalanceType(
+        account=balance["account"],
+        debit_total=Decimal(str(balance.get("debit_total", 0))),
+        credit_total=Decimal(str(balance.get("credit_total", 0))),
+        balance=Decimal(str(balance.get("balance", 0))),
+        entry_count=balance.get("entry_count", 0)
+    )
+
+
+def convert_ledger_entry(entry: dict) -> LedgerEntryType:
+    return LedgerEntryType(
+        transaction_id=entry["transaction_id"],
+        account=entry["account"],
+        amount=entry["amount"],
+        entry_type=entry["entry_type"],
+        timestamp=entry["timestamp"],
+        loan_id=entry.get("loan_id"),
+        borrower_id=entry.get("borrower_id")
+    )
+
+
+@strawberry.type
+class LedgerQuery:
+    @strawberry.field
+    async def get_borrower_ledger(
+        self,
+        info: Info,
+        borrower_id: str,
+        first: int = 50,
+        after: Optional[str] = None,
+        from_date: Optional[datetime] = None,
+        to_date: Optional[datetime] = None,
+        loan_id: Optional[str] = None
+    ) -> LedgerEntryConnection:
+        """Get a borrower's ledger entries with keyset pagination, newest first, within [fromDate, toDate)"""
+        current_user: UserInDB = info.context.get("current_user")
+        if not current_user:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
+        if current_user.role not in ["admin", "staff"]:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized")
+
+        edges, has_next_page = await accounting_service.get_ledger_for_borrower(
+            borrower_id, first=first, after=after, from_date=from_date, to_date=to_date, loan_id=loan_id
+        )
+        return LedgerEntryConnection(
+            edges=[LedgerEntryEdge(cursor=cursor, node=convert_ledger_entry(entry)) for cursor, entry in edges],
+            page_info=PageInfo(has_next_page=has_next_page, end_cursor=edges[-1][0] if edges else None)
+        )
+
+    @strawberry.field
+    async def trial_balance(self, info: Info, as_of: Optional[datetime] = None) -> TrialBalanceType:
+        """Totals of every ledger account now, or before asOf (from the latest snapshot plus later entries)"""
+        current_user: UserInDB = info.context.get("current_user")
+        if not current_user:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
+        if current_user.role not in ["admin", "staff"]:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized")
+
+        accounts = [convert_account_balance(balance) for balance in await accounting_service.trial_balance(as_of)]
+        total_debits = sum((account.debit_total for account in accounts), Decimal("0"))
+        total_credits = sum((account.credit_total for account in accounts), Decimal("0"))
+        return TrialBalanceType(
+            as_of=as_of,
+            accounts=accounts,
+            total_debits=total_debits,
+            total_credits=total_credits,
+            balanced=total_debits.quantize(Decimal("0.01")) == total_credits.quantize(Decimal("0.01"))
+        )
+
+    @strawberry.field
+    async def account_balance(self, info: Info, account: str, as_of: Optional[datetime] = None) -> AccountBalanceType:
+        """Totals of one ledger account now, or before asOf"""
+        current_user: UserInDB = info.context.get("current_user")
+        if not current_user:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
+        if current_user.role not in ["admin", "staff"]:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized")
+
+        return convert_account_balance(await accounting_service.get_account_balance(account, as_of))
@@ -1,20 +1,56 @@
 import strawberry
 from typing import List, Optional
 from decimal import Decimal
-from datetime import datetime
+from datetime import datetime, date
 from strawberry.types import Info
 from fastapi import HTTPException, status
 
 from .basemodel.loan_model import Loan, LoanCreate, LoanUpdate, LoanOut, PyObjectId
 from .models import UserInDB
 from .database import get_loan_transactions_collection
-from .database import get_loans_collection, get_db, get_customers_collection
+from .database import get_loans_collection, get_db, get_portfolio_rollups_collection
 from .database.loan_crud import LoanCRUD
-from .database.customer_crud import CustomerCRUD
+from .database.portfolio_rollup_crud import PortfolioRollupCRUD
 from .customer import CustomerType, convert_customer_db_to_customer_type
+from .schema import PageInfo
+from .database.pagination import TotalMode
+from .services.amortization_service import amortization_schedule
+from .services import loan_service
 
 
 # Loan Types (Strawberry)
+@strawberry.type
+class LoanBalanceType:
+    principal_disbursed: Decimal = strawberry.field(name="principalDisbursed")
+    total_repaid: Decimal = strawberry.field(name="totalRepaid")
+    interest_charged: Decimal = strawberry.field(name="interestCharged")
+    fees_charged: Decimal = strawberry.field(name="feesCharged")
+    penalties_charged: Decimal = strawberry.field(name="penaltiesCharged")
+    outstanding: Decimal
+    last_transaction_date: Optional[datetime] = strawberry.field(name="lastTransactionDate")
+
+def convert_loan_balance(balance: Optional[dict]) -> LoanBalanceType:
+    """A loan without transactions has no summary yet; report it as all zeros."""
+    balance = balance or {}
+    return LoanBalanceType(
+        principal_disbursed=balance.get("principal_disbursed", Decimal("0")),
+        total_repaid=balance.get("total_repaid", Decimal("0")),
+        interest_charged=balance.get("interest_charged", Decimal("0")),
+        fees_charged=balance.get("fees_charged", Decimal("0")),
+        penalties_charged=balance.get("penalties_charged", Decimal("0")),
+        outstanding=balance.get("outstanding", Decimal("0")),
+        last_transaction_date=balance.get("last_transaction_date")
+    )
+
+@strawberry.type
+class ScheduleRowType:
+    period: int
+    due_date: Optional[date] = strawberry.field(name="dueDate")
+    payment: Decimal
+    principal: Decimal
+    interest: Decimal
+    balance: Decimal
+
 @strawberry.type
 class LoanType:
     id: strawberry.ID
@@ -27,13 +63,20 @@ class LoanType:
     status: str
     created_at: datetime = strawberry.field(name="createdAt")
     updated_at: datetime = strawberry.field(name="updatedAt")
+    next_due_date: Optional[datetime] = strawberry.field(name="nextDueDate", default=None)
+    aging_bucket: Optional[str] = strawberry.field(name="agingBucket", default=None)
+
+    @strawberry.field(name="daysPastDue")
+    def days_past_due(self) -> int:
+        """Days since nextDueDate; the stored value is only refreshed when the aging bucket changes."""
+        if not self.next_due_date:
+            return 0
+        return max((datetime.utcnow().date() - self.next_due_date.date()).days, 0)
 
     @strawberry.field(name="borrowerName")
     async def borrower_name(self, info: Info) -> Optional[str]:
         try:
-            customers_collection = get_customers_collection()
-            customer_crud = CustomerCRUD(customers_collection)
-            customer_data = await customer_crud.get_customer_by_id(str(self.borrower_id))
+            customer_data = await info.context["customer_loader"].load(str(self.borrower_id))
             if customer_data:
                 return customer_data.display_name
             return "N/A"
@@ -44,9 +87,7 @@ class LoanType:
     @strawberry.field
     async def customer(self, info: Info) -> Optional[CustomerType]:
         try:
-            customers_collection = get_customers_collection()
-            customer_crud = CustomerCRUD(customers_collection)
-            customer_data = await customer_crud.get_customer_by_id(str(self.borrower_id))
+            customer_data = await info.context["customer_loader"].load(str(self.borrower_id))
             if customer_data:
                 return convert_customer_db_to_customer_type(customer_data)
             return None
@@ -54,6 +95,31 @@ class LoanType:
             print(f"Error resolving customer for loan: {e}")
             return None
 
+    @strawberry.field
+    def schedule(self, method: str = "equal_installment") -> List[ScheduleRowType]:
+        """Repayment schedule: equal_installment, straight_line or interest_only (balloon); due dates run monthly from createdAt."""
+        rows = amortization_schedule(self.amount_requested, self.interest_rate, self.term_months, method, self.created_at)
+        return [
+            ScheduleRowType(
+                period=row["period"],
+                due_date=row["due_date"],
+                payment=row["payment"],
+                principal=row["principal"],
+                interest=row["interest"],
+                balance=row["balance"]
+            )
+            for row in rows
+        ]
+
+    @strawberry.field
+    async def balance(self, info: Info) -> LoanBalanceType:
+        """Server-maintained summary from loan_balances (transactions may reference the custom loanId)."""
+        loader = info.context["loan_balance_loader"]
+        balance = await loader.load(str(self.id))
+        if balance is None and self.loan_id:
+            balance = await loader.load(str(self.loan_id))
+        return convert_loan_balance(balance)
+
 @strawberry.input
 class LoanCreateInput:
     borrower_id: strawberry.ID
@@ -83,7 +149,86 @@ class LoansResponse:
     success: bool
     message: str
     loans: List[LoanType]
+    total: Optional[int]
+
+@strawberry.input
+class DisburseLoansInput:
+    loan_ids: Optional[List[strawberry.ID]] = strawberry.field(name="loanIds", default=None)
+    borrower_id: Optional[strawberry.ID] = None
+    loan_product: Optional[str] = strawberry.field(name="loanProduct", default=None)
+    branch: Optional[str] = None
+    limit: Optional[int] = None
+    concurrency: Optional[int] = None
+
+@strawberry.type
+class DisbursementResultType:
+    loan_id: str = strawberry.field(name="loanId")
+    amount: Optional[Decimal]
+    status: str # disbursed, skipped, failed
+    message: str
+
+@strawberry.type
+class BatchDisbursementResponse:
+    success: bool
+    message: str
     total: int
+    disbursed: int
+    skipped: int
+    failed: int
+    results: List[DisbursementResultType]
+
+@strawberry.type
+class PortfolioBucketType:
+    key: str
+    loan_count: int = strawberry.field(name="loanCount")
+    amount_requested: Decimal = strawberry.field(name="amountRequested")
+    principal_disbursed: Decimal = strawberry.field(name="principalDisbursed")
+    total_repaid: Decimal = strawberry.field(name="totalRepaid")
+    interest_charged: Decimal = strawberry.field(name="interestCharged")
+    fees_charged: Decimal = strawberry.field(name="feesCharged")
+    penalties_charged: Decimal = strawberry.field(name="penaltiesCharged")
+    outstanding: Decimal
+
+@strawberry.type
+class PortfolioSummaryType:
+    total: Optional[PortfolioBucketType]
+    by_status: List[PortfolioBucketType] = strawberry.field(name="byStatus")
+    by_loan_product: List[PortfolioBucketType] = strawberry.field(name="byLoanProduct")
+    by_branch: List[PortfolioBucketType] = strawberry.field(name="byBranch")
+    by_origination_month: List[PortfolioBucketType] = strawberry.field(name="byOriginationMonth")
+    by_aging: List[PortfolioBucketType] = strawberry.field(name="byAging")
+
+@strawberry.type
+class PortfolioAtRiskType:
+    outstanding: Decimal
+    par30: Decimal
+    par30_ratio: Decimal = strawberry.field(name="par30Ratio")
+    par90: Decimal
+    par90_ratio: Decimal = strawberry.field(name="par90Ratio")
+    buckets: List[PortfolioBucketType]
+
+def convert_portfolio_bucket(bucket: dict) -> PortfolioBucketType:
+    return PortfolioBucketType(
+        key=bucket["key"],
+        loan_count=bucket.get("loan_count", 0),
+        amount_requested=bucket.get("amount_requested", Decimal("0")),
+        principal_disbursed=bucket.get("principal_disbursed", Decimal("0")),
+        total_repaid=bucket.get("total_repaid", Decimal("0")),
+        interest_charged=bucket.get("interest_charged", Decimal("0")),
+        fees_charged=bucket.get("fees_charged", Decimal("0")),
+        penalties_charged=bucket.get("penalties_charged", Decimal("0")),
+        outstanding=bucket.get("outstanding", Decimal("0"))
+    )
+
+@strawberry.type
+class LoanEdge:
+    cursor: str
+    node: LoanType
+
+@strawberry.type
+class LoanConnection:
+    edges: List[LoanEdge]
+    page_info: PageInfo
 
 def convert_loan_db_to_loan_type(loan_db: Loan) -> LoanType:
     """Convert Loan (from CRUD) to LoanType (Strawberry schema)"""
@@ -97,7 +242,9 @@ def convert_loan_db_to_loan_type(loan_db: Loan) -> LoanType:
         interest_rate=loan_db.interest_rate,
         status=loan_db.status,
         created_at=loan_db.created_at,
-        updated_at=loan_db.updated_at
+        updated_at=loan_db.updated_at,
+        next_due_date=loan_db.next_due_date,
+        aging_bucket=loan_db.aging_bucket
     )
 
 @strawberry.type
@@ -130,13 +277,53 @@ class LoanQuery:
         except Exception as e:
             return LoanResponse(success=False, message=f"Error retrieving loan: {str(e)}")
 
+    @strawberry.field
+    async def portfolio_summary(self, info: Info) -> PortfolioSummaryType:
+        """Loan counts and amounts by status, product, branch and origination month, read from the rollups"""
+        current_user: UserInDB = info.context.get("current_user")
+        if not current_user:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
+        if current_user.role not in ["admin", "staff"]:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized")
+
+        summary = await PortfolioRollupCRUD(get_portfolio_rollups_collection()).get_summary()
+        total = summary["portfolio"][0] if summary["portfolio"] else None
+        return PortfolioSummaryType(
+            total=convert_portfolio_bucket(total) if total else None,
+            by_status=[convert_portfolio_bucket(b) for b in summary["status"]],
+            by_loan_product=[convert_portfolio_bucket(b) for b in summary["loan_product"]],
+            by_branch=[convert_portfolio_bucket(b) for b in summary["branch"]],
+            by_origination_month=[convert_portfolio_bucket(b) for b in summary["origination_month"]],
+            by_aging=[convert_portfolio_bucket(b) for b in summary["aging"]]
+        )
+
+    @strawberry.field
+    async def portfolio_at_risk(self, info: Info) -> PortfolioAtRiskType:
+        """PAR30 / PAR90: outstanding of active loans more than 30 / 90 days past due, read from the aging rollups"""
+        current_user: UserInDB = info.context.get("current_user")
+        if not current_user:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
+        if current_user.role not in ["admin", "staff"]:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized")
+
+        par = await PortfolioRollupCRUD(get_portfolio_rollups_collection()).get_portfolio_at_risk()
+        return PortfolioAtRiskType(
+            outstanding=par["outstanding"],
+            par30=par["par30"],
+            par30_ratio=par["par30_ratio"],
+            par90=par["par90"],
+            par90_ratio=par["par90_ratio"],
+            buckets=[convert_portfolio_bucket(b) for b in par["buckets"]]
+        )
+
     @strawberry.field
     async def loans(
         self,
         info: Info,
         skip: int = 0,
         limit: int = 100,
-        borrower_id: Optional[strawberry.ID] = None
+        borrower_id: Optional[strawberry.ID] = None,
+        total_mode: TotalMode = TotalMode.EXACT
     ) -> LoansResponse:
         """Get a list of loans with optional filtering by borrower_id"""
         current_user: UserInDB = info.context.get("current_user")
@@ -153,8 +340,12 @@ class LoanQuery:
             if current_user.role == "user":
                 borrower_id = strawberry.ID(str(current_user.id))
 
-            loans_db = await loan_crud.get_loans(skip=skip, limit=limit, borrower_id=str(borrower_id) if borrower_id else None)
-            total = await loan_crud.count_loans(borrower_id=str(borrower_id) if borrower_id else None)
+            loans_db, total = await loan_crud.get_loans_with_total(
+                skip=skip,
+                limit=limit,
+                borrower_id=str(borrower_id) if borrower_id else None,
+                total_mode=total_mode
+            )
 
             loans_type = [convert_loan_db_to_loan_type(loan_db) for loan_db in loans_db]
             return LoansResponse(
@@ -168,6 +359,34 @@ class LoanQuery:
         except Exception as e:
             return LoansResponse(success=False, message=f"Error retrieving loans: {str(e)}", loans=[], total=0)
 
+    @strawberry.field
+    async def loans_connection(
+        self,
+        info: Info,
+        first: int = 50,
+        after: Optional[str] = None,
+        borrower_id: Optional[strawberry.ID] = None
+    ) -> LoanConnection:
+        """Get loans with keyset pagination, newest first"""
+        current_user: UserInDB = info.context.get("current_user")
+        if not current_user:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
+        if current_user.role not in ["admin", "staff"]: # Example role check
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized")
+
+        loans_collection = get_loans_collection()
+        loan_crud = LoanCRUD(loans_collection)
+
+        # If a regular user, they can only see their own loans
+        if current_user.role == "user":
+            borrower_id = strawberry.ID(str(current_user.id))
+
+        edges, has_next_page = await loan_crud.get_loans_page(first=first, after=after, borrower_id=str(borrower_id) if borrower_id else None)
+        return LoanConnection(
+            edges=[LoanEdge(cursor=cursor, node=convert_loan_db_to_loan_type(loan_db)) for cursor, loan_db in edges],
+            page_info=PageInfo(has_next_page=has_next_page, end_cursor=edges[-1][0] if edges else None)
+        )
+
 
 @strawberry.type
 class LoanMutation:
@@ -237,6 +456,41 @@ class LoanMutation:
         except Exception as e:
             return LoanResponse(success=False, message=f"Error updating loan: {str(e)}")
 
+    @strawberry.mutation
+    async def disburse_loans(self, info: Info, input: DisburseLoansInput) -> BatchDisbursementResponse:
+        """Disburse the approved loans matching the filter, concurrently and idempotently"""
+        current_user: UserInDB = info.context.get("current_user")
+        if not current_user:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
+        if current_user.role not in ["admin", "staff"]:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to disburse loans")
+
+        try:
+            query = loan_service.disbursement_filter(
+                loan_ids=[str(loan_id) for loan_id in input.loan_ids] if input.loan_ids else None,
+                borrower_id=str(input.borrower_id) if input.borrower_id else None,
+                loan_product=input.loan_product,
+                branch=input.branch
+            )
+            results = await loan_service.disburse_loans(query, limit=input.limit, concurrency=input.concurrency)
+            counts = {outcome: sum(1 for result in results if result["status"] == outcome) for outcome in ("disbursed", "skipped", "failed")}
+            return BatchDisbursementResponse(
+                success=counts["failed"] == 0,
+                message=f"{counts['disbursed']} loan(s) disbursed, {counts['skipped']} skipped, {counts['failed']} failed",
+                total=len(results),
+                disbursed=counts["disbursed"],
+                skipped=counts["skipped"],
+                failed=counts["failed"],
+                results=[
+                    DisbursementResultType(loan_id=result["loan_id"], amount=result["amount"], status=result["status"], message=result["message"])
+                    for result in results
+                ]
+            )
+        except HTTPException as e:
+            raise e
+        except Exception as e:
+            return BatchDisbursementResponse(success=False, message=f"Error disbursing loans: {str(e)}", total=0, disbursed=0, skipped=0, failed=0, results=[])
+
     @strawberry.mutation
     async def delete_loan(self, info: Info, loan_id: strawberry.ID) -> LoanResponse:
         """Delete a loan application"""
@@ -25,6 +25,8 @@ class LoanProduct:
     br_lc: str
     created_at: datetime
     updated_at: datetime
+    penalty_rate: Optional[Decimal] = None
+    penalty_grace_days: int = 0
 
 @strawberry.input
 class LoanProductCreateInput:
@@ -37,6 +39,8 @@ class LoanProductCreateInput:
     template: str
     security: str
     br_lc: str
+    penalty_rate: Optional[Decimal] = None
+    penalty_grace_days: int = 0
 
 @strawberry.input
 class LoanProductUpdateInput:
@@ -49,6 +53,8 @@ class LoanProductUpdateInput:
     template: Optional[str] = None
     security: Optional[str] = None
     br_lc: Optional[str] = None
+    penalty_rate: Optional[Decimal] = None
+    penalty_grace_days: Optional[int] = None
 
 @strawberry.type
 class LoanProductQuery:
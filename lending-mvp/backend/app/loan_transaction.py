@@ -9,6 +9,8 @@ from .basemodel.loan_transaction_model import LoanTransaction, LoanTransactionBa
 from .models import UserInDB
 from .database import get_loan_transactions_collection
 from .database.loan_transaction_crud import LoanTransactionCRUD
+from .schema import PageInfo
+from .database.pagination import TotalMode
 
 
 # Loan Transaction Types (Strawberry)
@@ -38,18 +40,10 @@ class LoanTransactionType:
         
         # If borrower_name is missing, try to resolve it from the loan -> customer
         try:
-            from .database import get_loans_collection, get_customers_collection
-            from .database.loan_crud import LoanCRUD
-            from .database.customer_crud import CustomerCRUD
-            
-            loans_collection = get_loans_collection()
-            loan_crud = LoanCRUD(loans_collection)
-            loan_db = await loan_crud.get_loan_by_id(str(self.loan_id))
+            loan_db = await info.context["loan_loader"].load(str(self.loan_id))
             
             if loan_db:
-                customers_collection = get_customers_collection()
-                customer_crud = CustomerCRUD(customers_collection)
-                customer_db = await customer_crud.get_customer_by_id(str(loan_db.borrower_id))
+                customer_db = await info.context["customer_loader"].load(str(loan_db.borrower_id))
                 if customer_db:
                     return customer_db.display_name
         except Exception as e:
@@ -125,7 +119,17 @@ class LoanTransactionsResponse:
     success: bool
     message: str
     transactions: List[LoanTransactionType]
-    total: int
+    total: Optional[int]
+
+@strawberry.type
+class LoanTransactionEdge:
+    cursor: str
+    node: LoanTransactionType
+
+@strawberry.type
+class LoanTransactionConnection:
+    edges: List[LoanTransactionEdge]
+    page_info: PageInfo
 
 def convert_loan_transaction_db_to_loan_transaction_type(transaction_db: LoanTransaction) -> LoanTransactionType:
     """Convert LoanTransaction (from CRUD) to LoanTransactionType (Strawberry schema)"""
@@ -189,7 +193,8 @@ class LoanTransactionQuery:
         info: Info,
         skip: int = 0,
         limit: int = 100,
-        loan_id: Optional[strawberry.ID] = None
+        loan_id: Optional[strawberry.ID] = None,
+        total_mode: TotalMode = TotalMode.EXACT
     ) -> LoanTransactionsResponse:
         """Get a list of loan transactions with optional filtering by loan_id"""
         current_user: UserInDB = info.context.get("current_user")
@@ -204,8 +209,12 @@ class LoanTransactionQuery:
             
             # TODO: Add authorization check based on loan_id and current_user
             
-            transactions_db = await transaction_crud.get_loan_transactions(skip=skip, limit=limit, loan_id=str(loan_id) if loan_id else None)
-            total = await transaction_crud.count_loan_transactions(loan_id=str(loan_id) if loan_id else None)
+            transactions_db, total = await transaction_crud.get_loan_transactions_with_total(
+                skip=skip,
+                limit=limit,
+                loan_id=str(loan_id) if loan_id else None,
+                total_mode=total_mode
+            )
 
             transactions_type = [convert_loan_transaction_db_to_loan_transaction_type(t) for t in transactions_db]
             return LoanTransactionsResponse(
@@ -219,6 +228,33 @@ class LoanTransactionQuery:
         except Exception as e:
             return LoanTransactionsResponse(success=False, message=f"Error retrieving loan transactions: {str(e)}", transactions=[], total=0)
 
+    @strawberry.field
+    async def loan_transactions_connection(
+        self,
+        info: Info,
+        first: int = 50,
+        after: Optional[str] = None,
+        loan_id: Optional[strawberry.ID] = None
+    ) -> LoanTransactionConnection:
+        """Get loan transactions with keyset pagination, newest transaction date first"""
+        current_user: UserInDB = info.context.get("current_user")
+        if not current_user:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
+        if current_user.role not in ["admin", "staff"]:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized")
+
+        loan_transactions_collection = get_loan_transactions_collection()
+        transaction_crud = LoanTransactionCRUD(loan_transactions_collection)
+
+        edges, has_next_page = await transaction_crud.get_loan_transactions_page(first=first, after=after, loan_id=str(loan_id) if loan_id else None)
+        return LoanTransactionConnection(
+            edges=[
+                LoanTransactionEdge(cursor=cursor, node=convert_loan_transaction_db_to_loan_transaction_type(t))
+                for cursor, t in edges
+            ],
+            page_info=PageInfo(has_next_page=has_next_page, end_cursor=edges[-1][0] if edges else None)
+        )
+
 
 @strawberry.type
 class LoanTransactionMutation:
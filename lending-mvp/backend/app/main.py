@@ -1,11 +1,14 @@
-from fastapi import FastAPI, HTTPException, status, Request
+import json
+from fastapi import FastAPI, HTTPException, status, Request, Depends
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 import strawberry
 from strawberry.fastapi import GraphQLRouter
 from pydantic import BaseModel
-from typing import Dict
+from typing import Dict, Optional
+from datetime import datetime
 
-from .schema import Query, Mutation as SchemaMutation
+from .schema import Mutation as SchemaMutation
 from .user import Query as getUser, Mutation as createUser
 from .customer import Query as getCustomer, Mutation as createCustomer
 from .savings import SavingsQuery, SavingsMutation
@@ -13,9 +16,15 @@ from .transaction import TransactionQuery, TransactionMutation
 from .loan import LoanQuery, LoanMutation
 from .loan_transaction import LoanTransactionQuery, LoanTransactionMutation # Import LoanTransactionQuery and LoanTransactionMutation
 from .loan_product import LoanProductQuery, LoanProductMutation # Import LoanProductQuery and LoanProductMutation
-from .database import create_indexes, get_users_collection
+from .ledger import LedgerQuery
+from .database import create_indexes, get_users_collection, get_customers_collection, get_loan_transactions_collection
 from .database.crud import UserCRUD
-from .auth.security import verify_token
+from .database.customer_crud import CustomerCRUD
+from .database.loan_transaction_crud import LoanTransactionCRUD
+from .auth.security import verify_token, password_hash_stats
+from .auth.user_cache import user_cache
+from .dataloaders import create_loaders
+from .services import auth_service, customer_import_service, export_service, loan_transaction_import_service
 
 
 # --- Pydantic Models for REST requests ---
@@ -25,7 +34,7 @@ class LoginRequest(BaseModel):
 
 # --- Strawberry GraphQL Setup ---
 @strawberry.type
-class Query(getUser, getCustomer, SavingsQuery, TransactionQuery, LoanQuery, LoanTransactionQuery, LoanProductQuery): # Add LoanProductQuery
+class Query(getUser, getCustomer, SavingsQuery, TransactionQuery, LoanQuery, LoanTransactionQuery, LoanProductQuery, LedgerQuery): # Add LoanProductQuery
     pass
 
 @strawberry.type
@@ -107,19 +116,11 @@ class Mutation(createUser, createCustomer, SchemaMutation, SavingsMutation, Tran
 #         )
 
 
-async def get_context(request: Request) -> dict:
-    print("--- In get_context ---")
+async def authenticate_request(request: Request):
+    """Resolve the Bearer token of a request to its user (cached), or raise 401."""
     auth_header = request.headers.get("Authorization")
     print(f"Authorization Header: {auth_header}")
 
-    # Allow introspection & Playground without auth (common dev pattern)
-    if request.method == "GET":
-        # GET requests are usually introspection or IDE load
-        # You can make this stricter by checking path/query params if needed
-        print("--- Allowing unauthenticated GET (Playground/introspection) ---")
-        return {"current_user": None}  # or some guest context
-
-    # For POST (real queries/mutations) → enforce auth
     if not auth_header or not auth_header.startswith("Bearer "):
         print("--- No valid Bearer token → rejecting ---")
         raise HTTPException(
@@ -139,15 +140,17 @@ async def get_context(request: Request) -> dict:
         if not user_id:
             raise HTTPException(status_code=401, detail="Token missing subject (sub) claim")
 
-        users_collection = get_users_collection()
-        user_crud = UserCRUD(users_collection)
-        current_user = await user_crud.get_user_by_id(user_id)
-        print(f"User found in DB: {current_user is not None}")
+        current_user = user_cache.get(user_id)
+        if current_user is None:
+            users_collection = get_users_collection()
+            user_crud = UserCRUD(users_collection)
+            current_user = await user_crud.get_user_by_id(user_id)
+            print(f"User found in DB: {current_user is not None}")
+            if current_user:
+                user_cache.set(user_id, current_user)
         if not current_user:
             raise HTTPException(status_code=401, detail="User not found")
-
-        print("--- Exiting get_context (authenticated) ---")
-        return {"current_user": current_user}
+        return current_user
 
     except Exception as e:
         print(f"Error during authentication: {e}")
@@ -157,6 +160,31 @@ async def get_context(request: Request) -> dict:
         )
 
 
+async def require_staff(request: Request):
+    """Dependency for REST endpoints restricted to admin/staff users."""
+    current_user = await authenticate_request(request)
+    if current_user.role not in ["admin", "staff"]:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized")
+    return current_user
+
+
+async def get_context(request: Request) -> dict:
+    print("--- In get_context ---")
+
+    # Allow introspection & Playground without auth (common dev pattern)
+    if request.method == "GET":
+        # GET requests are usually introspection or IDE load
+        # You can make this stricter by checking path/query params if needed
+        print("--- Allowing unauthenticated GET (Playground/introspection) ---")
+        return {"current_user": None, **create_loaders()}  # or some guest context
+
+    # For POST (real queries/mutations) → enforce auth
+    current_user = await authenticate_request(request)
+    print("--- Exiting get_context (authenticated) ---")
+    # Loaders are per request: they batch lookups within a tick and cache for the request only
+    return {"current_user": current_user, **create_loaders()}
+
+
 graphql_schema = strawberry.Schema(query=Query, mutation=Mutation)
 graphql_app = GraphQLRouter(graphql_schema, context_getter=get_context)
 
@@ -187,62 +215,105 @@ app.include_router(graphql_app, prefix="/graphql")
 async def root():
     return {"message": "Welcome to the Lending MVP API"}
 
+@app.get("/metrics")
+async def metrics(current_user=Depends(require_staff)):
+    """In-process counters for the caches and pools of this worker (staff and admins only)."""
+    return {"user_cache": user_cache.stats(), "password_hashing": password_hash_stats()}
+
 @app.post("/api-login/")
 async def api_login(login_request: LoginRequest):
     """
-    Bridge endpoint to the GraphQL login mutation.
-    Accepts username and password in a POST request body.
-    """
-    # We need a fresh schema instance to avoid context conflicts with the main GraphQL app
-    schema = strawberry.Schema(query=Query, mutation=Mutation)
-    
-    query = """
-        mutation Login($username: String!, $password: String!) {
-            login(input: {username: $username, password: $password}) {
-                accessToken
-                tokenType
-                user {
-                    id
-                    username
-                    email
-                    fullName
-                    isActive
-                    role
-                }
-            }
-        }
+    REST login endpoint.
+    Accepts username and password in a POST request body and returns the same
+    payload as the GraphQL login mutation, calling the auth service directly.
     """
-    
-    result = await schema.execute(
-        query,
-        variable_values={
-            "username": login_request.username,
-            "password": login_request.password
-        }
-    )
-    
-    if result.errors:
-        error = result.errors[0]
-        original_error = getattr(error, 'original_error', None)
-
-        if isinstance(original_error, HTTPException):
-            raise original_error
-        
-        if "Incorrect username or password" in error.message:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Incorrect username or password",
-            )
-        else:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="An unexpected error occurred during login.",
-            )
-
-    if result.data and result.data.get("login"):
-        return result.data["login"]
-    else:
+    try:
+        access_token, user_db = await auth_service.authenticate_user(
+            login_request.username,
+            login_request.password
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error during login: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Could not process login response.",
+            detail="An unexpected error occurred during login.",
         )
+
+    return {
+        "accessToken": access_token,
+        "tokenType": "bearer",
+        "user": {
+            "id": str(user_db.id),
+            "username": user_db.username,
+            "email": user_db.email,
+            "fullName": user_db.full_name,
+            "isActive": user_db.is_active,
+            "role": user_db.role,
+        },
+    }
+
+@app.post("/customers/import")
+async def import_customers(request: Request, format: str = "csv", chunk_size: int = customer_import_service.DEFAULT_CHUNK_SIZE, current_user=Depends(require_staff)):
+    """
+    Bulk customer import. The request body is the raw CSV or NDJSON file
+    (?format=csv|ndjson) and is parsed as it arrives. The response streams NDJSON
+    events: per-row errors, progress after every chunk and a final summary with
+    rows/sec (see customer_import_service).
+    """
+    if format not in customer_import_service.IMPORT_FORMATS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"format must be one of: {', '.join(customer_import_service.IMPORT_FORMATS)}")
+    customer_crud = CustomerCRUD(get_customers_collection())
+
+    async def events():
+        async for event in customer_import_service.import_customers(request.stream(), format, customer_crud, chunk_size=max(1, chunk_size)):
+            yield json.dumps(event, default=str) + "\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+@app.post("/loan-transactions/import")
+async def import_loan_transactions(request: Request, format: str = "csv", chunk_size: int = loan_transaction_import_service.DEFAULT_CHUNK_SIZE, current_user=Depends(require_staff)):
+    """
+    Bulk loan transaction import from a bank or collection file. The request body is
+    the raw CSV or fixed-width file (?format=csv|fixed, fixed-width using the default
+    layout) and is parsed as it arrives. The response streams NDJSON events like
+    /customers/import (see loan_transaction_import_service).
+    """
+    if format not in loan_transaction_import_service.IMPORT_FORMATS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"format must be one of: {', '.join(loan_transaction_import_service.IMPORT_FORMATS)}")
+    loan_transaction_crud = LoanTransactionCRUD(get_loan_transactions_collection())
+
+    async def events():
+        async for event in loan_transaction_import_service.import_loan_transactions(request.stream(), format, loan_transaction_crud, chunk_size=max(1, chunk_size)):
+            yield json.dumps(event, default=str) + "\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+def _export_response(chunks, name: str, format: str) -> StreamingResponse:
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(chunks, media_type=media_type, headers={"Content-Disposition": f'attachment; filename="{name}.{format}"'})
+
+@app.get("/loan-transactions/export")
+async def export_loan_transactions(format: str = "csv", from_date: Optional[datetime] = None, to_date: Optional[datetime] = None,
+                                   loan_id: Optional[str] = None, branch: Optional[str] = None, current_user=Depends(require_staff)):
+    """
+    Stream loan transactions as CSV or NDJSON (?format=csv|ndjson), oldest first,
+    filtered by [from_date, to_date), loan and loan branch (see export_service).
+    """
+    if format not in export_service.EXPORT_FORMATS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"format must be one of: {', '.join(export_service.EXPORT_FORMATS)}")
+    chunks = export_service.export_loan_transactions(format, from_date, to_date, loan_id, branch)
+    return _export_response(chunks, "loan_transactions", format)
+
+@app.get("/ledger-entries/export")
+async def export_ledger_entries(format: str = "csv", from_date: Optional[datetime] = None, to_date: Optional[datetime] = None,
+                                loan_id: Optional[str] = None, branch: Optional[str] = None, current_user=Depends(require_staff)):
+    """
+    Stream ledger entries as CSV or NDJSON (?format=csv|ndjson), oldest first,
+    filtered by [from_date, to_date), loan and loan branch (see export_service).
+    """
+    if format not in export_service.EXPORT_FORMATS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"format must be one of: {', '.join(export_service.EXPORT_FORMATS)}")
+    chunks = export_service.export_ledger_entries(format, from_date, to_date, loan_id, branch)
+    return _export_response(chunks, "ledger_entries", format)
@@ -1,13 +1,12 @@
 import strawberry
 from typing import List, Optional
 from strawberry.types import Info
-from .database import get_db
+from .database import get_savings_collection
 from .database.savings_crud import SavingsCRUD
 from .basemodel.savings_model import RegularSavings, HighYieldSavings, TimeDeposit, SavingsAccountBase
 from .models import UserInDB
 #from .schema import SavingsAccountType, SavingsAccountCreateInput, SavingsAccountResponse, SavingsAccountsResponse
 from .customer import CustomerType, convert_customer_db_to_customer_type
-from .database.customer_crud import CustomerCRUD
 from decimal import Decimal
 from datetime import datetime, timedelta
 
@@ -30,10 +29,7 @@ class SavingsAccountType:
 
     @strawberry.field
     async def customer(self, info: Info) -> Optional[CustomerType]:
-        db = get_db()
-        customer_crud = CustomerCRUD(db.customers)
-        
-        customer_data = await customer_crud.get_customer_by_id(str(self.user_id))
+        customer_data = await info.context["customer_loader"].load(str(self.user_id))
         
         if customer_data:
             return convert_customer_db_to_customer_type(customer_data)
@@ -105,7 +101,7 @@ def map_db_account_to_strawberry_type(account_data: SavingsAccountBase) -> Savin
         account_number=account_data.account_number,
         user_id=strawberry.ID(str(account_data.user_id)),
         type=account_data.type,
-        balance=account_data.balance,
+        balance=float(account_data.balance),
         currency=account_data.currency,
         opened_at=account_data.opened_at,
         status=account_data.status,
@@ -133,8 +129,7 @@ class SavingsQuery:
         if not current_user:
             return SavingsAccountResponse(success=False, message="Not authenticated")
 
-        db = get_db()
-        savings_crud = SavingsCRUD(db.savings)
+        savings_crud = SavingsCRUD(get_savings_collection())
         account_data = await savings_crud.get_savings_account_by_id(str(account_id))
 
         if not account_data:
@@ -153,8 +148,7 @@ class SavingsQuery:
         if not current_user:
             return SavingsAccountsResponse(success=False, message="Not authenticated", accounts=[], total=0)
 
-        db = get_db()
-        savings_crud = SavingsCRUD(db.savings)
+        savings_crud = SavingsCRUD(get_savings_collection())
         accounts_data = await savings_crud.get_all_savings_accounts(search_term=searchTerm) # Pass search_term to CRUD
         
         accounts = [map_db_account_to_strawberry_type(acc) for acc in accounts_data]
@@ -168,14 +162,13 @@ class SavingsMutation:
         if not current_user:
             return SavingsAccountResponse(success=False, message="Not authenticated")
 
-        db = get_db()
-        savings_crud = SavingsCRUD(db.savings)
+        savings_crud = SavingsCRUD(get_savings_collection())
 
         # Logic to create the correct type of account based on input
         account_data = {
             "account_number": input.account_number,
             "user_id": str(input.customer_id),
-            "balance": input.balance,
+            "balance": Decimal(str(input.balance)),
             "opened_at": input.opened_at,
             "currency": input.currency,
             "status": input.status,
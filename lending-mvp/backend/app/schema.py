@@ -9,8 +9,13 @@ from strawberry.types import Info
 # from .customer import CustomerType, convert_customer_db_to_customer_type
 from .models import CustomerInDB # Needed for convert_customer_db_to_customer_type, if it's moved here or passed around
 
-from .services import accounting_service, loan_service
+from .services import loan_service
 from .models import Customer, CustomerCreate, CustomerUpdate
+from .database.pagination import TotalMode
+
+# exact: counted with the page in one $facet; estimated: collection metadata when
+# unfiltered, capped count otherwise; none: total is null
+strawberry.enum(TotalMode, description="How list queries compute their total")
 
 
 # --- Strawberry Types (mirroring Pydantic models) ---
@@ -66,7 +71,23 @@ class UsersResponse:
     success: bool
     message: str
     users: List[UserType]
-    total: int
+    total: Optional[int]
+
+# Keyset (cursor) pagination
+@strawberry.type
+class PageInfo:
+    has_next_page: bool
+    end_cursor: Optional[str] = None
+
+@strawberry.type
+class UserEdge:
+    cursor: str
+    node: UserType
+
+@strawberry.type
+class UserConnection:
+    edges: List[UserEdge]
+    page_info: PageInfo
 
 # # Savings Types
 # @strawberry.type
@@ -159,15 +180,6 @@ class LoanType:
     amount_requested: Decimal
     status: str
 
-# Ledger Entry Types
-@strawberry.type
-class LedgerEntryType:
-    transaction_id: str
-    account: str
-    amount: float
-    entry_type: str
-    timestamp: str
-
 # --- GraphQL Queries ---
 
 @strawberry.type
@@ -178,19 +190,7 @@ class Query:
         # In a real app, you'd call a service function
         return LoanType(borrower_id="some_user", amount_requested=Decimal("1000"), status="pending")
 
-    @strawberry.field
-    async def get_borrower_ledger(self, borrower_id: str) -> List[LedgerEntryType]:
-        # This is where GraphQL shines: complex, nested queries
-        entries = await accounting_service.get_ledger_for_borrower(borrower_id)
-        return [
-            LedgerEntryType(
-                transaction_id=e["transaction_id"],
-                account=e["account"],
-                amount=e["amount"],
-                entry_type=e["entry_type"],
-                timestamp=str(e["timestamp"])
-            ) for e in entries
-        ]
+    # getBorrowerLedger lives in ledger.py (LedgerQuery)
 
     # These fields are typically defined in their respective modules and then composed in main.py
     # @strawberry.field
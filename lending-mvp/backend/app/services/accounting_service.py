@@ -1,52 +1,288 @@
 from datetime import datetime
 from decimal import Decimal
 import uuid
-from typing import List
-from ..database import client, ledger_collection
+from typing import Any, Dict, List, Optional, Set, Tuple
+from pymongo import DESCENDING, UpdateMany
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from ..database import client, ledger_collection, loans_collection, account_balances_collection, account_balance_snapshots_collection
+from ..database.account_balance_crud import AccountBalanceCRUD
+from ..database.pagination import find_page
+from ..database.portfolio_rollup_crud import loan_lookup
 
-async def post_transaction(debit_account: str, credit_account: str, amount: Decimal, tx_id: str = None):
+# Ledger entries posted by loan_service.disburse_loan carry this transaction id prefix
+DISBURSEMENT_PREFIX = "disbursement-"
+
+account_balance_crud = AccountBalanceCRUD(account_balances_collection, account_balance_snapshots_collection)
+
+async def post_transaction(
+    debit_account: str,
+    credit_account: str,
+    amount: Decimal,
+    tx_id: str = None,
+    loan_id: Optional[str] = None,
+    borrower_id: Optional[str] = None
+):
     """
-    Posts a balanced debit/credit transaction atomically.
+    Posts a balanced debit/credit transaction atomically, together with the update
+    of both accounts' running balances.
+    loan_id / borrower_id link both entries to the loan and borrower they belong to.
+    A transaction id that was already posted is not posted again.
     """
     if amount <= 0:
         raise ValueError("Transaction amount must be positive.")
 
     transaction_id = tx_id or str(uuid.uuid4())
+    try:
+        result = await post_transactions_batch([
+            journal_entry(debit_account, credit_account, amount, transaction_id, loan_id=loan_id, borrower_id=borrower_id)
+        ])
+        if result["duplicates"]:
+            print(f"Transaction {transaction_id} was already posted.")
+        else:
+            print(f"Transaction {transaction_id} posted successfully.")
+        return True
+    except Exception as e:
+        print(f"Transaction failed: {e}")
+        # The transaction will be automatically aborted if an exception occurs
+        return False
 
-    debit_entry = {
-        "transaction_id": transaction_id,
-        "account": debit_account,
-        "amount": float(amount),
-        "entry_type": "debit",
-        "timestamp": datetime.utcnow()
+def journal_entry(
+    debit_account: str,
+    credit_account: str,
+    amount: Decimal,
+    tx_id: Optional[str] = None,
+    loan_id: Optional[str] = None,
+    borrower_id: Optional[str] = None
+) -> Dict[str, Any]:
+    """A two-line journal entry in the form post_transactions_batch accepts."""
+    return {
+        "transaction_id": tx_id or str(uuid.uuid4()),
+        "lines": [
+            {"account": debit_account, "entry_type": "debit", "amount": amount},
+            {"account": credit_account, "entry_type": "credit", "amount": amount},
+        ],
+        "loan_id": loan_id,
+        "borrower_id": borrower_id
     }
-    credit_entry = {
-        "transaction_id": transaction_id,
-        "account": credit_account,
-        "amount": float(amount),
-        "entry_type": "credit",
-        "timestamp": datetime.utcnow()
+
+def _ledger_documents(entry: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Validate one journal entry and turn its lines into ledger_entries documents."""
+    transaction_id = entry.get("transaction_id")
+    lines = entry.get("lines") or []
+    if not transaction_id:
+        raise ValueError("Every journal entry needs a transaction_id.")
+    if len(lines) < 2:
+        raise ValueError(f"Journal entry {transaction_id} needs at least one debit and one credit line.")
+
+    totals = {"debit": Decimal("0"), "credit": Decimal("0")}
+    for line in lines:
+        amount = Decimal(str(line["amount"]))
+        if line.get("entry_type") not in totals:
+            raise ValueError(f"Journal entry {transaction_id} has a line that is neither a debit nor a credit.")
+        if amount <= 0:
+            raise ValueError(f"Journal entry {transaction_id} has a non-positive amount.")
+        totals[line["entry_type"]] += amount
+    if totals["debit"] != totals["credit"]:
+        raise ValueError(f"Journal entry {transaction_id} does not balance: debits {totals['debit']} != credits {totals['credit']}.")
+
+    links = {}
+    if entry.get("loan_id") is not None:
+        links["loan_id"] = str(entry["loan_id"])
+    if entry.get("borrower_id") is not None:
+        links["borrower_id"] = str(entry["borrower_id"])
+    timestamp = datetime.utcnow()
+    return [
+        {
+            "transaction_id": transaction_id,
+            "line_no": line_no,
+            "account": line["account"],
+            "amount": float(line["amount"]),
+            "entry_type": line["entry_type"],
+            "timestamp": timestamp,
+            **links
+        }
+        for line_no, line in enumerate(lines)
+    ]
+
+def _documents_by_entry(entries: List[Dict[str, Any]]) -> Tuple[List[Tuple[str, List[Dict[str, Any]]]], int]:
+    """Validate every entry and turn it into ledger documents; entries repeating an earlier transaction id are dropped and counted."""
+    documents_by_entry: List[Tuple[str, List[Dict[str, Any]]]] = []
+    seen = set()
+    duplicates = 0
+    for entry in entries:
+        documents = _ledger_documents(entry)
+        if entry["transaction_id"] in seen:
+            duplicates += 1
+            continue
+        seen.add(entry["transaction_id"])
+        documents_by_entry.append((entry["transaction_id"], documents))
+    return documents_by_entry, duplicates
+
+async def _post_chunk(chunk: List[Tuple[str, List[Dict[str, Any]]]], session) -> Tuple[int, int]:
+    """Write the entries whose transaction ids are not in the ledger yet, with their account balance update. Returns (posted, duplicates)."""
+    existing = {
+        doc["transaction_id"]
+        async for doc in ledger_collection.find(
+            {"transaction_id": {"$in": [transaction_id for transaction_id, _ in chunk]}},
+            {"transaction_id": 1}, session=session
+        )
     }
+    new_documents = [doc for transaction_id, docs in chunk if transaction_id not in existing for doc in docs]
+    if new_documents:
+        await ledger_collection.insert_many(new_documents, session=session)
+        await account_balance_crud.apply_entries(new_documents, session=session)
+    return len(chunk) - len(existing), len(existing)
 
+async def post_transactions_batch(entries: List[Dict[str, Any]], chunk_size: int = 1000) -> Dict[str, int]:
+    """
+    Post many journal entries ({"transaction_id", "lines": [{"account", "entry_type",
+    "amount"}], "loan_id", "borrower_id"}; see journal_entry). Every entry is
+    validated to balance before anything is written. Entries are then written
+    chunk_size at a time, each chunk with one insert_many and one account balance
+    update inside a single transaction. Transaction ids that are already in the
+    ledger (or repeated within the batch) are skipped, and the unique
+    (transaction_id, line_no) index stops concurrent retries from posting twice, so
+    re-running a batch is safe. Returns {"posted": n, "duplicates": n}.
+    """
+    documents_by_entry, duplicates = _documents_by_entry(entries)
+
+    posted = 0
     async with await client.start_session() as session:
-        try:
-            async def commit_transaction(s):
-                await ledger_collection.insert_many(
-                    [debit_entry, credit_entry],
-                    session=s
-                )
-            await session.with_transaction(commit_transaction)
-            print(f"Transaction {transaction_id} posted successfully.")
-            return True
-        except Exception as e:
-            print(f"Transaction failed: {e}")
-            # The transaction will be automatically aborted if an exception occurs
-            return False
+        for start in range(0, len(documents_by_entry), max(1, chunk_size)):
+            chunk = documents_by_entry[start:start + max(1, chunk_size)]
+
+            async def write_chunk(s):
+                return await _post_chunk(chunk, s)
+
+            for attempt in range(3):
+                try:
+                    chunk_posted, chunk_duplicates = await session.with_transaction(write_chunk)
+                    break
+                except (DuplicateKeyError, BulkWriteError):
+                    # Another poster committed some of these ids first; re-read and skip them
+                    if attempt == 2:
+                        raise
+            posted += chunk_posted
+            duplicates += chunk_duplicates
+    return {"posted": posted, "duplicates": duplicates}
+
+async def post_transactions_in_session(entries: List[Dict[str, Any]], session) -> Dict[str, int]:
+    """
+    Post journal entries inside the caller's transaction, so they commit or abort
+    together with the balance changes they record. Same rules as
+    post_transactions_batch: entries are validated first and transaction ids already
+    in the ledger are skipped. Returns {"posted": n, "duplicates": n}.
+    """
+    documents_by_entry, duplicates = _documents_by_entry(entries)
+    posted = 0
+    if documents_by_entry:
+        posted, existing = await _post_chunk(documents_by_entry, session)
+        duplicates += existing
+    return {"posted": posted, "duplicates": duplicates}
 
-async def get_ledger_for_borrower(borrower_id: str) -> List[dict]:
+async def trial_balance(as_of: Optional[datetime] = None) -> List[Dict[str, Any]]:
     """
-    Placeholder to get ledger entries.
-    A real implementation would link entries to a borrower.
+    Debit/credit totals and balance of every account, from the running balances
+    (now) or from the latest snapshot plus the entries since (as_of, exclusive).
+    """
+    if as_of is None:
+        return [{"account": doc["_id"], **doc} for doc in await account_balance_crud.get_balances()]
+    balances = await account_balance_crud.balances_as_of(as_of)
+    return [{"account": account, **balances[account]} for account in sorted(balances)]
+
+async def get_account_balance(account: str, as_of: Optional[datetime] = None) -> Dict[str, Any]:
+    if as_of is None:
+        balance = await account_balance_crud.get_balance(account) or {}
+    else:
+        balance = (await account_balance_crud.balances_as_of(as_of, account)).get(account, {})
+    return {
+        "account": account,
+        "debit_total": balance.get("debit_total", Decimal("0")),
+        "credit_total": balance.get("credit_total", Decimal("0")),
+        "balance": balance.get("balance", Decimal("0")),
+        "entry_count": balance.get("entry_count", 0)
+    }
+
+async def snapshot_account_balances(as_of: datetime) -> int:
+    return await account_balance_crud.create_snapshot(as_of)
+
+async def verify_account_balances(repair: bool = False) -> List[Dict[str, Any]]:
+    return await account_balance_crud.verify(repair=repair)
+
+async def get_ledger_for_borrower(
+    borrower_id: str,
+    first: int = 50,
+    after: Optional[str] = None,
+    from_date: Optional[datetime] = None,
+    to_date: Optional[datetime] = None,
+    loan_id: Optional[str] = None
+) -> Tuple[List[Tuple[str, Dict[str, Any]]], bool]:
     """
-    # For MVP, just return all entries, newest first.
-    return await ledger_collection.find().sort("timestamp", -1).to_list(100)
\ No newline at end of file
+    Keyset page of a borrower's ledger entries, newest first, optionally limited to
+    [from_date, to_date) and to one loan. Served by the
+    borrower_id_1_timestamp_-1__id_-1 index, so the cost of a page does not depend
+    on the size of the ledger.
+    """
+    query: Dict[str, Any] = {"borrower_id": str(borrower_id)}
+    if loan_id:
+        query["loan_id"] = str(loan_id)
+    if from_date or to_date:
+        query["timestamp"] = {}
+        if from_date:
+            query["timestamp"]["$gte"] = from_date
+        if to_date:
+            query["timestamp"]["$lt"] = to_date
+    return await find_page(ledger_collection, query, "timestamp", DESCENDING, first, after)
+
+async def backfill_ledger_links(batch_size: int = 1000) -> int:
+    """
+    Set loan_id / borrower_id on disbursement entries posted before they were
+    recorded, resolving the loan from the "disbursement-<loan_id>" transaction id.
+    Streams the unlinked entries, looks loans up in batches and updates both entries
+    of a transaction together. Returns the number of entries linked.
+    """
+    linked = 0
+    # pending keeps the batch in cursor order, pending_ids is its membership test
+    pending: List[str] = []
+    pending_ids: Set[str] = set()
+
+    async def link(transaction_ids: List[str]) -> int:
+        loan_ids = [transaction_id[len(DISBURSEMENT_PREFIX):] for transaction_id in transaction_ids]
+        loans: Dict[str, Dict[str, Any]] = {}
+        lookups = [loan_lookup(loan_id)["$or"] for loan_id in loan_ids]
+        async for loan in loans_collection.find(
+            {"$or": [condition for conditions in lookups for condition in conditions]},
+            {"loanId": 1, "loan_id": 1, "borrower_id": 1}
+        ):
+            for key in (loan["_id"], loan.get("loanId"), loan.get("loan_id")):
+                if key is not None:
+                    loans[str(key)] = loan
+
+        operations = [
+            UpdateMany(
+                {"transaction_id": DISBURSEMENT_PREFIX + loan_id, "loan_id": {"$exists": False}},
+                {"$set": {"loan_id": str(loans[loan_id]["_id"]), "borrower_id": str(loans[loan_id]["borrower_id"])}}
+            )
+            for loan_id in loan_ids if loan_id in loans
+        ]
+        if not operations:
+            return 0
+        result = await ledger_collection.bulk_write(operations, ordered=False)
+        return result.modified_count
+
+    cursor = ledger_collection.find(
+        {"transaction_id": {"$regex": f"^{DISBURSEMENT_PREFIX}"}, "loan_id": {"$exists": False}},
+        {"transaction_id": 1}
+    ).batch_size(batch_size)
+    async for entry in cursor:
+        if entry["transaction_id"] in pending_ids:
+            continue
+        pending.append(entry["transaction_id"])
+        pending_ids.add(entry["transaction_id"])
+        if len(pending) >= batch_size:
+            linked += await link(pending)
+            pending = []
+            pending_ids = set()
+    if pending:
+        linked += await link(pending)
+    return linked
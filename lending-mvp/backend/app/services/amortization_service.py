@@ -0,0 +1,177 @@
+"""
+Amortization schedules for loans, vectorized with NumPy.
+
+All money is handled as integer centavos (int64) and interest rates as integer
+units of RATE_SCALE, so every per-period amount is exact:
+
+- monthly interest = ROUND_HALF_UP(balance * annual_rate / 12 / 100) to the centavo
+- equal_installment: the level payment is the annuity formula rounded half-up to
+  the centavo; principal = payment - interest
+- straight_line: level principal = ROUND_HALF_UP(amount / term)
+- interest_only: interest every period, the whole principal as a balloon at the end
+
+In every method the last period repays whatever principal is left, so each
+schedule ends at exactly zero. Many loans are computed together: the loop runs
+over months and each step is one array operation across the whole portfolio.
+"""
+import calendar
+from datetime import date, datetime
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Dict, List, NamedTuple, Optional, Sequence, Union
+
+import numpy as np
+
+METHODS = ("equal_installment", "straight_line", "interest_only")
+
+# Annual rates are percentages with up to 4 decimal places (e.g. 12.5 -> 125000)
+RATE_SCALE = 10_000
+# balance_cents * rate_units / RATE_DENOMINATOR = monthly interest in centavos
+RATE_DENOMINATOR = 12 * 100 * RATE_SCALE
+
+
+class ScheduleArrays(NamedTuple):
+    """Per-loan, per-month amounts in centavos; shape (loans, longest term). Months past a loan's term are zero."""
+    payment: np.ndarray
+    principal: np.ndarray
+    interest: np.ndarray
+    balance: np.ndarray
+    terms: np.ndarray
+
+
+def to_centavos(amount: Union[Decimal, float, int, str]) -> int:
+    return int((Decimal(str(amount)) * 100).quantize(Decimal("1"), rounding=ROUND_HALF_UP))
+
+
+def to_rate_units(annual_rate_pct: Union[Decimal, float, int, str]) -> int:
+    return int((Decimal(str(annual_rate_pct)) * RATE_SCALE).quantize(Decimal("1"), rounding=ROUND_HALF_UP))
+
+
+def _round_half_up_div(numerator: np.ndarray, denominator) -> np.ndarray:
+    """Integer ROUND_HALF_UP(numerator / denominator) for non-negative numerators."""
+    return (2 * numerator + denominator) // (2 * denominator)
+
+
+def _level_installments(principal: np.ndarray, rate_units: np.ndarray, terms: np.ndarray) -> np.ndarray:
+    monthly_rate = rate_units / RATE_DENOMINATOR
+    with np.errstate(divide="ignore", invalid="ignore"):
+        annuity = principal * monthly_rate / (1 - (1 + monthly_rate) ** -terms.astype(np.float64))
+    installment = np.where(monthly_rate > 0, np.floor(annuity + 0.5), 0).astype(np.int64)
+    # A zero rate is straight division of the principal
+    return np.where(monthly_rate > 0, installment, _round_half_up_div(principal, np.maximum(terms, 1)))
+
+
+def amortization_schedules(
+    principal_cents: Sequence[int],
+    rate_units: Sequence[int],
+    terms: Sequence[int],
+    method: str = "equal_installment",
+) -> ScheduleArrays:
+    """
+    Schedules for a whole portfolio in one call. Inputs are parallel sequences of
+    principal in centavos, annual rate in RATE_SCALE units and term in months
+    (see to_centavos / to_rate_units). Balances up to about 10^10 pesos at rates up
+    to 100% stay within int64.
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown amortization method '{method}'. Expected one of: {', '.join(METHODS)}")
+
+    principal = np.asarray(principal_cents, dtype=np.int64)
+    rates = np.asarray(rate_units, dtype=np.int64)
+    terms = np.asarray(terms, dtype=np.int64)
+    if np.any(principal < 0) or np.any(rates < 0) or np.any(terms < 1):
+        raise ValueError("Principal and rate must be non-negative and the term at least one month")
+
+    loans = principal.shape[0]
+    months = int(terms.max()) if loans else 0
+    payment = np.zeros((loans, months), dtype=np.int64)
+    principal_paid = np.zeros((loans, months), dtype=np.int64)
+    interest = np.zeros((loans, months), dtype=np.int64)
+    balances = np.zeros((loans, months), dtype=np.int64)
+
+    if method == "equal_installment":
+        installment = _level_installments(principal, rates, terms)
+    elif method == "straight_line":
+        level_principal = _round_half_up_div(principal, terms)
+
+    balance = principal.copy()
+    for month in range(months):
+        active = month < terms
+        period_interest = np.where(active, _round_half_up_div(balance * rates, RATE_DENOMINATOR), 0)
+
+        if method == "equal_installment":
+            period_principal = installment - period_interest
+        elif method == "straight_line":
+            period_principal = level_principal
+        else:
+            period_principal = np.zeros(loans, dtype=np.int64)
+
+        period_principal = np.where(month == terms - 1, balance, np.clip(period_principal, 0, balance))
+        period_principal = np.where(active, period_principal, 0)
+        balance = balance - period_principal
+
+        interest[:, month] = period_interest
+        principal_paid[:, month] = period_principal
+        payment[:, month] = period_interest + period_principal
+        balances[:, month] = balance
+
+    return ScheduleArrays(payment=payment, principal=principal_paid, interest=interest, balance=balances, terms=terms)
+
+
+def add_months(start: date, months: int) -> date:
+    month_index = start.month - 1 + months
+    year, month = start.year + month_index // 12, month_index % 12 + 1
+    # Clamp to the last day of shorter months (e.g. Jan 31 -> Feb 28)
+    return date(year, month, min(start.day, calendar.monthrange(year, month)[1]))
+
+
+def paid_installments(schedules: ScheduleArrays, repaid_cents: Sequence[int]) -> np.ndarray:
+    """
+    Installments of each loan fully covered by what it has repaid, applying
+    repayments to installments in due order; at most the loan's term.
+    """
+    repaid = np.asarray(repaid_cents, dtype=np.int64)
+    covered = (np.cumsum(schedules.payment, axis=1) <= repaid[:, None]).sum(axis=1)
+    return np.minimum(covered, schedules.terms)
+
+
+def _pesos(centavos) -> Decimal:
+    return Decimal(int(centavos)).scaleb(-2)
+
+
+def schedule_rows(schedules: ScheduleArrays, index: int, start_date: Optional[Union[date, datetime]] = None) -> List[Dict]:
+    """One loan's schedule from a batch result, as rows of Decimal pesos with due dates."""
+    if isinstance(start_date, datetime):
+        start_date = start_date.date()
+    rows = []
+    for month in range(int(schedules.terms[index])):
+        rows.append({
+            "period": month + 1,
+            "due_date": add_months(start_date, month + 1) if start_date else None,
+            "payment": _pesos(schedules.payment[index, month]),
+            "principal": _pesos(schedules.principal[index, month]),
+            "interest": _pesos(schedules.interest[index, month]),
+            "balance": _pesos(schedules.balance[index, month]),
+        })
+    return rows
+
+
+def amortization_schedule(
+    amount: Union[Decimal, float, int, str],
+    annual_rate_pct: Union[Decimal, float, int, str],
+    term_months: int,
+    method: str = "equal_installment",
+    start_date: Optional[Union[date, datetime]] = None,
+) -> List[Dict]:
+    """Schedule for a single loan; due dates fall monthly after start_date."""
+    schedules = amortization_schedules([to_centavos(amount)], [to_rate_units(annual_rate_pct)], [term_months], method)
+    return schedule_rows(schedules, 0, start_date)
+
+
+def portfolio_schedules(loans: Sequence, method: str = "equal_installment") -> ScheduleArrays:
+    """Batch schedules for Loan models (amount_requested, interest_rate, term_months), in input order."""
+    return amortization_schedules(
+        [to_centavos(loan.amount_requested) for loan in loans],
+        [to_rate_units(loan.interest_rate) for loan in loans],
+        [loan.term_months for loan in loans],
+        method,
+    )
@@ -0,0 +1,45 @@
+from typing import Tuple
+from fastapi import HTTPException, status
+
+from ..auth.security import verify_password_async, create_access_token
+from ..database import get_users_collection
+from ..database.crud import UserCRUD
+from ..models import UserInDB
+
+async def authenticate_user(username: str, password: str) -> Tuple[str, UserInDB]:
+    """
+    Checks the credentials (username or email) and issues an access token.
+    Shared by the GraphQL login mutation and the /api-login/ REST endpoint.
+    Raises HTTPException 401 for bad credentials and 400 for inactive users.
+    """
+    print(f"--- Login attempt for username: {username} ---")
+    user_crud = UserCRUD(get_users_collection())
+
+    user_db = await user_crud.get_user_by_login(username)
+    print(f"User found in DB: {'Yes' if user_db else 'No'}")
+
+    if user_db:
+        password_ok = await verify_password_async(password, user_db.hashed_password)
+        print(f"Password verification result: {password_ok}")
+        if not password_ok:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Incorrect username or password"
+            )
+    else:
+        # Still raise the same error to avoid user enumeration
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Incorrect username or password"
+        )
+
+    if not user_db.is_active:
+        print("User is inactive.")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Inactive user"
+        )
+
+    print("--- Login successful ---")
+    access_token = create_access_token(data={"sub": str(user_db.id)})
+    return access_token, user_db
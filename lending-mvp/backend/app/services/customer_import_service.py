@@ -0,0 +1,31 @@
+"""
+Streaming bulk import of customers from CSV (header row with CustomerCreate field
+names) or NDJSON (one customer object per line).
+
+Rows are parsed one at a time, validated with CustomerCreate and written in chunks
+through CustomerCRUD.insert_customers, which skips duplicates on display_name and
+email_address. Only the current chunk is held in memory; per-row errors, progress
+and the final summary are reported as a stream of events (see ingest_rows).
+"""
+from typing import Any, AsyncIterator, Dict
+
+from ..database.customer_crud import CustomerCRUD
+from ..models import CustomerCreate
+from ..utils.streaming import ingest_rows, iter_csv_rows, iter_ndjson_rows
+
+IMPORT_FORMATS = {"csv": iter_csv_rows, "ndjson": iter_ndjson_rows}
+DEFAULT_CHUNK_SIZE = 1000
+
+
+async def import_customers(
+    chunks: AsyncIterator[bytes],
+    file_format: str,
+    customer_crud: CustomerCRUD,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> AsyncIterator[Dict[str, Any]]:
+    """Import a customer file, yielding error, progress (one per chunk) and summary events."""
+    if file_format not in IMPORT_FORMATS:
+        raise ValueError(f"Unknown import format '{file_format}'. Expected one of: {', '.join(IMPORT_FORMATS)}")
+
+    async for event in ingest_rows(IMPORT_FORMATS[file_format](chunks), CustomerCreate.model_validate, customer_crud.insert_customers, chunk_size):
+        yield event
@@ -0,0 +1,68 @@
+"""
+Nightly loan delinquency aging.
+
+Each active loan carries its days past due, next due date and aging bucket
+(current, 1-30, 31-60, 61-90, 90+), kept current by repayments (see
+LoanCRUD.refresh_delinquency) and stamped with delinquency_review_date: the day
+its bucket changes if nothing is repaid. The nightly pass only reads loans whose
+review date has come, through a partial index, so its cost follows the loans that
+just fell due or crossed a bucket boundary rather than the size of the book.
+
+The aging buckets are a portfolio rollup dimension, so PAR30 and PAR90 are read
+from the shards of five rollup buckets (PortfolioRollupCRUD.get_portfolio_at_risk).
+"""
+from datetime import date, datetime, time, timedelta
+from typing import Any, Dict, Optional
+
+from ..config import settings
+from ..database import client, loans_collection, job_runs_collection
+from ..database.job_run_crud import JobRunCRUD
+from ..database.loan_crud import LoanCRUD
+
+DELINQUENCY_JOB = "loan-delinquency"
+
+
+async def refresh_delinquency(as_of: date, batch_size: Optional[int] = None, rebuild: bool = False) -> Dict[str, Any]:
+    """
+    Age every loan whose review date is on or before as_of, in batches of one
+    transaction each. With rebuild, every active loan is recomputed instead (e.g.
+    to backfill loans activated before delinquency was tracked). The date is the
+    run's idempotency key (see JobRunCRUD). Returns the run's totals, or
+    {"status": "skipped"} when the date was already run.
+    """
+    job_runs = JobRunCRUD(job_runs_collection)
+    key = f"{as_of.isoformat()}:rebuild" if rebuild else as_of.isoformat()
+    if not await job_runs.claim(DELINQUENCY_JOB, key, timedelta(minutes=settings.JOB_RUN_STALE_MINUTES)):
+        run = await job_runs.get(DELINQUENCY_JOB, key) or {}
+        return {"status": "skipped", "as_of": key, "run_status": run.get("status")}
+
+    loan_crud = LoanCRUD(loans_collection)
+    review_before = datetime.combine(as_of, time())
+    batch_size = max(1, batch_size or settings.DELINQUENCY_BATCH_SIZE)
+    totals = {"loans": 0, "moved": 0}
+    try:
+        after = None
+        async with await client.start_session() as session:
+            while True:
+                # Reviewed loans get a later review date (or none), so the review query drains
+                if rebuild:
+                    loans = await loan_crud.active_loans_batch(after, batch_size)
+                else:
+                    loans = await loan_crud.delinquency_due(review_before, batch_size)
+                if not loans:
+                    break
+                after = loans[-1].id
+
+                async def write(s):
+                    return await loan_crud.refresh_delinquency(loans, as_of, session=s)
+
+                totals["moved"] += await session.with_transaction(write)
+                totals["loans"] += len(loans)
+                await job_runs.heartbeat(DELINQUENCY_JOB, key, totals)
+    except Exception as e:
+        await job_runs.fail(DELINQUENCY_JOB, key, str(e))
+        raise
+
+    result = {"status": "completed", "as_of": key, "loans": totals["loans"], "moved": totals["moved"]}
+    await job_runs.complete(DELINQUENCY_JOB, key, result)
+    return result
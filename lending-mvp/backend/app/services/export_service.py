@@ -0,0 +1,168 @@
+"""
+Streaming CSV/NDJSON exports of loan_transactions and ledger_entries.
+
+Documents are read from a Motor cursor with batch_size settings.EXPORT_BATCH_SIZE,
+projected to the exported columns and formatted straight into text chunks of one
+batch each, without building models. Memory depends on the batch size, not on the
+number of rows exported, so the chunks can be handed to a StreamingResponse as-is.
+
+A branch filter is applied one batch of the branch's loans at a time (see
+loan_key_batches), so it never builds a $in list of every loan in the branch; rows
+are then oldest first within each batch of loans.
+"""
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+from bson import Decimal128, ObjectId
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import ASCENDING
+
+from ..config import settings
+from ..database import ledger_collection, loan_transactions_collection, loans_collection
+from ..database.portfolio_rollup_crud import loan_lookup
+
+EXPORT_FORMATS = ("csv", "ndjson")
+
+# Stored field names; loan_transactions use the model's camelCase aliases
+LOAN_TRANSACTION_COLUMNS = (
+    "_id", "loanId", "transactionType", "amount", "transactionDate", "referenceNumber", "chequeNumber",
+    "commercialBank", "servicingBranch", "region", "borrowerName", "loanProduct", "notes", "createdAt",
+)
+LEDGER_ENTRY_COLUMNS = (
+    "_id", "transaction_id", "line_no", "account", "entry_type", "amount", "timestamp", "loan_id", "borrower_id",
+)
+
+
+def _text(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (ObjectId, Decimal128)):
+        return str(value)
+    return value
+
+
+async def stream_rows(
+    collection: AsyncIOMotorCollection,
+    query: Dict[str, Any],
+    sort: List[Tuple[str, int]],
+    columns: Sequence[str],
+    file_format: str,
+    batch_size: Optional[int] = None,
+    header: bool = True,
+) -> AsyncIterator[str]:
+    """Yield the matching documents as CSV (with a header line unless header is False) or NDJSON, one chunk per cursor batch."""
+    if file_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format '{file_format}'. Expected one of: {', '.join(EXPORT_FORMATS)}")
+    batch_size = max(1, batch_size or settings.EXPORT_BATCH_SIZE)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if file_format == "csv" and header:
+        writer.writerow(columns)
+
+    rows = 0
+    cursor = collection.find(query, {column: 1 for column in columns}).sort(sort).batch_size(batch_size)
+    async for doc in cursor:
+        if file_format == "csv":
+            writer.writerow([_text(doc.get(column)) for column in columns])
+        else:
+            buffer.write(json.dumps({column: _text(doc.get(column)) for column in columns}, default=str))
+            buffer.write("\n")
+        rows += 1
+        if rows % batch_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+async def loan_key_batches(
+    loan_id: Optional[str] = None,
+    branch: Optional[str] = None,
+    batch_size: Optional[int] = None,
+) -> AsyncIterator[Optional[List[str]]]:
+    """
+    The ids that transactions and ledger entries may use (_id or custom loan id) for
+    the loans selected by loan_id and/or branch, one list per batch_size loans read
+    from a single cursor. Yields None once when neither is given, and always yields
+    at least once, so a CSV export still gets its header.
+    """
+    if not loan_id and not branch:
+        yield None
+        return
+    batch_size = max(1, batch_size or settings.EXPORT_BATCH_SIZE)
+    conditions = []
+    if loan_id:
+        conditions.append(loan_lookup(loan_id))
+    if branch:
+        conditions.append({"branch": branch})
+    # An unknown loan id may still be referenced by transactions
+    keys = {loan_id} if loan_id and not branch else set()
+    loans = 0
+    yielded = False
+    async for loan in loans_collection.find({"$and": conditions}, {"loanId": 1, "loan_id": 1}).batch_size(batch_size):
+        keys.update(str(value) for value in (loan["_id"], loan.get("loanId"), loan.get("loan_id")) if value is not None)
+        loans += 1
+        if loans % batch_size == 0:
+            yield list(keys)
+            yielded = True
+            keys = set()
+    if keys or not yielded:
+        yield list(keys)
+
+
+def _date_range(from_date: Optional[datetime], to_date: Optional[datetime]) -> Dict[str, datetime]:
+    """[from_date, to_date), as in get_ledger_for_borrower."""
+    date_range = {}
+    if from_date:
+        date_range["$gte"] = from_date
+    if to_date:
+        date_range["$lt"] = to_date
+    return date_range
+
+
+async def export_loan_transactions(
+    file_format: str,
+    from_date: Optional[datetime] = None,
+    to_date: Optional[datetime] = None,
+    loan_id: Optional[str] = None,
+    branch: Optional[str] = None,
+    batch_size: Optional[int] = None,
+) -> AsyncIterator[str]:
+    """Loan transactions in [from_date, to_date), optionally of one loan and/or the loans of one branch, oldest first (per batch of loans with a branch)."""
+    query: Dict[str, Any] = {}
+    if from_date or to_date:
+        query["transactionDate"] = _date_range(from_date, to_date)
+    sort = [("transactionDate", ASCENDING), ("_id", ASCENDING)]
+    header = True
+    async for keys in loan_key_batches(loan_id, branch, batch_size):
+        if keys is not None:
+            query["loanId"] = {"$in": keys}
+        async for chunk in stream_rows(loan_transactions_collection, query, sort, LOAN_TRANSACTION_COLUMNS, file_format, batch_size, header):
+            yield chunk
+        header = False
+
+
+async def export_ledger_entries(
+    file_format: str,
+    from_date: Optional[datetime] = None,
+    to_date: Optional[datetime] = None,
+    loan_id: Optional[str] = None,
+    branch: Optional[str] = None,
+    batch_size: Optional[int] = None,
+) -> AsyncIterator[str]:
+    """Ledger entries in [from_date, to_date), optionally of one loan and/or the loans of one branch, oldest first (per batch of loans with a branch)."""
+    query: Dict[str, Any] = {}
+    if from_date or to_date:
+        query["timestamp"] = _date_range(from_date, to_date)
+    sort = [("timestamp", ASCENDING), ("_id", ASCENDING)]
+    header = True
+    async for keys in loan_key_batches(loan_id, branch, batch_size):
+        if keys is not None:
+            query["loan_id"] = {"$in": keys}
+        async for chunk in stream_rows(ledger_collection, query, sort, LEDGER_ENTRY_COLUMNS, file_format, batch_size, header):
+            yield chunk
+        header = False
@@ -0,0 +1,228 @@
+"""
+Daily interest accrual and posting for savings accounts, vectorized with NumPy.
+
+Money is handled as integers: balances in centavos, accrued interest in
+micro-pesos (so a few centavos a day at low rates are not lost to rounding) and
+annual rates in units of RATE_SCALE, as in amortization_service:
+
+- one day's interest = ROUND_HALF_UP(balance * annual_rate / 100 / 365), ACT/365
+- high-yield tiers: the whole balance earns the rate of the highest tier whose
+  min_balance it reaches (interest_rate below the lowest tier)
+- regular savings earn nothing while the balance is below min_balance
+- on a posting day (interest_paid_frequency: daily, month end or quarter end;
+  regular savings monthly) the accrued interest is added to the balance in whole
+  centavos and the fraction is carried over. Time deposits accrue until maturity
+  and are paid when they mature.
+
+A run covers one accrual date and is recorded in job_runs, so re-running a date is
+a no-op. Accounts are read in batches of columns, accrued with a handful of array
+operations per batch and written with one bulk_write per batch, in the same
+transaction as the ledger entries for the interest posted.
+"""
+import calendar
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from typing import Any, Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+from . import accounting_service
+from .amortization_service import RATE_SCALE, to_rate_units
+from ..config import settings
+from ..database import client, savings_collection, job_runs_collection
+from ..database.job_run_crud import JobRunCRUD
+from ..database.savings_crud import SavingsCRUD, REGULAR_MIN_BALANCE
+
+ACCRUAL_JOB = "savings-interest-accrual"
+INTEREST_EXPENSE_ACCOUNT = "Interest Expense"
+SAVINGS_DEPOSITS_ACCOUNT = "Savings Deposits"
+
+DAYS_PER_YEAR = 365
+MICROS_PER_CENT = 10_000
+# balance_cents * rate_units / ACCRUAL_DENOMINATOR = one day's interest in micro-pesos
+ACCRUAL_DENOMINATOR = DAYS_PER_YEAR * 100 * 100 * RATE_SCALE // 1_000_000
+# Tier breakpoints of all accounts in a batch share one sorted array keyed by
+# row * TIER_KEY_SPAN + min_balance_cents (balances above ~11 billion pesos clip)
+TIER_KEY_SPAN = 2 ** 40
+
+EPOCH = date(1970, 1, 1)
+MS_PER_DAY = 86_400_000
+
+# Model defaults for accounts that do not store their own rate or posting frequency
+DEFAULT_RATES = {"regular": Decimal("0.25"), "high_yield": Decimal("4.00")}
+POSTING_FREQUENCIES = {"regular": "monthly", "high_yield": "monthly", "time_deposit": "maturity"}
+
+
+class AccrualArrays(NamedTuple):
+    """Per-account results of one accrual date; interest in micro-pesos, postings in centavos."""
+    daily_interest: np.ndarray
+    posted_cents: np.ndarray
+    carried_micros: np.ndarray
+
+
+def is_posting_day(day: date, frequency: str) -> bool:
+    if frequency == "daily":
+        return True
+    month_end = day.day == calendar.monthrange(day.year, day.month)[1]
+    if frequency == "monthly":
+        return month_end
+    if frequency == "quarterly":
+        return month_end and day.month % 3 == 0
+    return False
+
+
+def tiered_rate_units(
+    balance_cents: np.ndarray,
+    base_rate_units: np.ndarray,
+    tier_rows: np.ndarray,
+    tier_min_cents: np.ndarray,
+    tier_rate_units: np.ndarray,
+) -> np.ndarray:
+    """
+    Rate of each account: the rate of the highest tier whose minimum its balance
+    reaches, else its base rate. Tiers of all accounts come flat (tier_rows is the
+    account each belongs to) and are found with one searchsorted over the sorted
+    (row, min_balance) breakpoints.
+    """
+    if not len(tier_rows):
+        return base_rate_units
+    keys = tier_rows * TIER_KEY_SPAN + np.clip(tier_min_cents, 0, TIER_KEY_SPAN - 1)
+    order = np.argsort(keys, kind="stable")
+    keys, tier_rows, tier_rate_units = keys[order], tier_rows[order], tier_rate_units[order]
+
+    rows = np.arange(len(balance_cents), dtype=np.int64)
+    positions = np.searchsorted(keys, rows * TIER_KEY_SPAN + np.clip(balance_cents, 0, TIER_KEY_SPAN - 1), side="right") - 1
+    positions_ok = np.maximum(positions, 0)
+    in_tier = (positions >= 0) & (tier_rows[positions_ok] == rows)
+    return np.where(in_tier, tier_rate_units[positions_ok], base_rate_units)
+
+
+def accrue(
+    balance_cents: np.ndarray,
+    rate_units: np.ndarray,
+    days: np.ndarray,
+    accrued_micros: np.ndarray,
+    posting: np.ndarray,
+) -> AccrualArrays:
+    """Accrue days of interest on every account and post the whole centavos where posting is set."""
+    balance_cents = np.maximum(balance_cents, 0)
+    daily_interest = (2 * balance_cents * rate_units * days + ACCRUAL_DENOMINATOR) // (2 * ACCRUAL_DENOMINATOR)
+    total = accrued_micros + daily_interest
+    posted_cents = np.where(posting, total // MICROS_PER_CENT, 0)
+    return AccrualArrays(daily_interest, posted_cents, total - posted_cents * MICROS_PER_CENT)
+
+
+def int_column(accounts: List[Dict[str, Any]], field: str, missing: int) -> np.ndarray:
+    """One integer column of a batch, with missing where the field is unset."""
+    return np.fromiter((missing if account.get(field) is None else account[field] for account in accounts), dtype=np.int64, count=len(accounts))
+
+
+def accrual_arrays(accounts: List[Dict[str, Any]], accrual_date: date) -> AccrualArrays:
+    """Turn one batch from SavingsCRUD.accrual_batch into columns and accrue them for accrual_date."""
+    types = np.array([account.get("type") or "" for account in accounts])
+    balance_cents = int_column(accounts, "balance_cents", 0)
+    accrued_micros = int_column(accounts, "accrued_micros", 0)
+
+    rate_units = int_column(accounts, "rate_units", -1)
+    for account_type, rate in DEFAULT_RATES.items():
+        rate_units = np.where((rate_units < 0) & (types == account_type), to_rate_units(rate), rate_units)
+    rate_units = np.maximum(rate_units, 0)
+
+    posting_today = {frequency: is_posting_day(accrual_date, frequency) for frequency in ("daily", "monthly", "quarterly", "maturity")}
+    posting = np.array([
+        posting_today.get(account.get("interest_paid_frequency") or POSTING_FREQUENCIES.get(account.get("type"), "monthly"), False)
+        for account in accounts
+    ], dtype=bool)
+
+    # Days since the last accrual (missed days are caught up), one for a first
+    # accrual; time deposits stop accruing at maturity
+    today = (accrual_date - EPOCH).days
+    end = np.minimum(today, int_column(accounts, "maturity_ms", today * MS_PER_DAY) // MS_PER_DAY)
+    last = int_column(accounts, "last_accrual_ms", -1)
+    days = np.where(last >= 0, np.maximum(end - last // MS_PER_DAY, 0), (end == today).astype(np.int64))
+
+    min_balance_cents = int_column(accounts, "min_balance_cents", int(REGULAR_MIN_BALANCE * 100))
+    below_minimum = (types == "regular") & (balance_cents < min_balance_cents)
+
+    tier_rows: List[int] = []
+    tier_min_cents: List[int] = []
+    tier_rates: List[int] = []
+    for row, account in enumerate(accounts):
+        for tier in account.get("tiers") or ():
+            tier_rows.append(row)
+            tier_min_cents.append(tier["min_cents"])
+            tier_rates.append(tier["rate_units"])
+    rate_units = tiered_rate_units(
+        balance_cents, rate_units,
+        np.array(tier_rows, dtype=np.int64), np.array(tier_min_cents, dtype=np.int64), np.array(tier_rates, dtype=np.int64)
+    )
+    rate_units = np.where(below_minimum, 0, rate_units)
+    return accrue(balance_cents, rate_units, days, accrued_micros, posting)
+
+
+async def accrue_savings_interest(accrual_date: date, batch_size: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Accrue (and where due, post) one day of interest on every active savings
+    account. The date is the run's idempotency key: a completed date is skipped, and
+    a failed or abandoned one resumes with the accounts not yet accrued. Returns the
+    run's totals, or {"status": "skipped"} when the date was already run.
+    """
+    job_runs = JobRunCRUD(job_runs_collection)
+    key = accrual_date.isoformat()
+    if not await job_runs.claim(ACCRUAL_JOB, key, timedelta(minutes=settings.JOB_RUN_STALE_MINUTES)):
+        run = await job_runs.get(ACCRUAL_JOB, key) or {}
+        return {"status": "skipped", "accrual_date": key, "run_status": run.get("status")}
+
+    savings_crud = SavingsCRUD(savings_collection)
+    as_of = datetime.combine(accrual_date, time())
+    batch_size = max(1, batch_size or settings.INTEREST_ACCRUAL_BATCH_SIZE)
+    totals = {"accounts": 0, "accrued_micros": 0, "posted_cents": 0, "posted_accounts": 0}
+    try:
+        after = None
+        async with await client.start_session() as session:
+            while True:
+                accounts = await savings_crud.accrual_batch(as_of, after, batch_size)
+                if not accounts:
+                    break
+                after = accounts[-1]["_id"]
+                arrays = accrual_arrays(accounts, accrual_date)
+                posted_rows = np.flatnonzero(arrays.posted_cents).tolist()
+                entries = [
+                    accounting_service.journal_entry(
+                        INTEREST_EXPENSE_ACCOUNT, SAVINGS_DEPOSITS_ACCOUNT,
+                        Decimal(int(arrays.posted_cents[row])).scaleb(-2),
+                        tx_id=f"savings-interest-{accounts[row]['_id']}-{key}",
+                        borrower_id=accounts[row].get("user_id")
+                    )
+                    for row in posted_rows
+                ]
+
+                async def write(s):
+                    await savings_crud.apply_accruals(
+                        [account["_id"] for account in accounts],
+                        [Decimal(micros).scaleb(-6) for micros in arrays.carried_micros.tolist()],
+                        [Decimal(cents).scaleb(-2) for cents in arrays.posted_cents.tolist()],
+                        as_of, session=s
+                    )
+                    await accounting_service.post_transactions_in_session(entries, s)
+
+                await session.with_transaction(write)
+                totals["accounts"] += len(accounts)
+                totals["accrued_micros"] += int(arrays.daily_interest.sum())
+                totals["posted_cents"] += int(arrays.posted_cents.sum())
+                totals["posted_accounts"] += len(posted_rows)
+                await job_runs.heartbeat(ACCRUAL_JOB, key, totals)
+    except Exception as e:
+        await job_runs.fail(ACCRUAL_JOB, key, str(e))
+        raise
+
+    result = {
+        "status": "completed",
+        "accrual_date": key,
+        "accounts": totals["accounts"],
+        "accrued": Decimal(totals["accrued_micros"]).scaleb(-6),
+        "posted": Decimal(totals["posted_cents"]).scaleb(-2),
+        "posted_accounts": totals["posted_accounts"],
+    }
+    await job_runs.complete(ACCRUAL_JOB, key, {field: str(value) if isinstance(value, Decimal) else value for field, value in result.items()})
+    return result
@@ -1,30 +1,125 @@
+import asyncio
+from datetime import datetime, timezone
 from decimal import Decimal
+from typing import Any, Dict, List, Optional
+from bson import ObjectId
 from . import accounting_service
+from ..config import settings
+from ..basemodel.loan_model import Loan
+from ..basemodel.loan_transaction_model import LoanTransaction
+from ..database import loans_collection, loan_transactions_collection
+from ..database.loan_crud import LoanCRUD
+from ..database.loan_transaction_crud import LoanTransactionCRUD
+from ..database.portfolio_rollup_crud import loan_lookup
 
-async def disburse_loan(loan_id: str):
+async def _disburse(loan_data: Dict[str, Any], loan_crud: LoanCRUD) -> Dict[str, Any]:
     """
-    1. Find the loan by ID and check if it's 'approved'.
-    2. Post the accounting transaction.
-    3. Update the loan status to 'active'.
+    Disburse one approved loan: move it from 'approved' to 'active' only if it is
+    still approved and, in the same transaction, record a disbursement loan
+    transaction for its amount_requested (so its balance summary and the rollups
+    carry the principal) and post the matching accounting transaction. The ledger
+    and the balances never disagree about which loans are active. The reference
+    number and transaction id are derived from the loan, so a retry never records
+    either twice; the result says what happened.
     """
-    # This is a placeholder for the actual logic.
-    # We'll simulate finding a loan and disbursing it.
-    print(f"Attempting to disburse loan {loan_id}")
-    
-    # In a real app, you would fetch the loan amount from the database
-    loan_amount = Decimal("5000.00")
-
-    success = await accounting_service.post_transaction(
-        debit_account="Loans Receivable",
-        credit_account="Cash", # Or a funding source account
-        amount=loan_amount,
-        tx_id=f"disbursement-{loan_id}"
+    loan = Loan.model_validate(loan_data)
+    loan_id = str(loan.id)
+    result = {"loan_id": loan_id, "amount": loan.amount_requested, "status": "failed", "message": ""}
+
+    if loan.status != "approved":
+        result.update(status="skipped", message=f"Loan is {loan.status}, not approved")
+        return result
+    if loan.amount_requested is None or loan.amount_requested <= 0:
+        result["message"] = "Loan has no positive amount_requested"
+        return result
+
+    reference = f"{accounting_service.DISBURSEMENT_PREFIX}{loan_id}"
+    disbursed_at = datetime.now(timezone.utc)
+
+    async def record(active: Loan, session) -> None:
+        # The amount is read from the loan as locked by the transition, not the caller's copy
+        amount = Decimal(str(active.amount_requested))
+        await transaction_crud.insert_loan_transactions_in_session([
+            LoanTransaction(
+                loanId=loan_id, transactionType="disbursement", amount=amount, transactionDate=disbursed_at,
+                referenceNumber=reference, loanProduct=active.loan_product, disbursementStatus="completed", notes="Loan disbursement",
+                created_at=disbursed_at, updated_at=disbursed_at
+            )
+        ], session, {loan_id: active})
+        await accounting_service.post_transactions_in_session([
+            accounting_service.journal_entry(
+                "Loans Receivable", "Cash", # Or a funding source account
+                amount,
+                tx_id=reference,
+                loan_id=loan_id,
+                borrower_id=active.borrower_id
+            )
+        ], session)
+
+    transaction_crud = LoanTransactionCRUD(loan_transactions_collection, rollup_crud=loan_crud.rollup_crud)
+    activated = await loan_crud.transition_status(
+        loan_id, "approved", "active", {"disbursed_at": disbursed_at}, on_transition=record
     )
-    
-    if success:
-        # Here you would update the loan status in the database
-        print(f"Loan {loan_id} disbursed and status updated.")
-        return True
+    if activated:
+        result.update(status="disbursed", message="Loan disbursed")
     else:
-        print(f"Failed to post accounting transaction for loan {loan_id}.")
+        result.update(status="skipped", message="Loan was already disbursed")
+    return result
+
+async def disburse_loan(loan_id: str):
+    """Disburse a single approved loan (see _disburse). Returns True once the loan is active."""
+    print(f"Attempting to disburse loan {loan_id}")
+    loan_data = await loans_collection.find_one(loan_lookup(loan_id))
+    if not loan_data:
+        print(f"Loan {loan_id} not found.")
         return False
+
+    result = await _disburse(loan_data, LoanCRUD(loans_collection))
+    print(f"Loan {loan_id}: {result['message']}")
+    return result["status"] == "disbursed"
+
+def disbursement_filter(
+    loan_ids: Optional[List[str]] = None,
+    borrower_id: Optional[str] = None,
+    loan_product: Optional[str] = None,
+    branch: Optional[str] = None
+) -> Dict[str, Any]:
+    """Query for the approved loans a batch disbursement should pick up."""
+    query: Dict[str, Any] = {"status": "approved"}
+    if loan_ids:
+        query["$or"] = [condition for loan_id in loan_ids for condition in loan_lookup(loan_id)["$or"]]
+    if borrower_id:
+        query["borrower_id"] = ObjectId(borrower_id) if ObjectId.is_valid(borrower_id) else borrower_id
+    if loan_product:
+        query["loanProduct"] = loan_product
+    if branch:
+        query["branch"] = branch
+    return query
+
+async def disburse_loans(
+    query: Dict[str, Any],
+    limit: Optional[int] = None,
+    concurrency: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    """
+    Disburse every loan matching query (see disbursement_filter), at most limit
+    loans, with at most concurrency disbursements in flight. Each loan is handled
+    independently and idempotently, so a partly failed run can simply be repeated.
+    Returns one result per loan: loan_id, amount, status (disbursed / skipped /
+    failed) and message.
+    """
+    limit = min(limit or settings.DISBURSEMENT_MAX_BATCH, settings.DISBURSEMENT_MAX_BATCH)
+    semaphore = asyncio.Semaphore(max(1, concurrency or settings.DISBURSEMENT_CONCURRENCY))
+    loan_crud = LoanCRUD(loans_collection)
+
+    async def run(loan_data: Dict[str, Any]) -> Dict[str, Any]:
+        async with semaphore:
+            try:
+                return await _disburse(loan_data, loan_crud)
+            except Exception as e:
+                return {"loan_id": str(loan_data.get("_id")), "amount": loan_data.get("amount_requested"), "status": "failed", "message": str(e)}
+
+    tasks = []
+    async for loan_data in loans_collection.find(query).limit(limit):
+        tasks.append(asyncio.create_task(run(loan_data)))
+    return list(await asyncio.gather(*tasks))
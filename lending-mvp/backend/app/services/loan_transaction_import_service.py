@@ -0,0 +1,94 @@
+"""
+Streaming bulk import of loan transactions from bank and collection files: CSV
+(header row with LoanTransactionBase field names or their aliases) or fixed-width
+(columns described by a layout, see DEFAULT_FIXED_WIDTH_LAYOUT).
+
+Rows are parsed one at a time, mapped onto LoanTransactionBase and written in
+chunks through LoanTransactionCRUD.insert_loan_transactions, which resolves the
+chunk's loans in one query, skips reference numbers that were already imported and
+applies the balance effects with one bulk write per chunk. Only the current chunk is
+held in memory; per-row errors, progress and the final summary are reported as a
+stream of events (see ingest_rows).
+"""
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, Optional
+
+from ..basemodel.loan_transaction_model import LoanTransactionBase
+from ..database.loan_transaction_crud import LoanTransactionCRUD
+from ..utils.streaming import ingest_rows, iter_csv_rows, iter_fixed_width_rows
+
+IMPORT_FORMATS = ("csv", "fixed")
+DEFAULT_CHUNK_SIZE = 1000
+DEFAULT_TRANSACTION_TYPE = "repayment"
+
+# Detail records start with "D"; header and trailer records are skipped. Slices are
+# 0-based [start, end) character positions; amounts carry their decimal point.
+DEFAULT_FIXED_WIDTH_LAYOUT: Dict[str, Any] = {
+    "detail_prefix": "D",
+    "date_format": "%Y%m%d",
+    "fields": [
+        ["referenceNumber", 1, 21],
+        ["loanId", 21, 45],
+        ["transactionDate", 45, 53],
+        ["amount", 53, 68],
+        ["chequeNumber", 68, 80],
+        ["commercialBank", 80, 110],
+        ["servicingBranch", 110, 140],
+    ],
+}
+
+# Source columns may use either the field names or the stored (alias) names
+FIELD_ALIASES = {name: field.alias for name, field in LoanTransactionBase.model_fields.items() if field.alias}
+
+
+def parse_date(value: str, date_format: Optional[str] = None) -> datetime:
+    """ISO dates, or dates in the file's date_format (e.g. %Y%m%d, which pydantic would read as a unix timestamp)."""
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        pass
+    try:
+        if date_format:
+            return datetime.strptime(value, date_format)
+    except ValueError:
+        pass
+    raise ValueError(f"transactionDate: '{value}' is not an ISO date" + (f" or {date_format}" if date_format else ""))
+
+
+def to_transaction(data: Dict[str, Any], date_format: Optional[str] = None) -> LoanTransactionBase:
+    """Map one parsed row onto LoanTransactionBase; rows without a transaction type are repayments."""
+    document = {FIELD_ALIASES.get(key, key): value for key, value in data.items() if value is not None}
+    document.setdefault("transactionType", DEFAULT_TRANSACTION_TYPE)
+    if not document.get("referenceNumber"):
+        raise ValueError("referenceNumber is required to detect duplicate imports")
+    if isinstance(document.get("transactionDate"), str):
+        document["transactionDate"] = parse_date(document["transactionDate"], date_format)
+    if isinstance(document.get("amount"), str):
+        document["amount"] = document["amount"].replace(",", "")
+    return LoanTransactionBase.model_validate(document)
+
+
+async def import_loan_transactions(
+    chunks: AsyncIterator[bytes],
+    file_format: str,
+    loan_transaction_crud: LoanTransactionCRUD,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    layout: Optional[Dict[str, Any]] = None,
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Import a loan transaction file, yielding error, progress (one per chunk) and
+    summary events. layout applies to fixed-width files and defaults to
+    DEFAULT_FIXED_WIDTH_LAYOUT; its date_format is also used for CSV dates.
+    """
+    if file_format not in IMPORT_FORMATS:
+        raise ValueError(f"Unknown import format '{file_format}'. Expected one of: {', '.join(IMPORT_FORMATS)}")
+    layout = layout or DEFAULT_FIXED_WIDTH_LAYOUT
+    date_format = layout.get("date_format")
+
+    if file_format == "fixed":
+        rows = iter_fixed_width_rows(chunks, [tuple(field) for field in layout["fields"]], layout.get("detail_prefix"))
+    else:
+        rows = iter_csv_rows(chunks)
+
+    async for event in ingest_rows(rows, lambda data: to_transaction(data, date_format), loan_transaction_crud.insert_loan_transactions, chunk_size):
+        yield event
@@ -0,0 +1,162 @@
+"""
+Nightly late-payment penalties, vectorized with NumPy.
+
+Loan products carry the rule (see LoanProductBase): penalty_rate percent of the
+overdue amount per 30 days, charged one day at a time once the loan is more than
+penalty_grace_days past due. The overdue amount is what the equal-installment
+schedule (due monthly from created_at, as LoanType.schedule) has fallen due by the
+run date, less what was repaid. As elsewhere, money is integer centavos:
+
+- one day's penalty = ROUND_HALF_UP(overdue * penalty_rate / 100 / 30)
+
+Overdue loans are read from the next_due_date partial index through one cursor, in
+batches, so memory stays bounded by the batch size whatever the size of the book.
+Each batch is written with one insert_many of penalty loan transactions, their
+balance and rollup updates and their ledger entries, in a single transaction.
+Reference numbers are derived from the loan and the date, so a run that is
+repeated or resumes after a failure never charges a loan twice for the same day.
+"""
+import calendar
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from typing import Any, Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+from . import accounting_service
+from .amortization_service import RATE_SCALE, portfolio_schedules, to_centavos, to_rate_units
+from ..basemodel.loan_model import Loan
+from ..basemodel.loan_transaction_model import LoanTransaction, LoanTransactionBase
+from ..config import settings
+from ..database import loans_collection, loan_products_collection, loan_transactions_collection, job_runs_collection
+from ..database.job_run_crud import JobRunCRUD
+from ..database.loan_crud import LoanCRUD
+from ..database.loan_transaction_crud import LoanTransactionCRUD
+
+PENALTY_JOB = "late-payment-penalty"
+PENALTIES_RECEIVABLE_ACCOUNT = "Penalties Receivable"
+PENALTY_INCOME_ACCOUNT = "Penalty Income"
+
+# overdue_cents * rate_units / PENALTY_DENOMINATOR = one day's penalty in centavos
+PENALTY_DENOMINATOR = 30 * 100 * RATE_SCALE
+
+
+class PenaltyRule(NamedTuple):
+    rate_units: int
+    grace_days: int
+
+
+def penalty_reference(loan_id: str, as_of: date) -> str:
+    """Reference number (and ledger transaction id) of a loan's penalty for one day."""
+    return f"penalty-{loan_id}-{as_of.isoformat()}"
+
+
+async def penalty_rules() -> Dict[str, PenaltyRule]:
+    """Rule per loan product code, for the products that charge a penalty."""
+    rules: Dict[str, PenaltyRule] = {}
+    async for product in loan_products_collection.find({"penalty_rate": {"$gt": 0}}, {"product_code": 1, "penalty_rate": 1, "penalty_grace_days": 1}):
+        rules[product["product_code"]] = PenaltyRule(to_rate_units(product["penalty_rate"]), int(product.get("penalty_grace_days") or 0))
+    return rules
+
+
+def installments_due(created_at: List[datetime], terms: np.ndarray, as_of: date) -> np.ndarray:
+    """Installments per loan due on or before as_of; due dates fall monthly from created_at as add_months does."""
+    years = np.fromiter((created.year for created in created_at), dtype=np.int64, count=len(created_at))
+    months = np.fromiter((created.month for created in created_at), dtype=np.int64, count=len(created_at))
+    days = np.fromiter((created.day for created in created_at), dtype=np.int64, count=len(created_at))
+    elapsed = (as_of.year - years) * 12 + (as_of.month - months)
+    # This month's due day is clamped to the month's length, e.g. the 31st -> the 30th
+    due_day = np.minimum(days, calendar.monthrange(as_of.year, as_of.month)[1])
+    return np.clip(elapsed - (as_of.day < due_day), 0, terms)
+
+
+def penalty_amounts(loans: List[Loan], repaid_cents: List[int], rules: Dict[str, PenaltyRule], as_of: date) -> np.ndarray:
+    """One day's penalty per loan in centavos (zero where nothing is overdue or the loan is within its grace days)."""
+    schedules = portfolio_schedules(loans)
+    rows = np.arange(len(loans))
+    due = installments_due([loan.created_at for loan in loans], schedules.terms, as_of)
+    fallen_due = np.where(due > 0, np.cumsum(schedules.payment, axis=1)[rows, np.maximum(due - 1, 0)], 0)
+    overdue = np.maximum(fallen_due - np.asarray(repaid_cents, dtype=np.int64), 0)
+
+    no_rule = PenaltyRule(0, 0)
+    rate_units = np.fromiter((rules.get(loan.loan_product, no_rule).rate_units for loan in loans), dtype=np.int64, count=len(loans))
+    grace_days = np.fromiter((rules.get(loan.loan_product, no_rule).grace_days for loan in loans), dtype=np.int64, count=len(loans))
+    days_past_due = np.fromiter(
+        ((as_of - loan.next_due_date.date()).days if loan.next_due_date else 0 for loan in loans), dtype=np.int64, count=len(loans)
+    )
+    daily = (2 * overdue * rate_units + PENALTY_DENOMINATOR) // (2 * PENALTY_DENOMINATOR)
+    return np.where(days_past_due > grace_days, daily, 0)
+
+
+async def assess_penalties(as_of: date, batch_size: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Charge one day of late-payment penalty on every overdue loan whose product has
+    a penalty rule. The date is the run's idempotency key (see JobRunCRUD) and part
+    of every reference number, so a failed or abandoned run is resumed by running
+    it again. Returns the run's totals, or {"status": "skipped"} when the date was
+    already run.
+    """
+    job_runs = JobRunCRUD(job_runs_collection)
+    key = as_of.isoformat()
+    if not await job_runs.claim(PENALTY_JOB, key, timedelta(minutes=settings.JOB_RUN_STALE_MINUTES)):
+        run = await job_runs.get(PENALTY_JOB, key) or {}
+        return {"status": "skipped", "as_of": key, "run_status": run.get("status")}
+
+    loan_crud = LoanCRUD(loans_collection)
+    transaction_crud = LoanTransactionCRUD(loan_transactions_collection)
+    charged_at = datetime.combine(as_of, time())
+    batch_size = max(1, batch_size or settings.PENALTY_BATCH_SIZE)
+    totals = {"loans": 0, "charged": 0, "duplicates": 0, "failed": 0, "penalty_cents": 0}
+    try:
+        rules = await penalty_rules()
+        if rules:
+            async for loans in loan_crud.overdue_loans(charged_at, list(rules), batch_size):
+                balances = await loan_crud.rollup_crud.loan_balances(loans)
+                penalties = penalty_amounts(loans, [to_centavos(balances[str(loan.id)]["total_repaid"]) for loan in loans], rules, as_of)
+                borrowers = {str(loan.id): loan.borrower_id for loan in loans}
+                charges = [
+                    (str(loan.id), LoanTransactionBase(
+                        loanId=str(loan.id), transactionType="penalty", amount=Decimal(cents).scaleb(-2),
+                        transactionDate=charged_at, referenceNumber=penalty_reference(str(loan.id), as_of),
+                        loanProduct=loan.loan_product, notes=f"Late payment penalty for {key}"
+                    ))
+                    for loan, cents in zip(loans, penalties.tolist()) if cents > 0
+                ]
+
+                async def post_ledger(inserted: List[LoanTransaction], session) -> None:
+                    await accounting_service.post_transactions_in_session([
+                        accounting_service.journal_entry(
+                            PENALTIES_RECEIVABLE_ACCOUNT, PENALTY_INCOME_ACCOUNT, transaction.amount,
+                            tx_id=transaction.reference_number, loan_id=transaction.loan_id, borrower_id=borrowers[transaction.loan_id]
+                        )
+                        for transaction in inserted
+                    ], session)
+
+                if charges:
+                    results = await transaction_crud.insert_loan_transactions(charges, on_insert=post_ledger)
+                    amounts = {loan_id: transaction.amount for loan_id, transaction in charges}
+                    for loan_id, outcome, _ in results:
+                        if outcome == "inserted":
+                            totals["charged"] += 1
+                            totals["penalty_cents"] += to_centavos(amounts[loan_id])
+                        elif outcome == "duplicate":
+                            totals["duplicates"] += 1
+                        else:
+                            totals["failed"] += 1
+                totals["loans"] += len(loans)
+                await job_runs.heartbeat(PENALTY_JOB, key, totals)
+    except Exception as e:
+        await job_runs.fail(PENALTY_JOB, key, str(e))
+        raise
+
+    result = {
+        "status": "completed",
+        "as_of": key,
+        "overdue_loans": totals["loans"],
+        "charged": totals["charged"],
+        "duplicates": totals["duplicates"],
+        "failed": totals["failed"],
+        "penalties": Decimal(totals["penalty_cents"]).scaleb(-2),
+    }
+    await job_runs.complete(PENALTY_JOB, key, {field: str(value) if isinstance(value, Decimal) else value for field, value in result.items()})
+    return result
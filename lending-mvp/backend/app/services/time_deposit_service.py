@@ -0,0 +1,133 @@
+"""
+Time deposit maturity processing.
+
+At maturity a deposit is credited the interest for its term: what the daily
+accrual (interest_service) has accrued, plus the days it has not reached yet,
+rounded half-up to the centavo. It is then either rolled over for another
+term_days with principal plus interest as the new principal (auto_renew), or
+closed with principal plus interest paid out.
+
+Due deposits are found through the type/status/maturity_date index, so a run costs
+O(deposits due), and are settled in batches: one bulk_write and one ledger batch
+per batch, in a single transaction. Settled deposits drop out of the query (closed,
+or maturing a term later), so a run that crashed at any point resumes by running
+it again, and a deposit that fell several terms behind rolls over once per term.
+"""
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from . import accounting_service
+from .interest_service import (
+    INTEREST_EXPENSE_ACCOUNT, MICROS_PER_CENT, MS_PER_DAY, SAVINGS_DEPOSITS_ACCOUNT, accrue, int_column,
+)
+from ..config import settings
+from ..database import client, savings_collection, job_runs_collection
+from ..database.job_run_crud import JobRunCRUD
+from ..database.savings_crud import SavingsCRUD
+
+MATURITY_JOB = "time-deposit-maturity"
+PAYOUT_ACCOUNT = "Cash"
+
+
+def maturity_interest(deposits: List[Dict[str, Any]]) -> np.ndarray:
+    """
+    Interest owed at maturity per deposit, in centavos: the accrued interest plus
+    the days from the last accrual (else the opening date, else a full term before
+    maturity) to maturity.
+    """
+    maturity_day = int_column(deposits, "maturity_ms", 0) // MS_PER_DAY
+    term_start = maturity_day - int_column(deposits, "term_days", 0)
+    opened_day = np.where(int_column(deposits, "opened_ms", -1) >= 0, int_column(deposits, "opened_ms", 0) // MS_PER_DAY, term_start)
+    last_accrual = int_column(deposits, "last_accrual_ms", -1)
+    start_day = np.where(last_accrual >= 0, last_accrual // MS_PER_DAY, opened_day)
+
+    arrays = accrue(
+        int_column(deposits, "balance_cents", 0),
+        int_column(deposits, "rate_units", 0),
+        np.maximum(maturity_day - start_day, 0),
+        int_column(deposits, "accrued_micros", 0),
+        np.zeros(len(deposits), dtype=bool),
+    )
+    return (arrays.carried_micros + MICROS_PER_CENT // 2) // MICROS_PER_CENT
+
+
+async def process_maturities(as_of: date, batch_size: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Settle every active time deposit maturing on or before as_of. The date is the
+    run's idempotency key (see JobRunCRUD); a failed or abandoned run resumes with
+    the deposits not yet settled. Returns the run's totals, or {"status": "skipped"}
+    when the date was already run.
+    """
+    job_runs = JobRunCRUD(job_runs_collection)
+    key = as_of.isoformat()
+    if not await job_runs.claim(MATURITY_JOB, key, timedelta(minutes=settings.JOB_RUN_STALE_MINUTES)):
+        run = await job_runs.get(MATURITY_JOB, key) or {}
+        return {"status": "skipped", "as_of": key, "run_status": run.get("status")}
+
+    savings_crud = SavingsCRUD(savings_collection)
+    due_before = datetime.combine(as_of + timedelta(days=1), time())
+    batch_size = max(1, batch_size or settings.INTEREST_ACCRUAL_BATCH_SIZE)
+    totals = {"matured": 0, "renewed": 0, "closed": 0, "interest_cents": 0, "payout_cents": 0}
+    try:
+        async with await client.start_session() as session:
+            while True:
+                deposits = await savings_crud.due_time_deposits(due_before, batch_size)
+                if not deposits:
+                    break
+
+                maturities: List[Dict[str, Any]] = []
+                entries: List[Dict[str, Any]] = []
+                for deposit, interest_cents in zip(deposits, maturity_interest(deposits).tolist()):
+                    maturity_date = deposit["maturity_date"]
+                    term_days = deposit.get("term_days") or 0
+                    # A deposit without a term cannot roll over, so it is paid out
+                    next_maturity = maturity_date + timedelta(days=term_days) if deposit.get("auto_renew") and term_days > 0 else None
+                    total_cents = deposit["balance_cents"] + interest_cents
+                    maturities.append({
+                        "_id": deposit["_id"], "maturity_date": maturity_date,
+                        "balance": Decimal(total_cents).scaleb(-2), "next_maturity": next_maturity,
+                    })
+
+                    tx_key = f"{deposit['_id']}-{maturity_date:%Y-%m-%d}"
+                    if interest_cents:
+                        entries.append(accounting_service.journal_entry(
+                            INTEREST_EXPENSE_ACCOUNT, SAVINGS_DEPOSITS_ACCOUNT, Decimal(interest_cents).scaleb(-2),
+                            tx_id=f"td-interest-{tx_key}", borrower_id=deposit.get("user_id")
+                        ))
+                    if next_maturity is None and total_cents:
+                        entries.append(accounting_service.journal_entry(
+                            SAVINGS_DEPOSITS_ACCOUNT, PAYOUT_ACCOUNT, Decimal(total_cents).scaleb(-2),
+                            tx_id=f"td-payout-{tx_key}", borrower_id=deposit.get("user_id")
+                        ))
+                    totals["interest_cents"] += interest_cents
+                    if next_maturity:
+                        totals["renewed"] += 1
+                    else:
+                        totals["closed"] += 1
+                        totals["payout_cents"] += total_cents
+
+                async def write(s):
+                    await savings_crud.apply_maturities(maturities, session=s)
+                    await accounting_service.post_transactions_in_session(entries, s)
+
+                await session.with_transaction(write)
+                totals["matured"] += len(deposits)
+                await job_runs.heartbeat(MATURITY_JOB, key, totals)
+    except Exception as e:
+        await job_runs.fail(MATURITY_JOB, key, str(e))
+        raise
+
+    result = {
+        "status": "completed",
+        "as_of": key,
+        "matured": totals["matured"],
+        "renewed": totals["renewed"],
+        "closed": totals["closed"],
+        "interest": Decimal(totals["interest_cents"]).scaleb(-2),
+        "paid_out": Decimal(totals["payout_cents"]).scaleb(-2),
+    }
+    await job_runs.complete(MATURITY_JOB, key, {field: str(value) if isinstance(value, Decimal) else value for field, value in result.items()})
+    return result
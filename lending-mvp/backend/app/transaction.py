@@ -1,7 +1,7 @@
 import strawberry
 from typing import List, Optional
 from strawberry.types import Info
-from .database import get_db
+from .database import get_savings_collection, get_transactions_collection
 from .database.savings_crud import SavingsCRUD
 from .database.transaction_crud import TransactionCRUD
 from .basemodel.transaction_model import TransactionBase, TransactionInDB # Added TransactionInDB
@@ -36,14 +36,13 @@ class TransactionQuery:
         if not current_user:
             return TransactionsResponse(success=False, message="Not authenticated", transactions=[], total=0)
 
-        db = get_db()
         # Authorization: Ensure the user owns the account they are querying transactions for
-        savings_crud = SavingsCRUD(db.savings)
+        savings_crud = SavingsCRUD(get_savings_collection())
         account = await savings_crud.get_savings_account_by_id(str(account_id))
         # if not account or str(account.user_id) != str(current_user.id): # Corrected to account.user_id
         #     return TransactionsResponse(success=False, message="Not authorized", transactions=[])
             
-        transaction_crud = TransactionCRUD(db.transactions, savings_crud)
+        transaction_crud = TransactionCRUD(get_transactions_collection(), savings_crud)
         transactions_data = await transaction_crud.get_transactions_by_account_id(str(account_id))
 
         transactions = [map_db_transaction_to_strawberry_type(t) for t in transactions_data]
@@ -57,15 +56,14 @@ class TransactionMutation:
         if not current_user:
             return TransactionResponse(success=False, message="Not authenticated")
 
-        db = get_db()
-        savings_crud = SavingsCRUD(db.savings)
+        savings_crud = SavingsCRUD(get_savings_collection())
         
         # Authorization check
         # account = await savings_crud.get_savings_account_by_id(str(input.account_id))
         # if not account or str(account.user_id) != str(current_user.id): # Corrected to account.user_id
         #     return TransactionResponse(success=False, message="Not authorized for this account")
 
-        transaction_crud = TransactionCRUD(db.transactions, savings_crud)
+        transaction_crud = TransactionCRUD(get_transactions_collection(), savings_crud)
         
         transaction_to_create = TransactionBase(
             account_id=input.account_id,
@@ -1,15 +1,15 @@
 import strawberry
 from typing import List, Optional
-from fastapi import HTTPException, status
 from strawberry.types import Info
 from datetime import datetime
 
 # Import models and schemas
 from .models import UserInDB, UserCreate, UserUpdate, PyObjectId
-from .schema import UserType, UserCreateInput, UserUpdateInput, LoginInput, LoginResponse, UserResponse, UsersResponse
+from .schema import UserType, UserCreateInput, UserUpdateInput, LoginInput, LoginResponse, UserResponse, UsersResponse, PageInfo, UserEdge, UserConnection
 from .database import get_users_collection
 from .database.crud import UserCRUD
-from .auth.security import verify_password, create_access_token
+from .database.pagination import TotalMode
+from .services import auth_service
 
 def convert_user_db_to_user_type(user_db: UserInDB) -> UserType:
     """Convert UserInDB to UserType schema"""
@@ -27,7 +27,7 @@ def convert_user_db_to_user_type(user_db: UserInDB) -> UserType:
 @strawberry.type
 class Query:
     @strawberry.field
-    async def users(self, info: Info, skip: int = 0, limit: int = 100) -> UsersResponse:
+    async def users(self, info: Info, skip: int = 0, limit: int = 100, total_mode: TotalMode = TotalMode.EXACT) -> UsersResponse:
         """Get all users"""
         current_user: UserInDB = info.context.get("current_user")
         if not current_user or current_user.role != "admin":
@@ -37,8 +37,7 @@ class Query:
             users_collection = get_users_collection()
             user_crud = UserCRUD(users_collection)
             
-            users_db = await user_crud.get_users(skip=skip, limit=limit)
-            total = await user_crud.count_users()
+            users_db, total = await user_crud.get_users_with_total(skip=skip, limit=limit, total_mode=total_mode)
             
             users = [convert_user_db_to_user_type(user_db) for user_db in users_db]
             
@@ -56,6 +55,22 @@ class Query:
                 total=0
             )
 
+    @strawberry.field
+    async def users_connection(self, info: Info, first: int = 50, after: Optional[str] = None) -> UserConnection:
+        """Get users with keyset pagination, ordered by username"""
+        current_user: UserInDB = info.context.get("current_user")
+        if not current_user or current_user.role != "admin":
+            raise Exception("Not authorized")
+
+        users_collection = get_users_collection()
+        user_crud = UserCRUD(users_collection)
+
+        edges, has_next_page = await user_crud.get_users_page(first=first, after=after)
+        return UserConnection(
+            edges=[UserEdge(cursor=cursor, node=convert_user_db_to_user_type(user_db)) for cursor, user_db in edges],
+            page_info=PageInfo(has_next_page=has_next_page, end_cursor=edges[-1][0] if edges else None)
+        )
+
     @strawberry.field
     async def user(self, info: Info, user_id: str) -> UserResponse:
         """Get user by ID"""
@@ -91,41 +106,7 @@ class Mutation:
     @strawberry.field
     async def login(self, input: LoginInput) -> LoginResponse:
         """User login"""
-        print(f"--- Login attempt for username: {input.username} ---")
-        users_collection = get_users_collection()
-        user_crud = UserCRUD(users_collection)
-
-        # Get user by username or email
-        user_db = await user_crud.get_user_by_username(input.username)
-        if not user_db:
-            user_db = await user_crud.get_user_by_email(input.username)
-
-        print(f"User found in DB: {'Yes' if user_db else 'No'}")
-
-        if user_db:
-            password_ok = verify_password(input.password, user_db.hashed_password)
-            print(f"Password verification result: {password_ok}")
-            if not password_ok:
-                raise HTTPException(
-                    status_code=status.HTTP_401_UNAUTHORIZED,
-                    detail="Incorrect username or password"
-                )
-        else:
-            # Still raise the same error to avoid user enumeration
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Incorrect username or password"
-            )
-
-        if not user_db.is_active:
-            print(f"User is inactive.")
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Inactive user"
-            )
-
-        print("--- Login successful ---")
-        access_token = create_access_token(data={"sub": str(user_db.id)})
+        access_token, user_db = await auth_service.authenticate_user(input.username, input.password)
         user = convert_user_db_to_user_type(user_db)
 
         return LoginResponse(
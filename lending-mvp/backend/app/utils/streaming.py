@@ -0,0 +1,172 @@
+"""
+Incremental parsing of uploaded files.
+
+Everything here consumes an async iterator of byte chunks (a request body via
+Request.stream(), or a file via file_chunks) and yields one row at a time, so
+memory use depends on the longest row, not on the size of the file. Rows are
+yielded as (row_no, data, error): data is None when the row could not be parsed and
+error says why. Row numbers count physical lines from 1, including the header.
+"""
+import codecs
+import csv
+import json
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+Row = Tuple[int, Optional[Dict[str, Any]], Optional[str]]
+
+CHUNK_SIZE = 64 * 1024
+
+
+async def file_chunks(path: str, chunk_size: int = CHUNK_SIZE) -> AsyncIterator[bytes]:
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+async def iter_lines(chunks: AsyncIterator[bytes], encoding: str = "utf-8-sig") -> AsyncIterator[str]:
+    """Decode and split into lines (without line endings) as the chunks arrive."""
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending.rstrip("\r")
+
+
+async def iter_csv_rows(chunks: AsyncIterator[bytes]) -> AsyncIterator[Row]:
+    """
+    Rows of a CSV file with a header line, as dicts keyed by the header. Quoted
+    fields may span lines; empty fields become None.
+    """
+    header = None
+    record, record_start, line_no = "", 0, 0
+    async for line in iter_lines(chunks):
+        line_no += 1
+        record = f"{record}\n{line}" if record else line
+        record_start = record_start or line_no
+        # A record ends where its quotes are balanced ("" escapes count twice)
+        if record.count('"') % 2:
+            continue
+        values = next(csv.reader([record]), []) if record.strip() else []
+        row_no, record, record_start = record_start, "", 0
+        if not values:
+            continue
+        if header is None:
+            header = [name.strip() for name in values]
+            continue
+        if len(values) != len(header):
+            yield row_no, None, f"expected {len(header)} fields, found {len(values)}"
+            continue
+        yield row_no, {name: (value.strip() or None) for name, value in zip(header, values)}, None
+    if record:
+        yield record_start, None, "unterminated quoted field"
+
+
+async def iter_fixed_width_rows(
+    chunks: AsyncIterator[bytes],
+    fields: Sequence[Tuple[str, int, int]],
+    detail_prefix: Optional[str] = None,
+) -> AsyncIterator[Row]:
+    """
+    Rows of a fixed-width file: fields are (name, start, end) character slices.
+    With detail_prefix, only lines starting with it are rows (header and trailer
+    records are skipped). Blank fields become None.
+    """
+    line_no = 0
+    async for line in iter_lines(chunks):
+        line_no += 1
+        if not line.strip() or (detail_prefix and not line.startswith(detail_prefix)):
+            continue
+        yield line_no, {name: (line[start:end].strip() or None) for name, start, end in fields}, None
+
+
+async def iter_ndjson_rows(chunks: AsyncIterator[bytes]) -> AsyncIterator[Row]:
+    """One JSON object per line; blank lines are skipped."""
+    line_no = 0
+    async for line in iter_lines(chunks):
+        line_no += 1
+        if not line.strip():
+            continue
+        try:
+            data = json.loads(line)
+        except ValueError as e:
+            yield line_no, None, f"invalid JSON: {e}"
+            continue
+        if not isinstance(data, dict):
+            yield line_no, None, "expected a JSON object"
+            continue
+        yield line_no, data, None
+
+
+async def ingest_rows(
+    rows: AsyncIterator[Row],
+    validate: Callable[[Dict[str, Any]], Any],
+    write_chunk: Callable[[List[Tuple[int, Any]]], Awaitable[List[Tuple[int, str, str]]]],
+    chunk_size: int = 1000,
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Validate parsed rows and write them chunk_size at a time, reporting as a stream
+    of events so that nothing but the current chunk is held in memory:
+
+        {"event": "error", "row": 12, "outcome": "failed" | "duplicate", "message": "..."}
+        {"event": "progress", "rows": 5000, "inserted": 4990, "duplicates": 6, "failed": 4, "elapsed_s": 0.6, "rows_per_s": 8123.4}
+        {"event": "summary", ...same counters...}
+
+    validate turns a row into the value to write or raises ValueError (pydantic's
+    ValidationError included). write_chunk receives (row_no, value) pairs and returns
+    (row_no, outcome, message) per row, outcome being inserted, duplicate or failed.
+    """
+    started = time.perf_counter()
+    counts = {"rows": 0, "inserted": 0, "duplicates": 0, "failed": 0}
+    batch: List[Tuple[int, Any]] = []
+
+    def progress(event: str) -> Dict[str, Any]:
+        elapsed = time.perf_counter() - started
+        return {"event": event, **counts, "elapsed_s": round(elapsed, 3), "rows_per_s": round(counts["rows"] / elapsed, 1) if elapsed else 0.0}
+
+    async def flush() -> List[Dict[str, Any]]:
+        events = []
+        for row_no, outcome, message in await write_chunk(batch):
+            if outcome == "inserted":
+                counts["inserted"] += 1
+                continue
+            counts["duplicates" if outcome == "duplicate" else "failed"] += 1
+            events.append({"event": "error", "row": row_no, "outcome": outcome, "message": message})
+        return events
+
+    async for row_no, data, error in rows:
+        counts["rows"] += 1
+        if error is None:
+            try:
+                batch.append((row_no, validate(data)))
+            except ValueError as e:
+                error = validation_message(e)
+        if error is not None:
+            counts["failed"] += 1
+            yield {"event": "error", "row": row_no, "outcome": "failed", "message": error}
+
+        if len(batch) >= chunk_size:
+            for event in await flush():
+                yield event
+            batch = []
+            yield progress("progress")
+
+    if batch:
+        for event in await flush():
+            yield event
+    yield progress("summary")
+
+
+def validation_message(error: ValueError) -> str:
+    """One line per error; pydantic errors are listed as field: message."""
+    if hasattr(error, "errors"):
+        return "; ".join(f"{'.'.join(str(part) for part in e['loc'])}: {e['msg']}" for e in error.errors())
+    return str(error)
@@ -0,0 +1,84 @@
+"""
+Shared helpers for the benchmark scripts.
+
+Benchmarks run against a real MongoDB and a throw-away database:
+
+    BENCH_DATABASE_URL   (default mongodb://localhost:27017)
+    BENCH_DATABASE_NAME  (default lending_bench)
+
+Run them from the backend directory, e.g. ``python -m benchmarks.bench_dataloader``.
+This module must be imported before anything from ``app`` so the settings and the
+command counter are in place before the Motor client is created.
+"""
+import os
+import statistics
+import time
+from typing import Dict, Iterable, List
+
+from pymongo import monitoring
+
+os.environ.setdefault("DATABASE_URL", os.environ.get("BENCH_DATABASE_URL", "mongodb://localhost:27017"))
+os.environ.setdefault("DATABASE_NAME", os.environ.get("BENCH_DATABASE_NAME", "lending_bench"))
+
+
+class CommandCounter(monitoring.CommandListener):
+    """Counts every command sent to the server, i.e. the number of round trips."""
+
+    def __init__(self):
+        self.count = 0
+
+    def started(self, event):
+        self.count += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+    def reset(self) -> int:
+        count, self.count = self.count, 0
+        return count
+
+
+command_counter = CommandCounter()
+monitoring.register(command_counter)
+
+
+class Timer:
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.start
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """Latency summary in milliseconds."""
+    return {
+        "p50_ms": percentile(samples, 50) * 1000,
+        "p99_ms": percentile(samples, 99) * 1000,
+        "mean_ms": statistics.fmean(samples) * 1000 if samples else 0.0,
+    }
+
+
+def print_table(title: str, rows: Iterable[Dict[str, object]]) -> None:
+    rows = list(rows)
+    print(f"\n== {title} ==")
+    if not rows:
+        return
+    headers = list(rows[0].keys())
+    formatted = [[f"{row[h]:.2f}" if isinstance(row[h], float) else str(row[h]) for h in headers] for row in rows]
+    widths = [max(len(h), *(len(r[i]) for r in formatted)) for i, h in enumerate(headers)]
+    print("  ".join(h.ljust(w) for h, w in zip(headers, widths)))
+    for r in formatted:
+        print("  ".join(v.ljust(w) for v, w in zip(r, widths)))
@@ -0,0 +1,94 @@
+"""
+Portfolio amortization: the NumPy engine (amortization_schedules, one call for
+every loan) versus a pure-Python Decimal loop applying the same rounding rules
+loan by loan. CPU only, no server needed.
+
+The pure-Python loop is slow, so it runs on the first --python-loans loans and
+its throughput is reported per loan; every loan it computes is compared with the
+NumPy result centavo by centavo.
+
+    python -m benchmarks.bench_amortization [--loans 100000] [--months 360] [--python-loans 2000]
+"""
+import argparse
+import random
+from decimal import Decimal, ROUND_HALF_UP, getcontext
+
+from ._support import Timer, print_table
+
+from app.services.amortization_service import METHODS, RATE_SCALE, amortization_schedules
+
+CENT = Decimal("0.01")
+
+
+def python_schedule(principal_cents: int, rate_units: int, term: int, method: str):
+    """Pure-Python reference: per-period (payment, principal, interest) in centavos."""
+    balance = Decimal(principal_cents) / 100
+    # Monthly interest is one division of exact values, so Decimal's rounding to
+    # 28 digits can never move it across a half-centavo boundary
+    rate_numerator, rate_denominator = Decimal(rate_units), Decimal(RATE_SCALE * 1200)
+    monthly_rate = rate_numerator / rate_denominator
+    if method == "equal_installment":
+        if monthly_rate > 0:
+            installment = (balance * monthly_rate / (1 - (1 + monthly_rate) ** -term)).quantize(CENT, ROUND_HALF_UP)
+        else:
+            installment = (balance / term).quantize(CENT, ROUND_HALF_UP)
+    elif method == "straight_line":
+        level_principal = (balance / term).quantize(CENT, ROUND_HALF_UP)
+
+    rows = []
+    for month in range(term):
+        interest = (balance * rate_numerator / rate_denominator).quantize(CENT, ROUND_HALF_UP)
+        if method == "equal_installment":
+            principal = installment - interest
+        elif method == "straight_line":
+            principal = level_principal
+        else:
+            principal = Decimal("0")
+        principal = balance if month == term - 1 else min(max(principal, Decimal("0")), balance)
+        balance -= principal
+        rows.append((int((principal + interest) * 100), int(principal * 100), int(interest * 100)))
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--loans", type=int, default=100_000)
+    parser.add_argument("--months", type=int, default=360)
+    parser.add_argument("--python-loans", type=int, default=2_000)
+    args = parser.parse_args()
+
+    getcontext().prec = 28
+    rng = random.Random(42)
+    principals = [rng.randrange(1_000_000, 500_000_000) for _ in range(args.loans)]  # 10k to 5M pesos
+    rates = [rng.randrange(30_000, 360_000, 2_500) for _ in range(args.loans)]         # 3% to 36% a year
+    terms = [args.months] * args.loans
+    sample = min(args.python_loans, args.loans)
+
+    results = []
+    for method in METHODS:
+        with Timer() as numpy_timer:
+            schedules = amortization_schedules(principals, rates, terms, method)
+
+        mismatches = 0
+        with Timer() as python_timer:
+            for i in range(sample):
+                for month, (payment, principal, interest) in enumerate(python_schedule(principals[i], rates[i], terms[i], method)):
+                    if (payment, principal, interest) != (
+                        schedules.payment[i, month], schedules.principal[i, month], schedules.interest[i, month]
+                    ):
+                        mismatches += 1
+
+        results.append({
+            "method": method,
+            "numpy_loans_per_s": args.loans / numpy_timer.elapsed,
+            "python_loans_per_s": sample / python_timer.elapsed,
+            "speedup": (args.loans / numpy_timer.elapsed) / (sample / python_timer.elapsed),
+            "centavo_mismatches": mismatches,
+            "ends_at_zero": bool((schedules.balance[:, -1] == 0).all()),
+        })
+
+    print_table(f"{args.loans} loans x {args.months} months", results)
+
+
+if __name__ == "__main__":
+    main()
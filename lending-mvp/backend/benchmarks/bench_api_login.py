@@ -0,0 +1,88 @@
+"""
+Requests/sec of /api-login/: the previous GraphQL bridge (new strawberry.Schema and a
+parsed login document per call) versus the direct auth-service path.
+
+The bench user is hashed with a low bcrypt cost so the per-request overhead of the
+bridge is visible rather than drowned out by hashing.
+
+    python -m benchmarks.bench_api_login [--requests 500] [--concurrency 20]
+"""
+import argparse
+import asyncio
+from datetime import datetime
+
+import strawberry
+
+from ._support import Timer, print_table
+
+from app.auth.security import pwd_context
+from app.database import get_users_collection
+from app.main import LoginRequest, Mutation, Query, api_login
+
+USERNAME = "bench-login"
+PASSWORD = "bench-password"
+
+LOGIN_DOCUMENT = """
+    mutation Login($username: String!, $password: String!) {
+        login(input: {username: $username, password: $password}) {
+            accessToken
+            tokenType
+            user { id username email fullName isActive role }
+        }
+    }
+"""
+
+
+async def bridge_login(login_request: LoginRequest) -> dict:
+    """The previous implementation of api_login, minus its error mapping."""
+    schema = strawberry.Schema(query=Query, mutation=Mutation)
+    result = await schema.execute(
+        LOGIN_DOCUMENT,
+        variable_values={"username": login_request.username, "password": login_request.password},
+    )
+    if result.errors:
+        raise RuntimeError(result.errors[0].message)
+    return result.data["login"]
+
+
+async def seed_user() -> None:
+    users = get_users_collection()
+    await users.delete_many({"username": USERNAME})
+    now = datetime.utcnow()
+    await users.insert_one({
+        "email": f"{USERNAME}@example.com", "username": USERNAME, "full_name": "Bench Login", "role": "user",
+        "hashed_password": pwd_context.using(rounds=4).hash(PASSWORD),
+        "is_active": True, "created_at": now, "updated_at": now,
+    })
+
+
+async def run(login, requests: int, concurrency: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+    login_request = LoginRequest(username=USERNAME, password=PASSWORD)
+
+    async def one():
+        async with semaphore:
+            await login(login_request)
+
+    with Timer() as timer:
+        await asyncio.gather(*(one() for _ in range(requests)))
+    return timer.elapsed
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+
+    await seed_user()
+    results = []
+    for name, login in (("graphql bridge", bridge_login), ("direct auth service", api_login)):
+        await run(login, min(20, args.requests), args.concurrency)  # warm-up
+        elapsed = await run(login, args.requests, args.concurrency)
+        results.append({"path": name, "requests": args.requests, "elapsed_s": elapsed, "req_per_s": args.requests / elapsed})
+    print_table("/api-login/ throughput", results)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
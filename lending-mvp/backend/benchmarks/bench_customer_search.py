@@ -0,0 +1,80 @@
+"""
+Customer type-ahead latency as the collection grows: the previous unanchored
+case-insensitive $regex versus the indexed token search (customerPicker).
+
+    python -m benchmarks.bench_customer_search [--sizes 10000 100000 1000000] [--repeat 20]
+"""
+import argparse
+import asyncio
+import random
+from datetime import datetime, timezone
+
+from ._support import Timer, print_table, summarize
+
+from app.database import get_customers_collection
+from app.database.customer_crud import CustomerCRUD, build_search_fields
+from app.database.indexes import INDEX_CATALOG
+
+FIRST_NAMES = ["maria", "jose", "juan", "ana", "pedro", "rosa", "carlo", "liza", "mark", "joy"]
+LAST_NAMES = ["santos", "reyes", "cruz", "bautista", "garcia", "mendoza", "torres", "flores", "ramos", "rivera"]
+TERMS = ["ma", "jose", "cruz", "rosa gar", "tor"]
+
+
+async def grow_to(size: int) -> None:
+    customers = get_customers_collection()
+    existing = await customers.estimated_document_count()
+    now = datetime.now(timezone.utc)
+    rng = random.Random(existing)
+    batch = []
+    for i in range(existing, size):
+        name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {i}"
+        email = f"customer{i}@example.com"
+        batch.append({"customer_type": "individual", "display_name": name, "email_address": email, "branch": "Madrid",
+                      "created_at": now, "updated_at": now, **build_search_fields(name, email)})
+        if len(batch) == 10_000:
+            await customers.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        await customers.insert_many(batch, ordered=False)
+
+
+async def regex_search(term: str) -> None:
+    query = {"$or": [
+        {"display_name": {"$regex": term, "$options": "i"}},
+        {"email_address": {"$regex": term, "$options": "i"}},
+    ]}
+    await get_customers_collection().find(query).limit(10).to_list(length=10)
+    await get_customers_collection().count_documents(query)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    customers = get_customers_collection()
+    await customers.delete_many({})
+    await customers.create_indexes(INDEX_CATALOG["customers"])
+    customer_crud = CustomerCRUD(customers)
+
+    results = []
+    for size in sorted(args.sizes):
+        await grow_to(size)
+        regex_samples, picker_samples = [], []
+        for i in range(args.repeat):
+            term = TERMS[i % len(TERMS)]
+            with Timer() as timer:
+                await regex_search(term)
+            regex_samples.append(timer.elapsed)
+            with Timer() as timer:
+                await customer_crud.get_customer_picker(term, limit=10)
+            picker_samples.append(timer.elapsed)
+        results.append({"customers": size, "method": "$regex + count", **summarize(regex_samples)})
+        results.append({"customers": size, "method": "token picker", **summarize(picker_samples)})
+
+    print_table("customer type-ahead", results)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
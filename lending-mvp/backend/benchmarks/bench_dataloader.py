@@ -0,0 +1,113 @@
+"""
+Round trips and latency for resolving borrower/customer fields on a 100-row page,
+per-row CRUD lookups (before) versus the per-request DataLoaders (after).
+
+    python -m benchmarks.bench_dataloader [--rows 100] [--repeat 20]
+"""
+import argparse
+import asyncio
+from datetime import datetime, timezone
+
+from ._support import Timer, command_counter, print_table, summarize
+
+from app.database import get_customers_collection, get_loans_collection, get_loan_transactions_collection
+from app.database.customer_crud import CustomerCRUD
+from app.database.loan_crud import LoanCRUD
+from app.dataloaders import create_loaders
+
+
+async def seed(rows: int) -> None:
+    customers = get_customers_collection()
+    loans = get_loans_collection()
+    transactions = get_loan_transactions_collection()
+    for collection in (customers, loans, transactions):
+        await collection.delete_many({})
+
+    now = datetime.now(timezone.utc)
+    customer_ids = (await customers.insert_many([
+        {"customer_type": "individual", "display_name": f"Bench Customer {i}", "email_address": f"bench{i}@example.com",
+         "branch": "Madrid", "created_at": now, "updated_at": now}
+        for i in range(rows)
+    ])).inserted_ids
+    loan_ids = (await loans.insert_many([
+        {"borrower_id": customer_id, "amount_requested": 1000.0, "term_months": 12, "interest_rate": 12.0,
+         "status": "active", "created_at": now, "updated_at": now}
+        for customer_id in customer_ids
+    ])).inserted_ids
+    await transactions.insert_many([
+        {"loanId": str(loan_id), "transactionType": "repayment", "amount": 100.0, "transactionDate": now,
+         "createdAt": now, "updatedAt": now}
+        for loan_id in loan_ids
+    ])
+
+
+async def loans_page_per_row(rows: int) -> None:
+    loans = await LoanCRUD(get_loans_collection()).get_loans(limit=rows)
+    customer_crud = CustomerCRUD(get_customers_collection())
+    # borrowerName and customer each resolved their own customer
+    await asyncio.gather(*(
+        customer_crud.get_customer_by_id(str(loan.borrower_id)) for loan in loans for _ in range(2)
+    ))
+
+
+async def loans_page_batched(rows: int) -> None:
+    loaders = create_loaders()
+    loans = await LoanCRUD(get_loans_collection()).get_loans(limit=rows)
+    await asyncio.gather(*(
+        loaders["customer_loader"].load(str(loan.borrower_id)) for loan in loans for _ in range(2)
+    ))
+
+
+async def transactions_page_per_row(rows: int) -> None:
+    transactions = await get_loan_transactions_collection().find().limit(rows).to_list(length=rows)
+    loan_crud = LoanCRUD(get_loans_collection())
+    customer_crud = CustomerCRUD(get_customers_collection())
+
+    async def borrower_name(transaction):
+        loan = await loan_crud.get_loan_by_id(transaction["loanId"])
+        if loan:
+            await customer_crud.get_customer_by_id(str(loan.borrower_id))
+
+    await asyncio.gather(*(borrower_name(t) for t in transactions))
+
+
+async def transactions_page_batched(rows: int) -> None:
+    loaders = create_loaders()
+    transactions = await get_loan_transactions_collection().find().limit(rows).to_list(length=rows)
+
+    async def borrower_name(transaction):
+        loan = await loaders["loan_loader"].load(transaction["loanId"])
+        if loan:
+            await loaders["customer_loader"].load(str(loan.borrower_id))
+
+    await asyncio.gather(*(borrower_name(t) for t in transactions))
+
+
+async def measure(name: str, page, rows: int, repeat: int) -> dict:
+    samples = []
+    command_counter.reset()
+    for _ in range(repeat):
+        with Timer() as timer:
+            await page(rows)
+        samples.append(timer.elapsed)
+    return {"scenario": name, "round_trips": command_counter.reset() / repeat, **summarize(samples)}
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    await seed(args.rows)
+    results = [
+        await measure("loans: per-row lookups", loans_page_per_row, args.rows, args.repeat),
+        await measure("loans: dataloader", loans_page_batched, args.rows, args.repeat),
+        await measure("loanTransactions: per-row lookups", transactions_page_per_row, args.rows, args.repeat),
+        await measure("loanTransactions: dataloader", transactions_page_batched, args.rows, args.repeat),
+    ]
+    print_table(f"{args.rows}-row page, {args.repeat} runs", results)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
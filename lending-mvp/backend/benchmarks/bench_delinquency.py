@@ -0,0 +1,115 @@
+"""
+Loan delinquency aging (delinquency_service.refresh_delinquency). Seeds --loans
+active loans without repayments, originated over the --days before a fixed date,
+ages them all once (rebuild, as a backfill would), then runs the nightly pass for
+the next few days: each touches only the loans that fell due or crossed a bucket
+boundary that day. Finally reads PAR30/PAR90 from the aging rollups against an
+aggregation over the loans. Transactions need a replica set, e.g.
+BENCH_DATABASE_URL=mongodb://localhost:27017/?replicaSet=rs0.
+
+    python -m benchmarks.bench_delinquency [--loans 200000] [--days 400]
+"""
+import argparse
+import asyncio
+from datetime import date, datetime, timedelta
+
+from bson import Decimal128, ObjectId
+
+from ._support import Timer, command_counter, print_table
+
+from app.database import get_loans_collection, get_job_runs_collection, get_portfolio_rollups_collection
+from app.database.indexes import INDEX_CATALOG
+from app.database.portfolio_rollup_crud import PortfolioRollupCRUD
+from app.services import delinquency_service
+
+AS_OF = date(1990, 6, 1)
+NIGHTS = 3
+
+
+def loan(i: int, run_id: str, days: int) -> dict:
+    created_at = datetime.combine(AS_OF, datetime.min.time()) - timedelta(days=i % days)
+    return {
+        "borrower_id": ObjectId(), "loanId": f"bench-{run_id}-{i}", "amount_requested": Decimal128(f"{10_000 + (i * 7919) % 490_000}"),
+        "term_months": 12 + i % 25, "interest_rate": Decimal128("18"), "status": "active", "branch": "bench",
+        "created_at": created_at, "updated_at": created_at,
+    }
+
+
+async def seed(count: int, run_id: str, days: int) -> None:
+    for start in range(0, count, 10_000):
+        await get_loans_collection().insert_many([loan(i, run_id, days) for i in range(start, min(count, start + 10_000))])
+
+
+async def run(as_of: date, rebuild: bool, batch_size: int) -> dict:
+    command_counter.reset()
+    with Timer() as timer:
+        result = await delinquency_service.refresh_delinquency(as_of, batch_size=batch_size, rebuild=rebuild)
+    commands = command_counter.reset()
+    return {
+        "date": as_of.isoformat(),
+        "mode": "rebuild" if rebuild else "nightly",
+        "status": result["status"],
+        "loans_touched": result.get("loans", 0),
+        "moved": result.get("moved", 0),
+        "commands": commands,
+        "elapsed_s": timer.elapsed,
+    }
+
+
+async def par_from_loans() -> dict:
+    """The same totals computed from the loans, as a report without rollups would."""
+    buckets = {}
+    async for row in get_loans_collection().aggregate([
+        {"$match": {"status": "active"}},
+        {"$group": {"_id": "$aging_bucket", "loans": {"$sum": 1}, "amount": {"$sum": "$amount_requested"}}},
+    ]):
+        buckets[row["_id"]] = row
+    return buckets
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--loans", type=int, default=200_000)
+    parser.add_argument("--days", type=int, default=400)
+    parser.add_argument("--batch-size", type=int, default=2_000)
+    args = parser.parse_args()
+
+    await get_loans_collection().create_indexes(INDEX_CATALOG["loans"])
+    nights = [AS_OF + timedelta(days=night) for night in range(1, NIGHTS + 1)]
+    run_keys = [f"{delinquency_service.DELINQUENCY_JOB}:{AS_OF.isoformat()}:rebuild"] + [
+        f"{delinquency_service.DELINQUENCY_JOB}:{night.isoformat()}" for night in nights
+    ]
+    await get_job_runs_collection().delete_many({"_id": {"$in": run_keys}})
+    run_id = str(ObjectId())[-6:]
+    await seed(args.loans, run_id, args.days)
+
+    results = [await run(AS_OF, True, args.batch_size)]
+    results += [await run(night, False, args.batch_size) for night in nights]
+    results.append(await run(nights[-1], False, args.batch_size))
+
+    rollup_crud = PortfolioRollupCRUD(get_portfolio_rollups_collection())
+    with Timer() as rollup_timer:
+        par = await rollup_crud.get_portfolio_at_risk()
+    with Timer() as aggregate_timer:
+        await par_from_loans()
+
+    # Take the seeded loans back out of the aging rollups (they have no balances)
+    bench_loans = {"loanId": {"$regex": f"^bench-{run_id}-"}}
+    moves = []
+    async for loan_data in get_loans_collection().find(bench_loans, {"aging_bucket": 1, "amount_requested": 1}):
+        moves.append((loan_data.get("aging_bucket"), None, {"amount_requested": loan_data["amount_requested"]}))
+    for start in range(0, len(moves), 10_000):
+        await rollup_crud.move_aging(moves[start:start + 10_000])
+    await get_loans_collection().delete_many(bench_loans)
+    await get_job_runs_collection().delete_many({"_id": {"$in": run_keys}})
+
+    print_table(f"{args.loans} active loans originated over {args.days} days, batches of {args.batch_size}", results)
+    print_table("portfolio at risk", [
+        {"source": "aging rollups", "elapsed_ms": rollup_timer.elapsed * 1000},
+        {"source": "aggregation over loans", "elapsed_ms": aggregate_timer.elapsed * 1000},
+    ])
+    print("loans per aging bucket: " + ", ".join(f"{bucket['key']} {bucket.get('loan_count', 0)}" for bucket in par["buckets"]))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,85 @@
+"""
+Batch disbursement throughput (loan_service.disburse_loans) at different
+concurrency limits. Each run seeds --loans approved loans, disburses them all and
+checks that every loan ended up active with exactly one balanced pair of ledger
+lines and one disbursement loan transaction. A second pass over the same loans
+shows that re-running a batch is a no-op. Transactions need a replica set, e.g.
+BENCH_DATABASE_URL=mongodb://localhost:27017/?replicaSet=rs0.
+
+    python -m benchmarks.bench_disbursement [--loans 2000] [--concurrency 1,8,32,128]
+"""
+import argparse
+import asyncio
+from datetime import datetime
+
+from bson import Decimal128, ObjectId
+
+from ._support import Timer, command_counter, print_table
+
+from app.database import (
+    get_loans_collection, get_ledger_collection, get_loan_transactions_collection, get_loan_balances_collection,
+    get_portfolio_rollups_collection, get_account_balances_collection,
+)
+from app.database.indexes import INDEX_CATALOG
+from app.services import accounting_service, loan_service
+
+
+async def seed_loans(count: int, product: str):
+    now = datetime.utcnow()
+    result = await get_loans_collection().insert_many([{
+        "borrower_id": ObjectId(), "loanProduct": product, "amount_requested": Decimal128("25000.00"),
+        "term_months": 12, "interest_rate": Decimal128("18"), "status": "approved",
+        "created_at": now, "updated_at": now,
+    } for _ in range(count)])
+    return result.inserted_ids
+
+
+async def run(loans: int, concurrency: int) -> dict:
+    product = f"BENCH-{ObjectId()}"
+    loan_ids = await seed_loans(loans, product)
+    query = loan_service.disbursement_filter(loan_product=product)
+
+    command_counter.reset()
+    with Timer() as timer:
+        results = await loan_service.disburse_loans(query, limit=loans, concurrency=concurrency)
+    commands = command_counter.reset()
+
+    rerun = await loan_service.disburse_loans({"_id": {"$in": loan_ids}}, limit=loans, concurrency=concurrency)
+    tx_ids = [f"{accounting_service.DISBURSEMENT_PREFIX}{loan_id}" for loan_id in loan_ids]
+    active = await get_loans_collection().count_documents({"_id": {"$in": loan_ids}, "status": "active"})
+    lines = await get_ledger_collection().count_documents({"transaction_id": {"$in": tx_ids}})
+    recorded = await get_loan_transactions_collection().count_documents({"referenceNumber": {"$in": tx_ids}})
+
+    await get_loans_collection().delete_many({"_id": {"$in": loan_ids}})
+    await get_ledger_collection().delete_many({"transaction_id": {"$in": tx_ids}})
+    await get_loan_transactions_collection().delete_many({"referenceNumber": {"$in": tx_ids}})
+    await get_loan_balances_collection().delete_many({"_id": {"$in": [str(loan_id) for loan_id in loan_ids]}})
+    return {
+        "concurrency": concurrency,
+        "loans_per_min": loans / timer.elapsed * 60,
+        "commands_per_loan": commands / loans,
+        "disbursed": sum(1 for result in results if result["status"] == "disbursed"),
+        "failed": sum(1 for result in results if result["status"] == "failed"),
+        "consistent": active == loans and lines == 2 * loans and recorded == loans,
+        "rerun_noop": not any(result["status"] == "disbursed" for result in rerun),
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--loans", type=int, default=2_000)
+    parser.add_argument("--concurrency", default="1,8,32,128")
+    args = parser.parse_args()
+
+    await get_ledger_collection().create_indexes(INDEX_CATALOG["ledger_entries"])
+    await get_loan_transactions_collection().create_indexes(INDEX_CATALOG["loan_transactions"])
+    results = [await run(args.loans, int(limit)) for limit in args.concurrency.split(",")]
+    # Disbursements also moved the benchmark loans through the rollups and account balances
+    await get_portfolio_rollups_collection().delete_many({})
+    await get_account_balances_collection().delete_many({"_id": {"$in": ["Loans Receivable", "Cash"]}})
+
+    print_table(f"{args.loans} approved loans", results)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,93 @@
+"""
+Streaming ledger export (export_service.export_ledger_entries) at different cursor
+batch sizes, against loading the same rows with to_list as the GraphQL list
+resolvers do. Seeds --rows ledger entries and exports them as CSV and NDJSON. Peak
+RSS is process-wide and only grows, so the to_list baseline runs last.
+
+    python -m benchmarks.bench_export [--rows 500000] [--batch-sizes 100,1000,5000]
+"""
+import argparse
+import asyncio
+import resource
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from ._support import Timer, command_counter, print_table
+
+from app.database import get_ledger_collection
+from app.database.indexes import INDEX_CATALOG
+from app.services import export_service
+
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def seed(rows: int, run_id: str, start: datetime) -> None:
+    for offset in range(0, rows, 10_000):
+        await get_ledger_collection().insert_many([{
+            "transaction_id": f"bench-{run_id}-{i // 2}", "line_no": i % 2, "account": ("Cash", "Loans Receivable")[i % 2],
+            "entry_type": ("debit", "credit")[i % 2], "amount": 125.5, "timestamp": start + timedelta(seconds=i),
+            "loan_id": f"bench-{run_id}-{i % 100}",
+        } for i in range(offset, min(rows, offset + 10_000))])
+
+
+async def run(file_format: str, batch_size: int, start: datetime, end: datetime, rows: int) -> dict:
+    command_counter.reset()
+    exported = size = 0
+    with Timer() as timer:
+        async for chunk in export_service.export_ledger_entries(file_format, start, end, batch_size=batch_size):
+            exported += chunk.count("\n")
+            size += len(chunk)
+    commands = command_counter.reset()
+    return {
+        "mode": f"stream {file_format}",
+        "batch_size": batch_size,
+        "rows_per_s": rows / timer.elapsed,
+        "mb": size / 1e6,
+        "commands": commands,
+        "complete": exported - (1 if file_format == "csv" else 0) == rows,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+async def run_to_list(start: datetime, end: datetime, rows: int) -> dict:
+    with Timer() as timer:
+        docs = await get_ledger_collection().find({"timestamp": {"$gte": start, "$lt": end}}).to_list(length=None)
+    return {
+        "mode": "to_list",
+        "batch_size": "-",
+        "rows_per_s": rows / timer.elapsed,
+        "mb": "-",
+        "commands": "-",
+        "complete": len(docs) == rows,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=500_000)
+    parser.add_argument("--batch-sizes", default="100,1000,5000")
+    args = parser.parse_args()
+
+    await get_ledger_collection().create_indexes(INDEX_CATALOG["ledger_entries"])
+    run_id = str(ObjectId())
+    # A date range of its own keeps other ledger data out of the export
+    start = datetime(1990, 1, 1)
+    end = start + timedelta(seconds=args.rows)
+    await seed(args.rows, run_id, start)
+
+    results = []
+    for file_format in export_service.EXPORT_FORMATS:
+        for size in args.batch_sizes.split(","):
+            results.append(await run(file_format, int(size), start, end, args.rows))
+    results.append(await run_to_list(start, end, args.rows))
+    await get_ledger_collection().delete_many({"transaction_id": {"$regex": f"^bench-{run_id}-"}})
+
+    print_table(f"{args.rows} ledger entries", results)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,124 @@
+"""
+Savings interest accrual (interest_service.accrue_savings_interest). Seeds
+--accounts active accounts (regular, daily/monthly high-yield with and without
+tiers, time deposits) and runs a mid-month date (accrual only) and a month end
+(monthly postings with their ledger entries), then the month end again to show the
+run is skipped. Also times the NumPy accrual of one batch against the same
+arithmetic done per account with Decimal. Transactions need a replica set, e.g.
+BENCH_DATABASE_URL=mongodb://localhost:27017/?replicaSet=rs0.
+
+    python -m benchmarks.bench_interest_accrual [--accounts 200000] [--batch-size 5000]
+"""
+import argparse
+import asyncio
+from datetime import date, datetime, time
+from decimal import Decimal, ROUND_DOWN, ROUND_HALF_UP
+
+from bson import Decimal128, ObjectId
+
+from ._support import Timer, command_counter, print_table
+
+from app.database import get_savings_collection, get_ledger_collection, get_job_runs_collection, get_account_balances_collection
+from app.database.indexes import INDEX_CATALOG
+from app.database.savings_crud import SavingsCRUD
+from app.services import interest_service
+
+MID_MONTH = date(1990, 1, 15)
+MONTH_END = date(1990, 1, 31)
+TIERS = [{"min_balance": Decimal128("10000"), "rate": Decimal128("4.5")}, {"min_balance": Decimal128("100000"), "rate": Decimal128("5.25")}]
+
+
+def account(i: int, run_id: str) -> dict:
+    now = datetime(1990, 1, 1)
+    base = {
+        "account_number": f"BENCH{run_id}{i:08d}", "user_id": ObjectId(), "balance": Decimal128(f"{1000 + (i * 7919) % 500000}.{i % 100:02d}"),
+        "currency": "PHP", "status": "active", "opened_at": now, "created_at": now, "updated_at": now,
+        "accrued_interest": Decimal128("0"), "last_accrual_date": None,
+    }
+    kind = i % 4
+    if kind == 0:
+        return {**base, "type": "regular", "min_balance": 500.0, "interest_rate": 0.25}
+    if kind == 1:
+        return {**base, "type": "high_yield", "interest_rate": 4.0, "interest_paid_frequency": "daily", "tiers": None}
+    if kind == 2:
+        return {**base, "type": "high_yield", "interest_rate": 4.0, "interest_paid_frequency": "monthly", "tiers": TIERS}
+    return {**base, "type": "time_deposit", "principal": 50000.0, "term_days": 360, "maturity_date": datetime(1990, 12, 27), "interest_rate": 6.0}
+
+
+def decimal_accrual(accounts, accrual_date: date) -> list:
+    """The same accrual one account at a time with Decimal, as a baseline."""
+    results = []
+    for acc in accounts:
+        balance = Decimal(acc["balance_cents"]) / 100
+        rate = Decimal(acc["rate_units"] or 0) / interest_service.RATE_SCALE
+        for tier in acc.get("tiers") or []:
+            if acc["balance_cents"] >= tier["min_cents"]:
+                rate = Decimal(tier["rate_units"]) / interest_service.RATE_SCALE
+        if acc["type"] == "regular" and acc["balance_cents"] < (acc.get("min_balance_cents") or 50_000):
+            rate = Decimal("0")
+        daily = (balance * rate / 100 / interest_service.DAYS_PER_YEAR).quantize(Decimal("0.000001"), rounding=ROUND_HALF_UP)
+        total = Decimal(acc["accrued_micros"]).scaleb(-6) + daily
+        frequency = acc.get("interest_paid_frequency") or interest_service.POSTING_FREQUENCIES[acc["type"]]
+        posted = total.quantize(Decimal("0.01"), rounding=ROUND_DOWN) if interest_service.is_posting_day(accrual_date, frequency) else Decimal("0")
+        results.append((daily, posted, total - posted))
+    return results
+
+
+async def seed(count: int, run_id: str) -> None:
+    for start in range(0, count, 10_000):
+        await get_savings_collection().insert_many([account(i, run_id) for i in range(start, min(count, start + 10_000))])
+
+
+async def run(accrual_date: date, batch_size: int, accounts: int) -> dict:
+    command_counter.reset()
+    with Timer() as timer:
+        result = await interest_service.accrue_savings_interest(accrual_date, batch_size=batch_size)
+    commands = command_counter.reset()
+    return {
+        "date": accrual_date.isoformat(),
+        "status": result["status"],
+        "accounts": result.get("accounts", 0),
+        "accounts_per_s": accounts / timer.elapsed,
+        "commands": commands,
+        "posted_accounts": result.get("posted_accounts", 0),
+        "elapsed_s": timer.elapsed,
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--accounts", type=int, default=200_000)
+    parser.add_argument("--batch-size", type=int, default=5_000)
+    args = parser.parse_args()
+
+    await get_savings_collection().create_indexes(INDEX_CATALOG["savings"])
+    await get_ledger_collection().create_indexes(INDEX_CATALOG["ledger_entries"])
+    run_keys = [f"{interest_service.ACCRUAL_JOB}:{day.isoformat()}" for day in (MID_MONTH, MONTH_END)]
+    await get_job_runs_collection().delete_many({"_id": {"$in": run_keys}})
+    run_id = str(ObjectId())[-6:]
+    await seed(args.accounts, run_id)
+
+    batch = await SavingsCRUD(get_savings_collection()).accrual_batch(datetime.combine(MID_MONTH, time()), limit=args.batch_size)
+    with Timer() as numpy_timer:
+        interest_service.accrual_arrays(batch, MID_MONTH)
+    with Timer() as decimal_timer:
+        decimal_accrual(batch, MID_MONTH)
+
+    results = [await run(day, args.batch_size, args.accounts) for day in (MID_MONTH, MONTH_END, MONTH_END)]
+    ledger_lines = await get_ledger_collection().count_documents({"transaction_id": {"$regex": "^savings-interest-"}})
+
+    await get_savings_collection().delete_many({"account_number": {"$regex": f"^BENCH{run_id}"}})
+    await get_ledger_collection().delete_many({"transaction_id": {"$regex": "^savings-interest-"}})
+    await get_job_runs_collection().delete_many({"_id": {"$in": run_keys}})
+    await get_account_balances_collection().delete_many({"_id": {"$in": [interest_service.INTEREST_EXPENSE_ACCOUNT, interest_service.SAVINGS_DEPOSITS_ACCOUNT]}})
+
+    print_table(f"{args.accounts} savings accounts, batches of {args.batch_size}", results)
+    print_table(f"accrual arithmetic for one batch of {len(batch)}", [
+        {"engine": "numpy", "accounts_per_s": len(batch) / numpy_timer.elapsed},
+        {"engine": "decimal loop", "accounts_per_s": len(batch) / decimal_timer.elapsed},
+    ])
+    print(f"ledger lines written: {ledger_lines}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
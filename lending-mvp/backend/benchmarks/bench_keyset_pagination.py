@@ -0,0 +1,86 @@
+"""
+Page latency at deep offsets: skip/limit (LoanCRUD.get_loans) versus keyset
+cursors (LoanCRUD.get_loans_page).
+
+Seeds --total loans on the first run (re-used afterwards) and creates the
+(created_at, _id) index the connection field relies on.
+
+    python -m benchmarks.bench_keyset_pagination [--total 510000] [--page 50] [--repeat 10]
+"""
+import argparse
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from pymongo import DESCENDING
+
+from ._support import Timer, print_table, summarize
+
+from app.database import get_loans_collection
+from app.database.loan_crud import LoanCRUD
+from app.database.pagination import encode_cursor
+
+OFFSETS = (0, 10_000, 500_000)
+
+
+async def seed(total: int) -> None:
+    loans = get_loans_collection()
+    existing = await loans.estimated_document_count()
+    if existing >= total:
+        return
+    await loans.delete_many({})
+    start = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    batch = []
+    for i in range(total):
+        batch.append({
+            "borrower_id": f"bench-borrower-{i % 5000}", "amount_requested": 1000.0, "term_months": 12,
+            "interest_rate": 12.0, "status": "active", "created_at": start + timedelta(seconds=i),
+            "updated_at": start,
+        })
+        if len(batch) == 10_000:
+            await loans.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        await loans.insert_many(batch, ordered=False)
+    await loans.create_index([("created_at", DESCENDING), ("_id", DESCENDING)])
+
+
+async def cursor_at(offset: int) -> str:
+    """Cursor of the document just before `offset` (setup only, not timed)."""
+    if offset == 0:
+        return None
+    doc = await get_loans_collection().find({}, {"created_at": 1}).sort(
+        [("created_at", DESCENDING), ("_id", DESCENDING)]
+    ).skip(offset - 1).limit(1).to_list(length=1)
+    return encode_cursor(doc[0]["created_at"], doc[0]["_id"])
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--total", type=int, default=510_000)
+    parser.add_argument("--page", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    await seed(args.total)
+    loan_crud = LoanCRUD(get_loans_collection())
+    results = []
+    for offset in OFFSETS:
+        if offset >= args.total:
+            continue
+        after = await cursor_at(offset)
+        skip_samples, keyset_samples = [], []
+        for _ in range(args.repeat):
+            with Timer() as timer:
+                await loan_crud.get_loans(skip=offset, limit=args.page)
+            skip_samples.append(timer.elapsed)
+            with Timer() as timer:
+                await loan_crud.get_loans_page(first=args.page, after=after)
+            keyset_samples.append(timer.elapsed)
+        results.append({"offset": offset, "method": "skip/limit", **summarize(skip_samples)})
+        results.append({"offset": offset, "method": "keyset", **summarize(keyset_samples)})
+
+    print_table(f"{args.page}-row loan pages over {args.total} loans", results)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
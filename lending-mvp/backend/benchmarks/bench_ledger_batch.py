@@ -0,0 +1,74 @@
+"""
+Journal posting throughput of accounting_service.post_transactions_batch at
+different batch sizes: 1 (one transaction per journal entry, as post_transaction
+does), 100 and 5000. Each run posts --entries two-line entries, then posts the same
+batch again to show that the retry is skipped as duplicates. Transactions need a
+replica set, e.g. BENCH_DATABASE_URL=mongodb://localhost:27017/?replicaSet=rs0.
+
+    python -m benchmarks.bench_ledger_batch [--entries 20000] [--batch-sizes 1,100,5000]
+"""
+import argparse
+import asyncio
+from decimal import Decimal
+
+from bson import ObjectId
+
+from ._support import Timer, command_counter, print_table
+
+from app.database import get_ledger_collection, get_account_balances_collection
+from app.database.indexes import INDEX_CATALOG
+from app.services import accounting_service
+
+ACCOUNTS = ("Interest Receivable", "Interest Income", "Fees Receivable", "Fee Income")
+
+
+def make_entries(count: int, run_id: str):
+    return [
+        accounting_service.journal_entry(
+            ACCOUNTS[(i % 2) * 2], ACCOUNTS[(i % 2) * 2 + 1], Decimal("12.34"), f"bench-{run_id}-{i}"
+        )
+        for i in range(count)
+    ]
+
+
+async def run(entries_count: int, batch_size: int) -> dict:
+    run_id = str(ObjectId())
+    entries = make_entries(entries_count, run_id)
+
+    command_counter.reset()
+    with Timer() as timer:
+        for start in range(0, len(entries), batch_size):
+            await accounting_service.post_transactions_batch(entries[start:start + batch_size], chunk_size=batch_size)
+    commands = command_counter.reset()
+
+    with Timer() as retry_timer:
+        retry = await accounting_service.post_transactions_batch(entries, chunk_size=max(batch_size, 1000))
+
+    lines = await get_ledger_collection().count_documents({"transaction_id": {"$regex": f"^bench-{run_id}-"}})
+    await get_ledger_collection().delete_many({"transaction_id": {"$regex": f"^bench-{run_id}-"}})
+    return {
+        "batch_size": batch_size,
+        "entries_per_s": entries_count / timer.elapsed,
+        "commands_per_entry": commands / entries_count,
+        "retry_s": retry_timer.elapsed,
+        "retry_skipped": retry["duplicates"] == entries_count and retry["posted"] == 0,
+        "lines_written": lines,
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--entries", type=int, default=20_000)
+    parser.add_argument("--batch-sizes", default="1,100,5000")
+    args = parser.parse_args()
+
+    await get_ledger_collection().create_indexes(INDEX_CATALOG["ledger_entries"])
+    results = [await run(args.entries, int(size)) for size in args.batch_sizes.split(",")]
+    # The benchmark's postings went through account_balances too; drop them with the entries
+    await get_account_balances_collection().delete_many({"_id": {"$in": list(ACCOUNTS)}})
+
+    print_table(f"{args.entries} two-line journal entries", results)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
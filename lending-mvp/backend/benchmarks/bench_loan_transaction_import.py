@@ -0,0 +1,109 @@
+"""
+Bulk loan transaction import (loan_transaction_import_service) from a synthetic
+fixed-width collection file, at different chunk sizes. The file is generated on the
+fly and streamed in, so --rows 1000000 needs no disk space; peak RSS shows that
+memory stays flat however large the file is. Each run imports --rows repayments
+spread over --loans seeded loans, then imports the same file again to show that
+every row is skipped as a duplicate. Transactions need a replica set, e.g.
+BENCH_DATABASE_URL=mongodb://localhost:27017/?replicaSet=rs0.
+
+    python -m benchmarks.bench_loan_transaction_import [--rows 100000] [--loans 1000] [--chunk-sizes 100,1000,5000]
+"""
+import argparse
+import asyncio
+import resource
+from datetime import datetime
+
+from bson import Decimal128, ObjectId
+
+from ._support import Timer, command_counter, print_table
+
+from app.database import get_loans_collection, get_loan_transactions_collection, get_loan_balances_collection, get_portfolio_rollups_collection
+from app.database.indexes import INDEX_CATALOG
+from app.database.loan_transaction_crud import LoanTransactionCRUD
+from app.services import loan_transaction_import_service
+
+
+async def collection_file(rows: int, loan_ids, run_id: str):
+    """A fixed-width file in DEFAULT_FIXED_WIDTH_LAYOUT, yielded in 64KB-ish chunks."""
+    yield b"H" + b"COLLECTIONS".ljust(139) + b"\n"
+    lines = []
+    for i in range(rows):
+        lines.append(
+            f"D{f'{run_id}-{i}':<20}{loan_ids[i % len(loan_ids)]:<24}20240131{'1250.00':>15}"
+            f"{i:<12}{'BENCH BANK':<30}{'MAIN':<30}\n"
+        )
+        if len(lines) == 400:
+            yield "".join(lines).encode()
+            lines = []
+    yield ("".join(lines) + "T" + str(rows).rjust(139) + "\n").encode()
+
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def run_import(rows: int, loan_ids, run_id: str, chunk_size: int) -> dict:
+    crud = LoanTransactionCRUD(get_loan_transactions_collection())
+    summary = {}
+    async for event in loan_transaction_import_service.import_loan_transactions(
+        collection_file(rows, loan_ids, run_id), "fixed", crud, chunk_size=chunk_size
+    ):
+        if event["event"] == "summary":
+            summary = event
+    return summary
+
+
+async def run(rows: int, loans: int, chunk_size: int) -> dict:
+    run_id = str(ObjectId())[-8:]
+    now = datetime.utcnow()
+    loan_ids = [f"BENCH-{run_id}-{i}" for i in range(loans)]
+    await get_loans_collection().insert_many([{
+        "loanId": loan_id, "borrower_id": ObjectId(), "loanProduct": "BENCH", "amount_requested": Decimal128("25000.00"),
+        "term_months": 12, "interest_rate": Decimal128("18"), "status": "active",
+        "created_at": now, "updated_at": now,
+    } for loan_id in loan_ids])
+
+    command_counter.reset()
+    with Timer() as timer:
+        summary = await run_import(rows, loan_ids, run_id, chunk_size)
+    commands = command_counter.reset()
+    with Timer() as rerun_timer:
+        rerun = await run_import(rows, loan_ids, run_id, chunk_size)
+
+    balance = await get_loan_balances_collection().find_one({"_id": loan_ids[0]})
+    expected_repaid = (rows // loans + (1 if rows % loans else 0)) * 1250
+    await get_loan_transactions_collection().delete_many({"referenceNumber": {"$regex": f"^{run_id}-"}})
+    await get_loan_balances_collection().delete_many({"_id": {"$in": loan_ids}})
+    await get_loans_collection().delete_many({"loanId": {"$in": loan_ids}})
+    return {
+        "chunk_size": chunk_size,
+        "rows_per_s": summary["rows_per_s"],
+        "commands_per_row": commands / rows,
+        "inserted": summary["inserted"],
+        "rerun_s": rerun_timer.elapsed,
+        "rerun_skipped": rerun["duplicates"] == rows and rerun["inserted"] == 0,
+        "balances_ok": balance is not None and balance["total_repaid"] == expected_repaid,
+        "peak_rss_mb": peak_rss_mb(),
+        "elapsed_s": timer.elapsed,
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--loans", type=int, default=1_000)
+    parser.add_argument("--chunk-sizes", default="100,1000,5000")
+    args = parser.parse_args()
+
+    await get_loan_transactions_collection().create_indexes(INDEX_CATALOG["loan_transactions"])
+    await get_loans_collection().create_indexes(INDEX_CATALOG["loans"])
+    results = [await run(args.rows, args.loans, int(size)) for size in args.chunk_sizes.split(",")]
+    # The imported repayments also moved the rollups of the benchmark loans
+    await get_portfolio_rollups_collection().delete_many({})
+
+    print_table(f"{args.rows} fixed-width rows over {args.loans} loans", results)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,103 @@
+"""
+p99 latency of an unrelated GraphQL query while a storm of logins is in flight.
+
+The app is driven in-process through httpx's ASGI transport, so bcrypt work that
+blocks the event loop shows up directly in the probe latency. Scenarios:
+
+    idle           probe only
+    inline bcrypt  storm that verifies passwords on the event loop (previous behaviour)
+    executor       storm through /api-login/ (bcrypt on the hashing executor)
+
+    python -m benchmarks.bench_login_storm [--logins 200] [--concurrency 50] [--probes 200]
+"""
+import argparse
+import asyncio
+
+import httpx
+
+from ._support import Timer, print_table, summarize
+
+from app.main import app
+from app.auth.security import verify_password
+from app.database import get_users_collection
+from app.database.crud import UserCRUD
+from app.models import UserCreate
+
+USERNAME = "bench-admin"
+PASSWORD = "bench-password"
+PROBE_QUERY = {"query": "{ users(limit: 1) { total } }"}
+
+
+async def seed_user() -> None:
+    users = get_users_collection()
+    await users.delete_many({"username": USERNAME})
+    await UserCRUD(users).create_user(UserCreate(
+        email=f"{USERNAME}@example.com", username=USERNAME, full_name="Bench Admin",
+        password=PASSWORD, role="admin",
+    ))
+
+
+async def probe(client: httpx.AsyncClient, token: str, count: int, samples: list) -> None:
+    headers = {"Authorization": f"Bearer {token}"}
+    for _ in range(count):
+        with Timer() as timer:
+            response = await client.post("/graphql", json=PROBE_QUERY, headers=headers)
+            response.raise_for_status()
+        samples.append(timer.elapsed)
+        await asyncio.sleep(0.005)
+
+
+async def executor_storm(client: httpx.AsyncClient, logins: int, concurrency: int) -> None:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def login():
+        async with semaphore:
+            await client.post("/api-login/", json={"username": USERNAME, "password": PASSWORD})
+
+    await asyncio.gather(*(login() for _ in range(logins)))
+
+
+async def inline_storm(logins: int, concurrency: int) -> None:
+    user = await UserCRUD(get_users_collection()).get_user_by_username(USERNAME)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def login():
+        async with semaphore:
+            verify_password(PASSWORD, user.hashed_password)
+            await asyncio.sleep(0)
+
+    await asyncio.gather(*(login() for _ in range(logins)))
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--probes", type=int, default=200)
+    args = parser.parse_args()
+
+    await seed_user()
+    async with httpx.AsyncClient(app=app, base_url="http://bench") as client:
+        response = await client.post("/api-login/", json={"username": USERNAME, "password": PASSWORD})
+        response.raise_for_status()
+        token = response.json()["accessToken"]
+
+        results = []
+        for name, storm in (
+            ("idle", None),
+            ("inline bcrypt", lambda: inline_storm(args.logins, args.concurrency)),
+            ("executor", lambda: executor_storm(client, args.logins, args.concurrency)),
+        ):
+            samples: list = []
+            tasks = [probe(client, token, args.probes, samples)]
+            if storm is not None:
+                tasks.append(storm())
+            with Timer() as timer:
+                await asyncio.gather(*tasks)
+            results.append({"scenario": name, "elapsed_s": timer.elapsed, **summarize(samples)})
+
+    print_table(f"probe latency during {args.logins} logins", results)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,140 @@
+"""
+Nightly late-payment penalties (penalty_service.assess_penalties). Seeds --loans
+overdue active loans of a product with a penalty rule and charges one day's
+penalty on all of them, then runs the date again (skipped by its job run) and once
+more with the job run removed, which finds every reference number already charged
+and inserts nothing. Peak RSS is printed after each run to show memory stays
+bounded by the batch size. Transactions need a replica set, e.g.
+BENCH_DATABASE_URL=mongodb://localhost:27017/?replicaSet=rs0.
+
+    python -m benchmarks.bench_penalties [--loans 500000] [--batch-size 2000]
+"""
+import argparse
+import asyncio
+import resource
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from bson import Decimal128, ObjectId
+from pymongo import UpdateOne
+
+from ._support import Timer, command_counter, print_table
+
+from app.database import (
+    get_loans_collection, get_loan_products_collection, get_loan_transactions_collection, get_loan_balances_collection,
+    get_ledger_collection, get_job_runs_collection, get_portfolio_rollups_collection, get_account_balances_collection,
+)
+from app.database.indexes import INDEX_CATALOG
+from app.database.portfolio_rollup_crud import bucket_id
+from app.services import penalty_service
+
+AS_OF = date(1990, 6, 1)
+CREATED_MONTH = datetime(1990, 1, 1)
+
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def loan(i: int, run_id: str, product: str) -> dict:
+    # All originated in one month (so their rollup buckets are few and easy to undo), first due a month later
+    created_at = CREATED_MONTH + timedelta(days=i % 28)
+    return {
+        "borrower_id": ObjectId(), "loanProduct": product, "amount_requested": Decimal128(f"{10_000 + (i * 7919) % 490_000}"),
+        "term_months": 12 + i % 25, "interest_rate": Decimal128("18"), "status": "active", "branch": f"bench-{run_id}",
+        "created_at": created_at, "updated_at": created_at, "next_due_date": created_at.replace(month=2),
+    }
+
+
+async def seed(count: int, run_id: str, product: str) -> list:
+    ids = []
+    for start in range(0, count, 10_000):
+        result = await get_loans_collection().insert_many([loan(i, run_id, product) for i in range(start, min(count, start + 10_000))])
+        ids.extend(result.inserted_ids)
+    return ids
+
+
+async def run(label: str, batch_size: int) -> dict:
+    command_counter.reset()
+    with Timer() as timer:
+        result = await penalty_service.assess_penalties(AS_OF, batch_size=batch_size)
+    commands = command_counter.reset()
+    return {
+        "run": label,
+        "status": result["status"],
+        "overdue_loans": result.get("overdue_loans", 0),
+        "charged": result.get("charged", 0),
+        "duplicates": result.get("duplicates", 0),
+        "loans_per_s": result.get("overdue_loans", 0) / timer.elapsed,
+        "commands": commands,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+async def cleanup(loan_ids: list, run_id: str, product: str) -> None:
+    """Remove the seeded loans and everything the penalty runs wrote for them."""
+    keys = [str(loan_id) for loan_id in loan_ids]
+    charged = {"penalties_charged": Decimal("0"), "outstanding": Decimal("0")}
+    async for row in get_loan_balances_collection().aggregate([
+        {"$match": {"_id": {"$in": keys}}},
+        {"$group": {"_id": None, "penalties_charged": {"$sum": "$penalties_charged"}, "outstanding": {"$sum": "$outstanding"}}},
+    ]):
+        charged = {field: row[field] for field in charged}
+    # The seeded loans were never counted, so only the penalties come off the shared buckets
+    # (from shard 0: a bucket is the sum of its shards)
+    await get_portfolio_rollups_collection().bulk_write([
+        UpdateOne(
+            {"_id": bucket_id(dimension, key, 0)},
+            {"$inc": {field: Decimal128(-value) for field, value in charged.items()}, "$set": {"dimension": dimension, "key": key, "shard": 0}},
+            upsert=True
+        )
+        for dimension, key in (("portfolio", "all"), ("status", "active"), ("origination_month", f"{CREATED_MONTH:%Y-%m}"))
+    ])
+    await get_portfolio_rollups_collection().delete_many({"$or": [
+        {"dimension": "loan_product", "key": product}, {"dimension": "branch", "key": f"bench-{run_id}"},
+    ]})
+    for start in range(0, len(keys), 10_000):
+        chunk = keys[start:start + 10_000]
+        await get_loan_transactions_collection().delete_many({"loanId": {"$in": chunk}})
+        await get_loan_balances_collection().delete_many({"_id": {"$in": chunk}})
+        await get_ledger_collection().delete_many({"loan_id": {"$in": chunk}})
+    await get_loans_collection().delete_many({"loanProduct": product})
+    await get_loan_products_collection().delete_many({"product_code": product})
+    await get_account_balances_collection().delete_many({"_id": {"$in": [
+        penalty_service.PENALTIES_RECEIVABLE_ACCOUNT, penalty_service.PENALTY_INCOME_ACCOUNT,
+    ]}})
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--loans", type=int, default=500_000)
+    parser.add_argument("--batch-size", type=int, default=2_000)
+    args = parser.parse_args()
+
+    for collection in ("loans", "loan_transactions", "ledger_entries"):
+        await get_loans_collection().database[collection].create_indexes(INDEX_CATALOG[collection])
+    run_key = f"{penalty_service.PENALTY_JOB}:{AS_OF.isoformat()}"
+    await get_job_runs_collection().delete_many({"_id": run_key})
+    run_id = str(ObjectId())[-6:]
+    product = f"B{run_id}"
+    await get_loan_products_collection().insert_one({
+        "product_code": product, "product_name": "Bench penalty product", "term_type": "Short Term", "gl_code": "bench",
+        "type": "SME", "default_interest_rate": 18.0, "template": "bench", "security": "Unsecured", "br_lc": "Branch",
+        "penalty_rate": 3.0, "penalty_grace_days": 3,
+    })
+    loan_ids = await seed(args.loans, run_id, product)
+
+    results = [await run("first", args.batch_size), await run("same date again", args.batch_size)]
+    await get_job_runs_collection().delete_many({"_id": run_key})
+    results.append(await run("job run removed", args.batch_size))
+    ledger_lines = await get_ledger_collection().count_documents({"loan_id": {"$in": [str(loan_id) for loan_id in loan_ids[:1000]]}})
+
+    await cleanup(loan_ids, run_id, product)
+    await get_job_runs_collection().delete_many({"_id": run_key})
+
+    print_table(f"{args.loans} overdue loans, batches of {args.batch_size}", results)
+    print(f"ledger lines for the first 1000 loans: {ledger_lines} (2 per penalty)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,89 @@
+"""
+N parallel deposits against one savings account: the previous read-modify-write
+(find_one, Decimal math, $set on a string balance) versus the single conditional
+$inc on a Decimal128 balance (SavingsCRUD.update_balance).
+
+Reports ops/sec and whether the final balance is exactly the expected one; the
+read-modify-write variant loses updates as soon as deposits overlap.
+
+    python -m benchmarks.bench_savings_concurrency [--deposits 2000] [--concurrency 100] [--amount 12.34]
+"""
+import argparse
+import asyncio
+from datetime import datetime
+from decimal import Decimal
+
+from bson import Decimal128, ObjectId
+
+from ._support import Timer, print_table
+
+from app.database import get_savings_collection
+from app.database.savings_crud import SavingsCRUD
+
+INITIAL_BALANCE = Decimal("1000.00")
+
+
+async def legacy_deposit(collection, account_id: str, amount: Decimal) -> bool:
+    """The previous SavingsCRUD.update_balance, which stored the balance as a string."""
+    account = await collection.find_one({"_id": ObjectId(account_id)})
+    if not account:
+        return False
+    new_balance = Decimal(account["balance"]) + amount
+    result = await collection.update_one({"_id": ObjectId(account_id)}, {"$set": {"balance": str(new_balance)}})
+    return result.modified_count == 1
+
+
+async def seed_account(collection, balance) -> str:
+    now = datetime.utcnow()
+    result = await collection.insert_one({
+        "account_number": f"BENCH{ObjectId()}", "user_id": str(ObjectId()), "type": "regular",
+        "balance": balance, "min_balance": 500.0, "currency": "PHP", "status": "active",
+        "opened_at": now, "created_at": now, "updated_at": now,
+    })
+    return str(result.inserted_id)
+
+
+async def run(deposit, account_id: str, deposits: int, concurrency: int, amount: Decimal) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            await deposit(account_id, amount)
+
+    with Timer() as timer:
+        await asyncio.gather(*(one() for _ in range(deposits)))
+    return timer.elapsed
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--deposits", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--amount", type=Decimal, default=Decimal("12.34"))
+    args = parser.parse_args()
+
+    collection = get_savings_collection()
+    savings_crud = SavingsCRUD(collection)
+    expected = INITIAL_BALANCE + args.amount * args.deposits
+
+    results = []
+    variants = (
+        ("read-modify-write (string)", str(INITIAL_BALANCE), lambda account_id, amount: legacy_deposit(collection, account_id, amount)),
+        ("conditional $inc (Decimal128)", Decimal128(INITIAL_BALANCE), savings_crud.update_balance),
+    )
+    for name, initial, deposit in variants:
+        account_id = await seed_account(collection, initial)
+        elapsed = await run(deposit, account_id, args.deposits, args.concurrency, args.amount)
+        stored = (await collection.find_one({"_id": ObjectId(account_id)}))["balance"]
+        final = stored.to_decimal() if isinstance(stored, Decimal128) else Decimal(stored)
+        results.append({
+            "method": name, "deposits": args.deposits, "ops_per_s": args.deposits / elapsed,
+            "expected": str(expected), "final": str(final), "exact": final == expected,
+        })
+        await collection.delete_one({"_id": ObjectId(account_id)})
+
+    print_table(f"{args.deposits} parallel deposits of {args.amount}", results)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
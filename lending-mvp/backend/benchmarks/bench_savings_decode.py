@@ -0,0 +1,83 @@
+"""
+Per-document decode cost of savings accounts: the previous recursive
+string -> Decimal walk (_convert_str_to_decimal) versus the Decimal128 codec
+(DECIMAL_CODEC_OPTIONS). CPU only, no server needed: documents are encoded to
+BSON once and then decoded and validated into SavingsAccountBase repeatedly.
+
+    python -m benchmarks.bench_savings_decode [--documents 10000] [--repeat 5]
+"""
+import argparse
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Dict
+
+import bson
+from bson import Decimal128, ObjectId
+
+from ._support import Timer, print_table
+
+from app.basemodel.savings_model import SavingsAccountBase
+from app.database.codecs import DECIMAL_CODEC_OPTIONS
+
+
+def legacy_convert_str_to_decimal(data: Dict[str, Any]) -> Dict[str, Any]:
+    """The helper removed from database/savings_crud.py."""
+    for key, value in data.items():
+        if isinstance(value, Decimal128):
+            data[key] = value.to_decimal()
+        elif isinstance(value, str):
+            try:
+                data[key] = Decimal(value)
+            except Exception:
+                pass
+        elif isinstance(value, dict):
+            data[key] = legacy_convert_str_to_decimal(value)
+        elif isinstance(value, list):
+            data[key] = [legacy_convert_str_to_decimal(item) if isinstance(item, dict) else item for item in value]
+    return data
+
+
+def account_document(i: int, balance) -> Dict[str, Any]:
+    now = datetime.utcnow()
+    return {
+        "_id": ObjectId(), "account_number": f"SAV-{i:08d}", "user_id": ObjectId(), "type": "regular",
+        "balance": balance, "currency": "PHP", "status": "active",
+        "opened_at": now, "created_at": now, "updated_at": now,
+    }
+
+
+def legacy_decode(raw: bytes) -> SavingsAccountBase:
+    return SavingsAccountBase(**legacy_convert_str_to_decimal(bson.decode(raw)))
+
+
+def codec_decode(raw: bytes) -> SavingsAccountBase:
+    return SavingsAccountBase(**bson.decode(raw, codec_options=DECIMAL_CODEC_OPTIONS))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--documents", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    legacy_raw = [bson.encode(account_document(i, str(Decimal(i) / 100))) for i in range(args.documents)]
+    codec_raw = [bson.encode(account_document(i, Decimal128(Decimal(i) / 100))) for i in range(args.documents)]
+
+    results = []
+    for name, decode, raw_documents in (
+        ("recursive str -> Decimal", legacy_decode, legacy_raw),
+        ("Decimal128 codec", codec_decode, codec_raw),
+    ):
+        best = None
+        for _ in range(args.repeat):
+            with Timer() as timer:
+                for raw in raw_documents:
+                    decode(raw)
+            best = timer.elapsed if best is None else min(best, timer.elapsed)
+        results.append({"method": name, "documents": args.documents, "us_per_doc": best / args.documents * 1e6})
+
+    print_table("savings account decode (best of repeats)", results)
+
+
+if __name__ == "__main__":
+    main()
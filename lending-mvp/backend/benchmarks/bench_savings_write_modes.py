@@ -0,0 +1,85 @@
+"""
+Deposit throughput of the three SAVINGS_WRITE_MODE settings under many concurrent
+clients: "single" (balance update + record insert, no session), "transactional"
+(both writes in one transaction) and "group_commit" (concurrent writes to the same
+account coalesced into one transaction).
+
+Clients spread their deposits over --accounts accounts; fewer accounts means more
+coalescing for group commit. Transactions need a replica set, e.g.
+BENCH_DATABASE_URL=mongodb://localhost:27017/?replicaSet=rs0.
+
+    python -m benchmarks.bench_savings_write_modes [--clients 500] [--deposits-per-client 10] [--accounts 10]
+"""
+import argparse
+import asyncio
+from datetime import datetime
+from decimal import Decimal
+
+from bson import Decimal128, ObjectId
+
+from ._support import Timer, command_counter, print_table
+
+from app.basemodel.transaction_model import TransactionBase
+from app.database import get_savings_collection, get_transactions_collection
+from app.database.savings_crud import SavingsCRUD
+from app.database.transaction_crud import TransactionCRUD
+
+MODES = ("single", "transactional", "group_commit")
+AMOUNT = Decimal("10.01")
+
+
+async def seed_accounts(count: int):
+    now = datetime.utcnow()
+    result = await get_savings_collection().insert_many([{
+        "account_number": f"BENCH{ObjectId()}", "user_id": str(ObjectId()), "type": "high_yield",
+        "balance": Decimal128("0.00"), "currency": "PHP", "status": "active",
+        "opened_at": now, "created_at": now, "updated_at": now,
+    } for _ in range(count)])
+    return result.inserted_ids
+
+
+async def run(mode: str, clients: int, deposits_per_client: int, account_ids) -> dict:
+    savings_crud = SavingsCRUD(get_savings_collection())
+    transaction_crud = TransactionCRUD(get_transactions_collection(), savings_crud, write_mode=mode)
+
+    async def client(index: int):
+        account_id = account_ids[index % len(account_ids)]
+        for _ in range(deposits_per_client):
+            await transaction_crud.create_transaction(
+                TransactionBase(account_id=account_id, transaction_type="deposit", amount=AMOUNT)
+            )
+
+    command_counter.reset()
+    with Timer() as timer:
+        await asyncio.gather(*(client(i) for i in range(clients)))
+    commands = command_counter.reset()
+
+    total = clients * deposits_per_client
+    balances = await get_savings_collection().find({"_id": {"$in": account_ids}}, {"balance": 1}).to_list(length=None)
+    recorded = await get_transactions_collection().count_documents({"account_id": {"$in": account_ids}})
+    return {
+        "mode": mode, "deposits": total, "ops_per_s": total / timer.elapsed,
+        "commands_per_op": commands / total,
+        "consistent": sum(b["balance"] for b in balances) == AMOUNT * total and recorded == total,
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--clients", type=int, default=500)
+    parser.add_argument("--deposits-per-client", type=int, default=10)
+    parser.add_argument("--accounts", type=int, default=10)
+    args = parser.parse_args()
+
+    results = []
+    for mode in MODES:
+        account_ids = await seed_accounts(args.accounts)
+        results.append(await run(mode, args.clients, args.deposits_per_client, account_ids))
+        await get_savings_collection().delete_many({"_id": {"$in": account_ids}})
+        await get_transactions_collection().delete_many({"account_id": {"$in": account_ids}})
+
+    print_table(f"{args.clients} concurrent clients over {args.accounts} accounts", results)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,99 @@
+"""
+Time deposit maturity processing (time_deposit_service.process_maturities). Seeds
+--background active time deposits maturing far in the future, then for each of
+--due-counts seeds that many deposits maturing on a day of their own (half
+auto-renewing) and processes that day. With the type/status/maturity_date index
+the run time follows the number of deposits due, not the size of the savings
+collection; the last day is then run again to show it is skipped. Transactions need
+a replica set, e.g. BENCH_DATABASE_URL=mongodb://localhost:27017/?replicaSet=rs0.
+
+    python -m benchmarks.bench_time_deposit_maturity [--background 200000] [--due-counts 0,100,1000,10000]
+"""
+import argparse
+import asyncio
+from datetime import date, datetime, timedelta
+
+from bson import Decimal128, ObjectId
+
+from ._support import Timer, command_counter, print_table
+
+from app.database import get_savings_collection, get_ledger_collection, get_job_runs_collection, get_account_balances_collection
+from app.database.indexes import INDEX_CATALOG
+from app.services import interest_service, time_deposit_service
+
+FIRST_DAY = date(1990, 6, 1)
+TERM_DAYS = 360
+
+
+def deposit(i: int, run_id: str, maturity_date: datetime, auto_renew: bool) -> dict:
+    opened_at = maturity_date - timedelta(days=TERM_DAYS)
+    principal = 10_000 + (i * 7919) % 990_000
+    return {
+        "account_number": f"BENCH{run_id}{i:08d}", "user_id": ObjectId(), "type": "time_deposit", "status": "active",
+        "balance": Decimal128(f"{principal}.00"), "principal": float(principal), "currency": "PHP",
+        "interest_rate": 6.0, "term_days": TERM_DAYS, "maturity_date": maturity_date, "auto_renew": auto_renew,
+        "accrued_interest": Decimal128(f"{principal * 6 * (TERM_DAYS - 30) // 36500}.000000"),
+        "last_accrual_date": maturity_date - timedelta(days=30),
+        "opened_at": opened_at, "created_at": opened_at, "updated_at": opened_at,
+    }
+
+
+async def seed(start: int, count: int, run_id: str, maturity_date: datetime) -> None:
+    for offset in range(start, start + count, 10_000):
+        await get_savings_collection().insert_many([
+            deposit(i, run_id, maturity_date, auto_renew=i % 2 == 0) for i in range(offset, min(start + count, offset + 10_000))
+        ])
+
+
+async def run(as_of: date, due: int, batch_size: int) -> dict:
+    command_counter.reset()
+    with Timer() as timer:
+        result = await time_deposit_service.process_maturities(as_of, batch_size=batch_size)
+    commands = command_counter.reset()
+    return {
+        "date": as_of.isoformat(),
+        "due": due,
+        "status": result["status"],
+        "renewed": result.get("renewed", 0),
+        "closed": result.get("closed", 0),
+        "commands": commands,
+        "elapsed_s": timer.elapsed,
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--background", type=int, default=200_000)
+    parser.add_argument("--due-counts", default="0,100,1000,10000")
+    parser.add_argument("--batch-size", type=int, default=5_000)
+    args = parser.parse_args()
+    due_counts = [int(count) for count in args.due_counts.split(",")]
+    days = [FIRST_DAY + timedelta(days=i) for i in range(len(due_counts))]
+
+    await get_savings_collection().create_indexes(INDEX_CATALOG["savings"])
+    await get_ledger_collection().create_indexes(INDEX_CATALOG["ledger_entries"])
+    run_keys = [f"{time_deposit_service.MATURITY_JOB}:{day.isoformat()}" for day in days]
+    await get_job_runs_collection().delete_many({"_id": {"$in": run_keys}})
+    run_id = str(ObjectId())[-6:]
+    await seed(0, args.background, run_id, datetime(2999, 1, 1))
+
+    results = []
+    next_index = args.background
+    for day, due in zip(days, due_counts):
+        await seed(next_index, due, run_id, datetime.combine(day, datetime.min.time()))
+        next_index += due
+        results.append(await run(day, due, args.batch_size))
+    results.append(await run(days[-1], 0, args.batch_size))
+
+    await get_savings_collection().delete_many({"account_number": {"$regex": f"^BENCH{run_id}"}})
+    await get_ledger_collection().delete_many({"transaction_id": {"$regex": "^td-(interest|payout)-"}})
+    await get_job_runs_collection().delete_many({"_id": {"$in": run_keys}})
+    await get_account_balances_collection().delete_many({"_id": {"$in": [
+        interest_service.INTEREST_EXPENSE_ACCOUNT, interest_service.SAVINGS_DEPOSITS_ACCOUNT, time_deposit_service.PAYOUT_ACCOUNT,
+    ]}})
+
+    print_table(f"{args.background} time deposits not due, batches of {args.batch_size}", results)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
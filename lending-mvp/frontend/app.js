@@ -45,12 +45,20 @@ document.addEventListener('DOMContentLoaded', () => {
         const graphqlQuery = {
             query: `
                 query GetLedger($borrowerId: String!) {
-                    getBorrowerLedger(borrowerId: $borrowerId) {
-                        transaction_id
-                        account
-                        amount
-                        entry_type
-                        timestamp
+                    getBorrowerLedger(borrowerId: $borrowerId, first: 100) {
+                        edges {
+                            node {
+                                transactionId
+                                account
+                                amount
+                                entryType
+                                timestamp
+                            }
+                        }
+                        pageInfo {
+                            hasNextPage
+                            endCursor
+                        }
                     }
                 }
             `,
@@ -73,16 +81,16 @@ document.addEventListener('DOMContentLoaded', () => {
             console.log('Ledger History:', result.data.getBorrowerLedger);
             
             // Render the ledger entries
-            const entries = result.data.getBorrowerLedger;
+            const entries = result.data.getBorrowerLedger.edges.map(edge => edge.node);
             if (entries && entries.length > 0) {
                 let html = '<table class="table-auto w-full">';
                 html += '<thead><tr><th class="px-4 py-2">Transaction ID</th><th class="px-4 py-2">Account</th><th class="px-4 py-2">Type</th><th class="px-4 py-2">Amount</th></tr></thead>';
                 html += '<tbody>';
                 entries.forEach(e => {
                     html += `<tr>
-                        <td class="border px-4 py-2">${e.transaction_id}</td>
+                        <td class="border px-4 py-2">${e.transactionId}</td>
                         <td class="border px-4 py-2">${e.account}</td>
-                        <td class="border px-4 py-2">${e.entry_type}</td>
+                        <td class="border px-4 py-2">${e.entryType}</td>
                         <td class="border px-4 py-2 text-right">${e.amount}</td>
                     </tr>`;
                 });
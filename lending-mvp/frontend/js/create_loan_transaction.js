@@ -17,20 +17,16 @@ document.addEventListener('DOMContentLoaded', () => {
     const borrowerSearchInput = document.getElementById('borrower-name');
     const borrowerDatalist = document.getElementById('borrower-list');
 
-    const ALL_CUSTOMERS_QUERY = `
-        query {
-            customers {
-                customers {
-                    id
-                    firstName
-                    lastName
-                    displayName
-                }
+    const CUSTOMER_PICKER_QUERY = `
+        query CustomerPicker($searchTerm: String) {
+            customerPicker(searchTerm: $searchTerm, limit: 20) {
+                id
+                displayName
             }
         }
     `;
 
-    async function fetchCustomers() {
+    async function fetchCustomers(searchTerm = '') {
         const token = localStorage.getItem('accessToken');
         if (!token) {
             console.error('Authentication token not found. Please log in.');
@@ -45,7 +41,8 @@ document.addEventListener('DOMContentLoaded', () => {
                     'Authorization': `Bearer ${token}`
                 },
                 body: JSON.stringify({
-                    query: ALL_CUSTOMERS_QUERY
+                    query: CUSTOMER_PICKER_QUERY,
+                    variables: searchTerm ? { searchTerm } : {}
                 })
             });
 
@@ -56,16 +53,15 @@ document.addEventListener('DOMContentLoaded', () => {
                 return [];
             }
 
-            const customers = result.data?.customers?.customers || [];
-            return customers;
+            return result.data?.customerPicker || [];
         } catch (error) {
             console.error('Error fetching customers:', error);
             return [];
         }
     }
 
-    async function populateBorrowerDatalist() {
-        const customers = await fetchCustomers();
+    async function populateBorrowerDatalist(searchTerm = '') {
+        const customers = await fetchCustomers(searchTerm);
         borrowerDatalist.innerHTML = '';
         customers.forEach(customer => {
             const option = document.createElement('option');
@@ -75,6 +71,8 @@ document.addEventListener('DOMContentLoaded', () => {
         });
     }
 
+    // Type-ahead: ask the server for matching customers instead of loading them all
+    let borrowerSearchTimer = null;
     borrowerSearchInput.addEventListener('input', () => {
         const selectedBorrowerName = borrowerSearchInput.value;
         const options = borrowerDatalist.options;
@@ -82,9 +80,12 @@ document.addEventListener('DOMContentLoaded', () => {
         for (let i = 0; i < options.length; i++) {
             if (options[i].value === selectedBorrowerName) {
                 borrowerSearchInput.value = selectedBorrowerName;
-                break;
+                return;
             }
         }
+
+        clearTimeout(borrowerSearchTimer);
+        borrowerSearchTimer = setTimeout(() => populateBorrowerDatalist(selectedBorrowerName.trim()), 200);
     });
 
     populateBorrowerDatalist();
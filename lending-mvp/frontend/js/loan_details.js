@@ -50,6 +50,9 @@ document.addEventListener('DOMContentLoaded', () => {
                     customer {
                         displayName
                     }
+                    balance {
+                        outstanding
+                    }
                 }
             }
         }
@@ -125,6 +128,7 @@ document.addEventListener('DOMContentLoaded', () => {
                 interestRateDisplay.textContent = `${loan.interestRate}%`;
                 termDisplay.textContent = loan.termMonths;
                 createdAtDisplay.textContent = new Date(loan.createdAt).toLocaleDateString();
+                showBalance(parseFloat(loan.balance?.outstanding ?? 0));
                 
                 // Set status color
                 statusDisplay.className = 'font-bold ' + 
@@ -145,7 +149,7 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     };
 
-    const fetchTransactionsAndCalculateBalance = async () => {
+    const fetchTransactions = async () => {
         const token = localStorage.getItem('accessToken');
         try {
             const response = await fetch(API_URL, {
@@ -163,7 +167,6 @@ document.addEventListener('DOMContentLoaded', () => {
             const transactions = result.data?.loanTransactions?.transactions || [];
 
             populateTransactionsTable(transactions);
-            calculateBalance(transactions);
         } catch (error) {
             console.error('Error fetching transactions:', error);
         }
@@ -196,17 +199,9 @@ document.addEventListener('DOMContentLoaded', () => {
         });
     };
 
-    const calculateBalance = (transactions) => {
-        let balance = 0;
-        transactions.forEach(t => {
-            const amt = parseFloat(t.amount);
-            if (t.transactionType === 'disbursement') {
-                balance += amt;
-            } else if (t.transactionType === 'repayment') {
-                balance -= amt;
-            }
-            // Other types like interest/fees might add to balance in a real system
-        });
+    // The outstanding balance is maintained by the server (loan.balance), so it stays
+    // correct no matter how many transactions the loan has.
+    const showBalance = (balance) => {
         balanceDisplay.textContent = `₱${balance.toFixed(2)}`;
         if (balance <= 0) balanceDisplay.className = 'font-bold text-green-600';
         else balanceDisplay.className = 'font-bold text-red-600';
@@ -258,7 +253,8 @@ document.addEventListener('DOMContentLoaded', () => {
                 paymentForm.reset();
                 // Reset date
                 paymentDateInput.value = new Date().toISOString().slice(0, 16);
-                fetchTransactionsAndCalculateBalance();
+                fetchLoanDetails();
+                fetchTransactions();
             } else {
                 paymentMessage.textContent = mutationResult?.message || 'Failed to record payment.';
                 paymentMessage.className = 'mt-4 text-sm font-bold text-red-500';
@@ -271,5 +267,5 @@ document.addEventListener('DOMContentLoaded', () => {
     });
 
     fetchLoanDetails();
-    fetchTransactionsAndCalculateBalance();
+    fetchTransactions();
 });